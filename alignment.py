@@ -0,0 +1,135 @@
+import argparse
+import time
+
+import numpy as np
+
+from telemetry_store import TelemetryStore
+
+# Multi-driver telemetry on one distance grid.
+#
+# Every driver's lap (their fastest by default) is read from the memory-mapped
+# telemetry store, distance and time are taken from the start of the lap, and
+# all drivers are resampled onto the same grid with one np.interp call per
+# channel: driver k's distances are shifted by k x (longest lap + 1 m), so the
+# concatenated samples stay increasing and one interpolation covers the whole
+# field. The result is a drivers x samples matrix per channel, and comparisons
+# are plain broadcasting:
+#
+#   delta_time()[i, j, s]   time driver i is behind driver j at grid point s
+#   speed_diff()[i, j, s]   speed of i minus speed of j
+#
+#   python alignment.py 2024 Monaco Q
+#   python alignment.py 2024 Monaco Q --drivers LEC VER --plot lec_vs_ver.png
+
+GRID_STEP = 5.0   # metres between grid points
+
+
+def batch_interp(grid, distances, values):
+    # Resample several (distance, value) series onto `grid` in one np.interp call -> (len(series), len(grid))
+    stride = max(d[-1] for d in distances) + 1.0
+    offsets = stride * np.arange(len(distances))
+    xp = np.concatenate([d + o for d, o in zip(distances, offsets)])
+    fp = np.concatenate(values)
+    return np.interp((grid[None, :] + offsets[:, None]).ravel(), xp, fp).reshape(len(distances), len(grid))
+
+
+class AlignedLaps:
+
+    def __init__(self, drivers, laps, distance, channels):
+        self.drivers = list(drivers)
+        self.laps = list(laps)
+        self.distance = distance    # (samples,) grid in metres
+        self.channels = channels    # {name: (drivers, samples) float32}
+
+    def __repr__(self):
+        return f"<AlignedLaps {len(self.drivers)} drivers x {len(self.distance)} samples>"
+
+    def __getitem__(self, name):
+        return self.channels[name]
+
+    def index(self, driver):
+        return self.drivers.index(driver)
+
+    def delta_time(self):
+        # (drivers, drivers, samples): how far i is behind j at every grid point
+        t = self.channels["Time"]
+        return t[:, None, :] - t[None, :, :]
+
+    def speed_diff(self):
+        v = self.channels["Speed"]
+        return v[:, None, :] - v[None, :, :]
+
+    def gap_to_fastest(self):
+        # (drivers, samples): time lost to the quickest driver up to each point
+        t = self.channels["Time"]
+        return t - t[np.argmin(t[:, -1])]
+
+
+def fastest_laps(store, year, gp, session, telemetry):
+    # {driver: lap number} of each driver's fastest lap that has telemetry samples
+    laps = store.snapshots.load(year, gp, session, profile="telemetry").laps(["Driver", "LapNumber", "LapTime"])
+    laps = laps.dropna(subset=["LapTime", "LapNumber"])
+    stored = {(d, int(n)) for d, entry in telemetry.index["drivers"].items() for n in entry["laps"]}
+    laps = laps[[(d, int(n)) in stored for d, n in zip(laps["Driver"], laps["LapNumber"])]]
+    best = laps.loc[laps.groupby("Driver")["LapTime"].idxmin()]
+    return dict(zip(best["Driver"], best["LapNumber"].astype(int)))
+
+
+def align(year, gp, session, drivers=None, laps=None, step=GRID_STEP, channels=("Time", "Speed", "X", "Y"),
+          store=None):
+    # laps: {driver: lap number}, each driver's fastest lap when not given
+    store = store or TelemetryStore()
+    telemetry = store.open(year, gp, session)
+    laps = laps or fastest_laps(store, year, gp, session, telemetry)
+    drivers = [d for d in (drivers or telemetry.drivers) if d in laps]
+    if not drivers:
+        raise LookupError(f"no stored telemetry laps to align in {telemetry.path}")
+
+    distances, series = [], {name: [] for name in channels}
+    for driver in drivers:
+        data = telemetry.driver(driver, laps[driver], ["Distance", *channels])
+        d = np.asarray(data["Distance"], dtype=np.float64)
+        distances.append(np.maximum.accumulate(d - d[0]))
+        for name in channels:
+            values = np.asarray(data[name], dtype=np.float64)
+            series[name].append(values - values[0] if name == "Time" else values)
+
+    # common grid up to the shortest lap, so no driver is extrapolated
+    grid = np.arange(0.0, min(d[-1] for d in distances), step)
+    matrices = {name: batch_interp(grid, distances, series[name]).astype(np.float32) for name in channels}
+    return AlignedLaps(drivers, [laps[d] for d in drivers], grid, matrices)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Align drivers' laps on a distance grid and compare them")
+    parser.add_argument("year", type=int)
+    parser.add_argument("gp", help="grand prix name or round number")
+    parser.add_argument("session", nargs="?", default="Q")
+    parser.add_argument("--drivers", nargs="+")
+    parser.add_argument("--step", type=float, default=GRID_STEP)
+    parser.add_argument("--plot", help="image file: speed difference of the first two drivers along the track")
+    args = parser.parse_args()
+
+    gp = int(args.gp) if args.gp.isdigit() else args.gp
+    started = time.perf_counter()
+    aligned = align(args.year, gp, args.session, args.drivers, step=args.step)
+    aligned_s = time.perf_counter() - started
+    started = time.perf_counter()
+    delta, diff = aligned.delta_time(), aligned.speed_diff()
+    pairs_s = time.perf_counter() - started
+
+    print(f"\n{aligned}: aligned in {aligned_s * 1000:.0f} ms, all-pairs delta & speed diff in {pairs_s * 1000:.1f} ms\n")
+    import pandas as pd
+    print("Lap time delta at the end of the common grid (row behind column, s):")
+    print(pd.DataFrame(delta[:, :, -1], index=aligned.drivers, columns=aligned.drivers).round(3))
+
+    if args.plot:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib import cm
+        from speedmap import speed_map
+
+        a, b = aligned.drivers[:2]
+        points = np.column_stack([aligned["X"][0], aligned["Y"][0], diff[0, 1]]).astype(float)
+        speed_map(points, f"{a} vs {b} speed difference", colormap=cm.coolwarm, max_segments=None).savefig(args.plot)
+        print(f"\nSpeed difference map written to {args.plot}")
@@ -0,0 +1,245 @@
+import argparse
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
+
+from lap_masks import REPRESENTATIVE, session_masks
+from lap_table import compact_laps, driver_feature, driver_means, take_by_driver
+from pipeline import fingerprint
+from registry import DRIVERS
+from sessions import CACHE_DIR, FixtureBackend, default_store
+from wet_engine import WetEngine, scan_session, scores_from
+
+# Season-wide backtesting for the predictor variants.
+#
+# Every round N of a season is replayed: each variant is trained on the
+# rounds before N and scored against round N's actual race. Lap times differ
+# per circuit, so features and targets are relative to the field:
+#   QualifyingGap (%)   best qualifying lap vs pole
+#   SectorNForm (%)     average race sector gap to the field over earlier rounds
+#   WetPerformanceScore wet_engine.py score from earlier seasons (folded into the
+#                       engine) and this season's earlier rounds, never round N or later
+#   RacePace (%)        average race lap vs the field median (target)
+# MAE is reported in seconds (relative error x that round's median race lap)
+# next to the Spearman rank correlation between predicted pace and the
+# finishing order.
+#
+# Per-round inputs and fitted models are cached under f1_cache/backtest and
+# rounds are evaluated in parallel, so re-running after adding a feature
+# only pays for the new feature.
+#
+#   python backtest.py 2024
+#   python backtest.py 2024 --variants f1predictor1 f1predictor4 --workers 8
+
+BACKTEST_DIR = CACHE_DIR / "backtest"
+
+QUALI = ["QualifyingGap (%)"]
+SECTOR_FORM = ["Sector1Form (%)", "Sector2Form (%)", "Sector3Form (%)"]
+WET = ["WetPerformanceScore"]
+
+# Feature sets follow the README's "features added" list for each predictor
+VARIANTS = {
+    "f1predictor1": {"features": QUALI,
+                     "params": dict(n_estimators=100, learning_rate=0.1, max_depth=3, random_state=42)},
+    "f1predictor2": {"features": QUALI + SECTOR_FORM,
+                     "params": dict(n_estimators=200, learning_rate=0.1, random_state=38)},
+    "f1predictor3": {"features": QUALI + WET,
+                     "params": dict(n_estimators=100, learning_rate=0.1, max_depth=3, random_state=42)},
+    "f1predictor4": {"features": QUALI + SECTOR_FORM + WET,
+                     "params": dict(n_estimators=200, learning_rate=0.1, random_state=38)},
+}
+
+MIN_TRAIN_ROUNDS = 2
+SLOW_LAP_FACTOR = 1.07   # on top of the lap masks: laps slower than this x the median are left out of the pace
+
+
+def season_rounds(year):
+    store = default_store()
+    if isinstance(store.backend, FixtureBackend):
+        return sorted({int(p.name[:2]) for p in (store.root / str(year)).glob("*_R")})
+    from ergast_client import ErgastClient
+    schedule = ErgastClient().schedule(year)
+    return schedule.loc[schedule["date"] < pd.Timestamp(date.today()), "round"].tolist()
+
+
+# --- per-round inputs ---
+
+def _round_inputs(year, rnd):
+    store = default_store()
+    columns = ["Driver", "LapTime", "Sector1Time", "Sector2Time", "Sector3Time"]
+
+    # qualifying: timed laps that weren't deleted; race: representative laps (lap_masks.py)
+    quali = store.load(year, rnd, "Q")
+    quali = compact_laps(quali.laps(columns)[session_masks(quali).select("has_time", "not_deleted")])
+    race = store.load(year, rnd, "R")
+    laps = compact_laps(race.laps(columns)[session_masks(race).select(*REPRESENTATIVE)])
+    laps = laps[laps["LapTime (s)"] <= SLOW_LAP_FACTOR * laps["LapTime (s)"].median()]
+
+    drivers = np.unique(laps["DriverId"])
+    best_quali = pd.Series(quali["LapTime (s)"].to_numpy()).groupby(quali["DriverId"].to_numpy()).min()
+    best_quali = take_by_driver(driver_feature(DRIVERS.decode(best_quali.index), best_quali.to_numpy()), drivers)
+
+    race_lap = driver_means(laps["DriverId"], laps["LapTime (s)"]).take(drivers)
+    sectors = driver_means(laps["DriverId"], laps[["Sector1Time (s)", "Sector2Time (s)", "Sector3Time (s)"]]).take(drivers, axis=0)
+    results = race.results(["Abbreviation", "Position"])
+    position = take_by_driver(driver_feature(results["Abbreviation"], results["Position"]), drivers)
+
+    median_lap = np.nanmedian(race_lap)
+    frame = pd.DataFrame({
+        "Round": rnd,
+        "DriverId": drivers,
+        "QualifyingGap (%)": (best_quali / np.nanmin(best_quali) - 1) * 100,
+        "RacePace (%)": (race_lap / median_lap - 1) * 100,
+        "MedianLap (s)": median_lap,
+        "Position": position,
+    })
+    for k in range(3):
+        frame[f"Sector{k + 1}Gap (%)"] = (sectors[:, k] / np.nanmedian(sectors[:, k]) - 1) * 100
+    return frame
+
+
+def round_inputs(year, rnd):
+    path = BACKTEST_DIR / str(year) / f"inputs_{rnd:02d}_representative.parquet"
+    if path.exists():
+        return pd.read_parquet(path)
+    frame = _round_inputs(year, rnd)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    frame.to_parquet(path, index=False)
+    return frame
+
+
+def _round_wet(year, rnd):
+    # wet_engine.py accumulators of every stored session of one weekend
+    partials = []
+    for session in default_store().sessions(year, rnd):
+        try:
+            partials.append(scan_session(year, rnd, session))
+        except LookupError:   # session not stored
+            pass
+    return pd.concat(partials, ignore_index=True) if partials else None
+
+
+def round_wet(year, rnd):
+    path = BACKTEST_DIR / str(year) / f"wet_{rnd:02d}.parquet"
+    if path.exists():
+        return pd.read_parquet(path)
+    frame = _round_wet(year, rnd)
+    if frame is None:
+        return None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    frame.to_parquet(path, index=False)
+    return frame
+
+
+def wet_form(year, rounds, pool):
+    # (Round, DriverId, WetPerformanceScore) with each round's score built only
+    # from sessions before it: no look-ahead into the round or the rest of the season
+    history = WetEngine().accumulators
+    history = history[history["Season"] < year]
+    weekends = dict(zip(rounds, pool.map(round_wet, [year] * len(rounds), rounds)))
+    frames = []
+    for rnd in sorted(rounds):
+        scores = scores_from(history)
+        ids = DRIVERS.ids(scores["Driver"], add=False)
+        frames.append(pd.DataFrame({"Round": rnd, "DriverId": ids[ids >= 0],
+                                    "WetPerformanceScore": scores["WetPerformanceScore"].to_numpy(float)[ids >= 0]}))
+        if weekends[rnd] is not None:
+            history = weekends[rnd] if history.empty else pd.concat([history, weekends[rnd]], ignore_index=True)
+    return pd.concat(frames, ignore_index=True)
+
+
+def season_inputs(year, rounds, pool):
+    inputs = pd.concat(pool.map(round_inputs, [year] * len(rounds), rounds), ignore_index=True)
+    inputs = inputs.sort_values(["DriverId", "Round"], ignore_index=True)
+
+    # sector form: mean of a driver's sector gaps over strictly earlier rounds
+    by_driver = inputs.groupby("DriverId")
+    for k in range(1, 4):
+        gap = inputs[f"Sector{k}Gap (%)"]
+        seen = by_driver[f"Sector{k}Gap (%)"].cumcount()
+        previous_sum = gap.fillna(0).groupby(inputs["DriverId"]).cumsum() - gap.fillna(0)
+        inputs[f"Sector{k}Form (%)"] = previous_sum / seen.replace(0, np.nan)
+
+    inputs = inputs.merge(wet_form(year, rounds, pool), on=["Round", "DriverId"], how="left")
+    return inputs.sort_values(["Round", "DriverId"], ignore_index=True)
+
+
+# --- evaluation ---
+
+def _spearman(a, b):
+    ok = ~(np.isnan(a) | np.isnan(b))
+    if ok.sum() < 3:
+        return np.nan
+    ra = pd.Series(a[ok]).rank().to_numpy()
+    rb = pd.Series(b[ok]).rank().to_numpy()
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def fit_cached(year, variant, train):
+    spec = VARIANTS[variant]
+    X, y = train[spec["features"]].fillna(0), train["RacePace (%)"]
+    key = fingerprint([variant, spec["params"], X, y])[:20]
+    path = BACKTEST_DIR / str(year) / "models" / f"{variant}_{key}.pkl"
+    if path.exists():
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    model = GradientBoostingRegressor(**spec["params"]).fit(X, y)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(model, f)
+    return model
+
+
+def evaluate_round(year, inputs, rnd, variants):
+    train = inputs[(inputs["Round"] < rnd) & inputs["RacePace (%)"].notna()]
+    test = inputs[(inputs["Round"] == rnd) & inputs["RacePace (%)"].notna()]
+    rows = []
+    for variant in variants:
+        model = fit_cached(year, variant, train)
+        predicted = model.predict(test[VARIANTS[variant]["features"]].fillna(0))
+        error = np.abs(predicted - test["RacePace (%)"].to_numpy()) / 100 * test["MedianLap (s)"].to_numpy()
+        rows.append({"Variant": variant, "Round": rnd, "Drivers": len(test),
+                     "MAE (s)": float(error.mean()),
+                     "Spearman": _spearman(predicted, test["Position"].to_numpy(dtype=float))})
+    return rows
+
+
+def backtest(year, variants=None, rounds=None, workers=None):
+    variants = variants or list(VARIANTS)
+    rounds = rounds or season_rounds(year)
+    with ProcessPoolExecutor(workers) as pool:
+        inputs = season_inputs(year, rounds, pool)
+        scored = [rnd for rnd in rounds if rnd > rounds[0] + MIN_TRAIN_ROUNDS - 1]
+        per_round = pool.map(evaluate_round, [year] * len(scored), [inputs] * len(scored), scored,
+                             [variants] * len(scored))
+        detail = pd.DataFrame([row for rows in per_round for row in rows])
+
+    summary = detail.groupby("Variant", sort=False).agg(
+        Rounds=("Round", "count"), MAE=("MAE (s)", "mean"), Spearman=("Spearman", "mean"))
+    summary = summary.rename(columns={"MAE": "MAE (s)"})
+    summary["Rank"] = summary["MAE (s)"].rank(method="min").astype(int)
+    summary.to_csv(BACKTEST_DIR / str(year) / "summary.csv")
+    detail.to_csv(BACKTEST_DIR / str(year) / "rounds.csv", index=False)
+    return summary, detail
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the predictor variants over a season")
+    parser.add_argument("year", type=int)
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS))
+    parser.add_argument("--rounds", nargs="+", type=int, help="default: every finished round")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    summary, detail = backtest(args.year, args.variants, args.rounds, args.workers)
+    print(f"\n📊 Backtest {args.year} ({detail['Round'].nunique()} rounds scored)\n")
+    print(summary.round(3))
+
+    # Same numbers, ready to paste into the README
+    print()
+    for variant, row in summary.iterrows():
+        print(f"{variant} = MAE {row['MAE (s)']:.2f} secs, Spearman {row['Spearman']:.2f} ({args.year} backtest)")
@@ -0,0 +1,363 @@
+import argparse
+import json
+import os
+import platform
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from sessions import CACHE_DIR
+
+# Benchmarks for every hot stage, on synthetic sessions (no network, no FastF1).
+#
+# The generator builds FastF1-shaped frames with the columns and dtypes the
+# stages read (timedelta lap/sector times, string driver/team/compound,
+# TrackStatus strings, NaT pit times, ...). Scale 1 is one real race:
+#
+#   laps        20 drivers x 60 laps                      x scale races
+#   telemetry   one driver's race, 600 samples per lap    x scale races
+#   results     Ergast-format points, 24 rounds x 20      x scale seasons
+#   model rows  one season of driver-round features       x scale seasons
+#
+# Each stage calls the repo's own code on that data (generation is not
+# timed) and is repeated until REPEAT runs or TIME_BUDGET seconds. Results
+# are stored per commit in f1_cache/bench/<commit>.json; compare flags stages
+# that got more than REGRESSION x slower.
+#
+#   python bench.py                          every stage at 1x, 10x and 100x
+#   python bench.py --scales 1 10 --stages laps.extract wet.score
+#   python bench.py compare                  latest two stored runs
+#   python bench.py compare 0e87b54 b261503
+
+BENCH_DIR = CACHE_DIR / "bench"
+SCALES = [1, 10, 100]
+REPEAT = 5
+TIME_BUDGET = 2.0     # seconds per stage and scale, at least one run
+REGRESSION = 1.15
+
+N_DRIVERS = 20
+RACE_LAPS = 60
+BASE_LAP = 90.0       # seconds
+SAMPLES_PER_LAP = 600
+TRACK_LENGTH = 5000.0  # metres
+ROUNDS = 24
+
+
+# --- synthetic data ---
+
+def synthetic_laps(scale=1, seed=0, wet=False):
+    # FastF1-shaped laps for `scale` races of the same field
+    from mock_ergast import DRIVERS
+    from registry import TEAM_NAMES
+
+    rng = np.random.default_rng(seed)
+    shape = (scale, N_DRIVERS, RACE_LAPS)
+    lap = np.broadcast_to(np.arange(1, RACE_LAPS + 1), shape)
+    pit_lap = rng.integers(18, 42, size=(scale, N_DRIVERS, 1))
+    stint = 1 + (lap > pit_lap)
+    tyre_life = np.where(stint == 1, lap, lap - pit_lap)
+
+    skill = rng.normal(0.0, 0.5, size=(1, N_DRIVERS, 1))
+    lap_time = (BASE_LAP * (1.12 if wet else 1.0) + skill + 0.05 * tyre_life + rng.normal(0.0, 0.4, shape)
+                + 5.0 * (lap == 1) + 20.0 * (lap == pit_lap) + 3.0 * (lap == pit_lap + 1))
+    safety_car = (lap >= 30) & (lap < 34)
+    lap_time = np.where(safety_car, lap_time * 1.4, lap_time)
+    finish = np.cumsum(lap_time, axis=-1) + 300.0
+    split = rng.dirichlet([30, 40, 30], size=shape)
+
+    def seconds(values):
+        return pd.to_timedelta(np.ravel(values), unit="s")
+
+    n = lap_time.size
+    codes = np.array([code for _, code in DRIVERS])
+    driver = np.broadcast_to(np.arange(N_DRIVERS)[None, :, None], shape).ravel()
+    no_time = pd.to_timedelta(np.full(n, np.nan), unit="s")
+    compound = np.where(stint == 1, "MEDIUM", "HARD") if not wet else np.full(shape, "INTERMEDIATE")
+    laps = pd.DataFrame({
+        "Time": seconds(finish),
+        "Driver": codes[driver],
+        "DriverNumber": (driver + 1).astype(str),
+        "LapTime": seconds(lap_time),
+        "LapNumber": lap.ravel().astype(float),
+        "Stint": stint.ravel().astype(float),
+        "PitOutTime": no_time.where(~(lap == pit_lap + 1).ravel(), seconds(finish - lap_time)),
+        "PitInTime": no_time.where(~(lap == pit_lap).ravel(), seconds(finish)),
+        "Sector1Time": seconds(lap_time * split[..., 0]),
+        "Sector2Time": seconds(lap_time * split[..., 1]),
+        "Sector3Time": seconds(lap_time * split[..., 2]),
+        "Compound": compound.ravel(),
+        "TyreLife": tyre_life.ravel().astype(float),
+        "Team": np.array(TEAM_NAMES[:10])[driver // 2],
+        "LapStartTime": seconds(finish - lap_time),
+        "TrackStatus": np.where(safety_car, "4", "1").ravel(),
+        "Position": (np.argsort(np.argsort(finish, axis=1), axis=1) + 1).ravel().astype(float),
+        "Deleted": rng.random(n) < 0.01,
+        "IsAccurate": True,
+    })
+    return laps
+
+
+def synthetic_telemetry(scale=1, seed=0):
+    # One driver's merged car + position telemetry over `scale` races
+    rng = np.random.default_rng(seed)
+    n = RACE_LAPS * SAMPLES_PER_LAP * scale
+    theta = np.linspace(0.0, 2 * np.pi * RACE_LAPS * scale, n, endpoint=False)
+    speed = 200 + 90 * np.sin(5 * theta) + rng.normal(0, 3, n)
+    dt = BASE_LAP / SAMPLES_PER_LAP
+    return pd.DataFrame({
+        "SessionTime": pd.to_timedelta(300.0 + np.arange(n) * dt, unit="s"),
+        "Distance": np.cumsum(speed / 3.6 * dt),
+        "Speed": speed,
+        "RPM": 9000 + 30 * speed,
+        "nGear": np.clip((speed / 45).astype(int) + 1, 1, 8),
+        "Throttle": np.clip(speed / 3, 0, 100),
+        "X": 3000 * np.cos(theta) + 600 * np.cos(3 * theta),
+        "Y": 1800 * np.sin(theta) + 400 * np.sin(2 * theta),
+    })
+
+
+def synthetic_results(scale=1, seed=0):
+    # Race points in ergast_client's season_results format, `scale` seasons
+    from mock_ergast import DRIVERS, GP_POINTS, RACE_NAMES
+
+    rng = np.random.default_rng(seed)
+    points = np.zeros(N_DRIVERS)
+    points[:len(GP_POINTS)] = GP_POINTS
+    order = rng.permuted(np.tile(np.arange(N_DRIVERS), (scale * ROUNDS, 1)), axis=1)
+    return pd.DataFrame({
+        "season": np.repeat(2000 + np.arange(scale), ROUNDS * N_DRIVERS),
+        "round": np.tile(np.repeat(np.arange(1, ROUNDS + 1), N_DRIVERS), scale),
+        "raceName": np.tile(np.repeat([f"{name} Grand Prix" for name in RACE_NAMES[:ROUNDS]], N_DRIVERS), scale),
+        "driverCode": np.array([code for _, code in DRIVERS])[order.ravel()],
+        "driverId": np.array([driver_id for driver_id, _ in DRIVERS])[order.ravel()],
+        "points": np.tile(points, scale * ROUNDS),
+    })
+
+
+def synthetic_model_inputs(scale=1, seed=0):
+    # Backtest-style feature rows (features relative to the field) and race pace target
+    from backtest import VARIANTS
+
+    rng = np.random.default_rng(seed)
+    features = VARIANTS["f1predictor4"]["features"]
+    X = pd.DataFrame(rng.normal(0, 1, size=(scale * ROUNDS * N_DRIVERS, len(features))), columns=features)
+    y = X.to_numpy() @ rng.normal(0, 0.3, len(features)) + rng.normal(0, 0.2, len(X))
+    return X, y
+
+
+# --- stages ---
+
+def stage_laps_extract(data):
+    # timedelta -> float32 seconds, string -> registry codes, validity masks
+    from lap_masks import compute_masks
+    from lap_table import compact_laps
+
+    return compact_laps(data["laps"]), compute_masks(data["laps"])
+
+
+def stage_features(data):
+    # per-driver sector / lap means and the join onto the qualifying rows
+    import features
+    from lap_table import take_by_driver
+
+    laps = data["compact"]
+    sectors, laps_mean = features.sector_means(laps), features.lap_means(laps)
+    quali = data["qualifying"]
+    return take_by_driver(sectors, quali["DriverId"]), take_by_driver(laps_mean, quali["DriverId"])
+
+
+def stage_wet_score(data):
+    # wet_performance.py pair score: representative laps, per-driver means, merge
+    from lap_masks import REPRESENTATIVE, compute_masks
+    from wet_performance import average_lap_times, score_table
+
+    averages = []
+    for laps in (data["laps_wet"], data["laps"]):
+        masks = compute_masks(laps)
+        keep = np.logical_and.reduce([masks[name] for name in REPRESENTATIVE])
+        averages.append(average_lap_times(laps.loc[keep, ["Driver", "LapTime"]]))
+    return score_table(*averages, 2022, 2023)
+
+
+def stage_wet_engine(data):
+    # wet_engine.py: classify, per-session sums, fold and score
+    from wet_engine import WetEngine, classify_laps, session_accumulators
+
+    engine = WetEngine(root=BENCH_DIR / "wet_engine")   # never saved, starts empty
+    for laps in (data["laps_wet"], data["laps"]):
+        engine.fold(session_accumulators(classify_laps(laps), "circuit", 2024))
+    return engine.scores()
+
+
+def stage_heatmap(data):
+    # points_matrix.py scatter per season, ranked pivot and the career pivot
+    from points_matrix import PointsMatrix, career_points
+
+    results = data["results"]
+    matrices = {}
+    for season, gp in results.groupby("season"):
+        matrices[season] = PointsMatrix(season, gp.drop_duplicates("round")["raceName"])
+        matrices[season].update(gp)
+        matrices[season].ranked()
+    return career_points(matrices)
+
+
+def stage_speedmap(data):
+    # speedmap.py: channels into one array, LTTB decimation, segment view
+    from speedmap import DEFAULT_MAX_SEGMENTS, decimate_lttb, track_points, track_segments
+
+    points = decimate_lttb(track_points(data["telemetry"]), DEFAULT_MAX_SEGMENTS + 1)
+    return track_segments(points)
+
+
+def stage_model(data):
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    from backtest import VARIANTS
+
+    X, y = data["model"]
+    model = GradientBoostingRegressor(**VARIANTS["f1predictor4"]["params"]).fit(X, y)
+    return model.predict(X)
+
+
+STAGES = {
+    "laps.extract": stage_laps_extract,
+    "features.groupby_merge": stage_features,
+    "wet.score": stage_wet_score,
+    "wet.engine": stage_wet_engine,
+    "heatmap.pivot": stage_heatmap,
+    "speedmap.segments": stage_speedmap,
+    "model.fit_predict": stage_model,
+}
+
+
+def synthetic_data(scale, seed=0):
+    from lap_table import compact_laps
+    from registry import DRIVERS
+
+    laps = synthetic_laps(scale, seed)
+    quali = pd.DataFrame({"DriverCode": pd.unique(laps["Driver"])})
+    quali["DriverId"] = DRIVERS.ids(quali["DriverCode"])
+    return {
+        "laps": laps,
+        "laps_wet": synthetic_laps(scale, seed + 1, wet=True),
+        "compact": compact_laps(laps),
+        "qualifying": quali,
+        "telemetry": synthetic_telemetry(scale, seed),
+        "results": synthetic_results(scale, seed),
+        "model": synthetic_model_inputs(scale, seed),
+    }
+
+
+def measure(fn, data, repeat=REPEAT, budget=TIME_BUDGET):
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat and (not times or time.perf_counter() - started < budget):
+        t0 = time.perf_counter()
+        fn(data)
+        times.append(time.perf_counter() - t0)
+    return {"best": min(times), "median": float(np.median(times)), "runs": len(times)}
+
+
+# --- results ---
+
+def commit_id():
+    import subprocess
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def machine():
+    import sklearn
+
+    return {"platform": platform.platform(), "cpus": os.cpu_count(), "python": platform.python_version(),
+            "numpy": np.__version__, "pandas": pd.__version__, "sklearn": sklearn.__version__}
+
+
+def run(scales=SCALES, stages=None, repeat=REPEAT, seed=0):
+    stages = stages or list(STAGES)
+    record = {"commit": commit_id(), "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+              "machine": machine(), "results": {}}
+    for scale in scales:
+        data = synthetic_data(scale, seed)
+        for name in stages:
+            result = measure(STAGES[name], data, repeat)
+            record["results"].setdefault(name, {})[str(scale)] = result
+            print(f"{name:<24} {scale:>4}x  best {result['best'] * 1e3:10.2f} ms  "
+                  f"median {result['median'] * 1e3:10.2f} ms  ({result['runs']} runs)", flush=True)
+        del data
+    return record
+
+
+def save(record, root=BENCH_DIR):
+    # Merged into an existing record for the same commit (e.g. a run with other scales)
+    root.mkdir(parents=True, exist_ok=True)
+    path = root / f"{record['commit']}.json"
+    if path.exists():
+        stored = json.loads(path.read_text())
+        for name, by_scale in stored["results"].items():
+            record["results"][name] = {**by_scale, **record["results"].get(name, {})}
+    tmp = root / f"{record['commit']}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(record, indent=1))
+    os.replace(tmp, path)
+    return path
+
+
+def load(commit, root=BENCH_DIR):
+    return json.loads((root / f"{commit}.json").read_text())
+
+
+def history(root=BENCH_DIR):
+    # Stored commits, oldest run first
+    records = [json.loads(p.read_text()) for p in root.glob("*.json")]
+    return [r["commit"] for r in sorted(records, key=lambda r: r["date"])]
+
+
+def compare(base, head):
+    # Stage, scale, best times and head / base ratio, for the stages both runs have
+    rows = []
+    for name, by_scale in head["results"].items():
+        for scale, result in by_scale.items():
+            before = base["results"].get(name, {}).get(scale)
+            if before:
+                rows.append({"Stage": name, "Scale": f"{scale}x", "Base (ms)": before["best"] * 1e3,
+                             "Head (ms)": result["best"] * 1e3, "Ratio": result["best"] / before["best"]})
+    table = pd.DataFrame(rows, columns=["Stage", "Scale", "Base (ms)", "Head (ms)", "Ratio"])
+    table["Regression"] = table["Ratio"] > REGRESSION
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic sessions")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("compare", help="compare two stored runs (default: the latest two)")
+    p.add_argument("commits", nargs="*")
+    parser.add_argument("--scales", nargs="+", type=int, default=SCALES)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        commits = args.commits or history()[-2:]
+        if len(commits) != 2:
+            raise SystemExit(f"need two stored runs to compare, have {history()}")
+        table = compare(load(commits[0]), load(commits[1]))
+        print(f"\n{commits[0]} -> {commits[1]}\n")
+        print(table.round(3).to_string(index=False))
+        if table["Regression"].any():
+            raise SystemExit(f"\n{int(table['Regression'].sum())} stage(s) more than {REGRESSION}x slower")
+        raise SystemExit
+
+    record = run(args.scales, args.stages, args.repeat)
+    if not args.no_save:
+        print(f"\nResults for {record['commit']} written to {save(record)}")
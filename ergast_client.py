@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrument import span
+from sessions import CACHE_DIR
+
+# Season-wide Ergast ingestion.
+#
+# The heatmap used to make two round-trips per round (race + sprint results),
+# one after the other. This client instead:
+#   * uses the season endpoints (/2024/results, /2024/sprint) and fetches
+#     their pages concurrently, so a season is ~5-10 requests instead of 48
+#   * runs requests on a small worker pool sharing one keep-alive session,
+#     throttled to the API's rate limit and backing off on HTTP 429
+#   * caches every response on disk; past seasons never expire, the current
+#     season is refetched once the cached copy is older than an hour
+#
+# mock_ergast.py serves the same endpoints locally for offline runs,
+# point ERGAST_URL at it to use it everywhere.
+
+BASE_URL = os.environ.get("ERGAST_URL", "https://api.jolpi.ca/ergast/f1")
+ERGAST_CACHE_DIR = CACHE_DIR / "ergast"
+
+PAGE_LIMIT = 100          # largest page the API hands out
+CURRENT_SEASON_MAX_AGE = 3600
+
+
+class RateLimiter:
+    # Token bucket shared by all worker threads
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # server told us to slow down, drain the bucket for everyone
+        with self.lock:
+            self.tokens = -seconds * self.rate
+
+
+class ErgastClient:
+
+    def __init__(self, base_url=BASE_URL, cache_dir=ERGAST_CACHE_DIR, max_workers=4, rate=4.0, retries=5):
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = Path(cache_dir)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.limiter = RateLimiter(rate)
+
+        # one pooled keep-alive connection per worker
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+        self.requests_made = 0
+
+    # --- HTTP + disk cache ---
+
+    def _cache_path(self, url):
+        return self.cache_dir / (hashlib.sha1(url.encode()).hexdigest() + ".json")
+
+    def get_json(self, path, max_age=None, **params):
+        # max_age=None means a cached response never expires
+        query = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+        url = f"{self.base_url}/{path}.json" + (f"?{query}" if query else "")
+
+        cache_path = self._cache_path(url)
+        if cache_path.exists():
+            cached = json.loads(cache_path.read_text())
+            if max_age is None or time.time() - cached["fetched"] < max_age:
+                return cached["body"]
+
+        for attempt in range(self.retries):
+            self.limiter.acquire()
+            with span("ergast.request", path=path):
+                response = self.http.get(url, timeout=30)
+            self.requests_made += 1
+            if response.status_code == 429 or response.status_code >= 500:
+                self.limiter.pause(float(response.headers.get("Retry-After", 2 ** attempt)))
+                continue
+            response.raise_for_status()
+            body = response.json()
+            break
+        else:
+            raise RuntimeError(f"Ergast kept refusing {url} after {self.retries} attempts")
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps({"url": url, "fetched": time.time(), "body": body}))
+        return body
+
+    def fetch_many(self, calls):
+        # calls: list of (path, max_age, params) tuples, results come back in order
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            return list(pool.map(lambda call: self.get_json(call[0], call[1], **call[2]), calls))
+
+    def _races(self, paths):
+        # Fetch paged RaceTable endpoints given as (path, max_age): first pages
+        # for every path at once, then all remaining pages at once.
+        # Races split over two pages are merged back together.
+        first = self.fetch_many([(path, max_age, {"limit": PAGE_LIMIT, "offset": 0}) for path, max_age in paths])
+        rest = [(path, max_age, {"limit": PAGE_LIMIT, "offset": offset})
+                for (path, max_age), body in zip(paths, first)
+                for offset in range(PAGE_LIMIT, int(body["MRData"]["total"]), PAGE_LIMIT)]
+        pages = first + self.fetch_many(rest)
+
+        races = {}
+        for body in pages:
+            for race in body["MRData"]["RaceTable"]["Races"]:
+                key = (int(race["season"]), int(race["round"]))
+                if key not in races:
+                    races[key] = race
+                else:
+                    for results_key in ("Results", "SprintResults"):
+                        if results_key in race:
+                            races[key].setdefault(results_key, []).extend(race[results_key])
+        return [races[key] for key in sorted(races)]
+
+    # --- season-wide endpoints ---
+
+    @staticmethod
+    def _max_age(season):
+        return None if season < date.today().year else CURRENT_SEASON_MAX_AGE
+
+    def schedule(self, seasons):
+        seasons = [seasons] if isinstance(seasons, int) else list(seasons)
+        races = self._races([(str(s), self._max_age(s)) for s in seasons])
+        return pd.DataFrame({
+            "season": [int(r["season"]) for r in races],
+            "round": [int(r["round"]) for r in races],
+            "raceName": [r["raceName"] for r in races],
+            "date": pd.to_datetime([r["date"] for r in races]),
+        })
+
+    def season_results(self, seasons, sprint=False):
+        # Race (or sprint) results for one or more seasons as one flat frame
+        seasons = [seasons] if isinstance(seasons, int) else list(seasons)
+        endpoint = "sprint" if sprint else "results"
+        races = self._races([(f"{s}/{endpoint}", self._max_age(s)) for s in seasons])
+        return _results_frame(races, "SprintResults" if sprint else "Results")
+
+    def round_results(self, rounds, sprint=False):
+        # Results for specific (season, round) pairs, fetched concurrently
+        endpoint = "sprint" if sprint else "results"
+        races = self._races([(f"{s}/{r}/{endpoint}", self._max_age(s)) for s, r in rounds])
+        return _results_frame(races, "SprintResults" if sprint else "Results")
+
+    def season_points(self, seasons, rounds=None):
+        # GP + sprint points per driver and round. `rounds` restricts the fetch
+        # to specific (season, round) pairs instead of whole seasons.
+        if rounds is None:
+            gp = self.season_results(seasons)
+            sprint = self.season_results(seasons, sprint=True)
+        else:
+            gp = self.round_results(rounds)
+            sprint = self.round_results(rounds, sprint=True)
+        return merge_sprint_points(gp, sprint)
+
+
+def merge_sprint_points(gp, sprint):
+    points = gp[["season", "round", "raceName", "driverCode", "points"]].copy()
+    if len(sprint):
+        sprint = sprint[["season", "round", "driverCode", "points"]].rename(columns={"points": "sprintPoints"})
+        points = points.merge(sprint, on=["season", "round", "driverCode"], how="left")
+        points["points"] += points.pop("sprintPoints").fillna(0)
+    return points
+
+
+def _results_frame(races, results_key):
+    rows = []
+    for race in races:
+        for res in race.get(results_key, []):
+            driver = res["Driver"]
+            rows.append({
+                "season": int(race["season"]),
+                "round": int(race["round"]),
+                "raceName": race["raceName"],
+                # drivers before 2014 have no three-letter code
+                "driverCode": driver.get("code", driver["driverId"]),
+                "driverId": driver["driverId"],
+                "constructorId": res["Constructor"]["constructorId"],
+                "grid": int(res["grid"]),
+                "position": int(res["position"]),
+                "points": float(res["points"]),
+                "status": res["status"],
+            })
+    columns = ["season", "round", "raceName", "driverCode", "driverId", "constructorId",
+               "grid", "position", "points", "status"]
+    return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,193 @@
+import argparse
+import sys
+from pathlib import Path
+
+# One entry point for the scripts in this repo:
+#
+#   python f1.py predict 4 --simulate         runs f1predictor4.py
+#   python f1.py wet-score --wet 2024 Canada --dry 2025 Canada
+#   python f1.py heatmap 2024                 (or: heatmap 1950 2025 --top 40)
+#   python f1.py speedmap 2024 Monaco LEC     (or: --batch for every driver & session)
+#   python f1.py racepace 2025 Monaco --sessions FP2
+#   python f1.py startup-check                import time budgets
+#
+# Only argparse is imported up front. pandas, sklearn, fastf1, matplotlib and
+# plotly are imported inside the subcommand that needs them, so --help and
+# argument errors come back immediately. `startup-check` keeps it that way:
+# it runs `python -X importtime` on the entry point and fails when startup
+# imports one of HEAVY_MODULES or goes over its time budget.
+
+ROOT = Path(__file__).resolve().parent
+
+HEAVY_MODULES = ("numpy", "pandas", "sklearn", "fastf1", "matplotlib", "plotly", "pyarrow", "requests")
+STARTUP_BUDGET_MS = 150   # all imports of `f1.py <command> --help`
+
+
+def _gp(value):
+    return int(value) if value.isdigit() else value
+
+
+# --- subcommands, heavy imports inside ---
+
+def cmd_predict(args):
+    import runpy
+    sys.argv = [f"f1predictor{args.variant}.py"] + (["--simulate"] if args.simulate else [])
+    runpy.run_path(str(ROOT / sys.argv[0]), run_name="__main__")
+
+
+def cmd_wet_score(args):
+    from wet_performance import wet_performance_table
+    wet, dry = (int(args.wet[0]), _gp(args.wet[1])), (int(args.dry[0]), _gp(args.dry[1]))
+    table = wet_performance_table(wet, dry)
+    print(f"\n🌧️ Driver Wet Performance scores ({wet[1]} {wet[0]} wet vs {dry[1]} {dry[0]} dry):")
+    print(table.to_string(index=False))
+
+
+def cmd_heatmap(args):
+    from heatmap import career_heatmap, season_heatmap
+    if args.last is None:
+        fig = season_heatmap(args.first)
+    else:
+        fig = career_heatmap(args.first, args.last, args.top)
+    if args.out:
+        fig.write_html(args.out)
+        print(f"Heatmap written to {args.out}")
+    else:
+        from plotly.io import show
+        show(fig)
+
+
+def cmd_speedmap(args):
+    if args.batch:
+        from speedmap_batch import run_batch
+        manifest = run_batch(args.year, _gp(args.gp), args.sessions, args.driver and [args.driver],
+                             args.out or "speedmaps", workers=args.workers)
+        print(f"{len(manifest['jobs'])} maps in {manifest['wall_s']:.1f}s, manifest in "
+              f"{args.out or 'speedmaps'}/manifest.json")
+        return
+
+    if args.driver is None:
+        raise SystemExit("speedmap: a driver code is needed unless --batch is given")
+    if args.out:
+        import matplotlib
+        matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+    from sessions import load_session
+    from speedmap import speed_map, track_points
+
+    session_type = (args.sessions or ["R"])[0]
+    session = load_session(args.year, _gp(args.gp), session_type, profile="telemetry")
+    points = track_points(session.telemetry(args.driver, columns=["X", "Y", "Speed"]))
+    fig = speed_map(points, f"{session.event['EventName']} {args.year} - {args.driver}'s Speed")
+    if args.out:
+        fig.savefig(args.out)
+        print(f"Speed map written to {args.out}")
+    else:
+        plt.show()
+
+
+def cmd_racepace(args):
+    from racepace import weekend_pace
+    pace = weekend_pace(args.year, _gp(args.gp), args.sessions)
+    print(f"\n🏎️ Clean-air race pace ({args.year} {args.gp})\n")
+    print(pace.to_string(index=False))
+
+
+def import_times(argv):
+    # For `python -X importtime f1.py <argv>`: cumulative microseconds per
+    # top-level import and the set of every (sub)module imported
+    import re
+    import subprocess
+    result = subprocess.run([sys.executable, "-X", "importtime", str(ROOT / "f1.py")] + argv,
+                            capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(f"f1.py {' '.join(argv)} failed:\n{result.stderr[-2000:]}")
+    times, modules = {}, set()
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)", line)
+        if match is None:
+            continue
+        modules.add(match.group(3))
+        if match.group(2) == " ":   # not nested in another import
+            times[match.group(3)] = int(match.group(1))
+    return times, modules
+
+
+def cmd_startup_check(args):
+    failures = []
+    for command in [[]] + [[name] for name in COMMANDS]:
+        argv = command + ["--help"]
+        times, modules = import_times(argv)
+        heavy = sorted({name.split(".")[0] for name in modules}.intersection(HEAVY_MODULES))
+        total_ms = sum(times.values()) / 1000
+        status = "ok"
+        if heavy:
+            status = f"FAIL imports {', '.join(heavy)}"
+        elif total_ms > args.budget:
+            status = f"FAIL over {args.budget:.0f} ms budget"
+        if status != "ok":
+            failures.append(" ".join(argv))
+        print(f"{' '.join(['f1'] + argv):<28} {total_ms:8.1f} ms  {status}")
+        if args.verbose:
+            for name, us in sorted(times.items(), key=lambda item: -item[1])[:5]:
+                print(f"    {name:<30} {us / 1000:8.1f} ms")
+    if failures:
+        raise SystemExit(f"\nstartup regression in: {'; '.join(failures)}")
+    print("\nstartup within budget")
+
+
+COMMANDS = {
+    "predict": cmd_predict,
+    "wet-score": cmd_wet_score,
+    "heatmap": cmd_heatmap,
+    "speedmap": cmd_speedmap,
+    "racepace": cmd_racepace,
+    "startup-check": cmd_startup_check,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="f1", description="F1 predictions & visualization")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("predict", help="run one of the race predictors (f1predictor1-4)")
+    p.add_argument("variant", type=int, nargs="?", default=4, choices=[1, 2, 3, 4])
+    p.add_argument("--simulate", action="store_true", help="add Monte Carlo win/podium/points probabilities")
+
+    p = sub.add_parser("wet-score", help="wet vs dry driver performance scores")
+    p.add_argument("--wet", nargs=2, type=str, default=["2022", "Canada"], metavar=("YEAR", "GP"))
+    p.add_argument("--dry", nargs=2, type=str, default=["2023", "Canada"], metavar=("YEAR", "GP"))
+
+    p = sub.add_parser("heatmap", help="driver points heatmap for a season or a range of seasons")
+    p.add_argument("first", type=int, help="season, or first season of a range")
+    p.add_argument("last", type=int, nargs="?", help="last season of a range")
+    p.add_argument("--top", type=int, default=40, help="drivers shown in a multi-season heatmap")
+    p.add_argument("--out", help="write HTML instead of opening a browser")
+
+    p = sub.add_parser("speedmap", help="speed map of a driver's session telemetry")
+    p.add_argument("year", type=int)
+    p.add_argument("gp", help="grand prix name or round number")
+    p.add_argument("driver", nargs="?", help="3-letter driver code")
+    p.add_argument("--sessions", nargs="+", help="session (default R), or sessions to batch")
+    p.add_argument("--batch", action="store_true", help="every driver (or the given one) of every session")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--out", help="image file, or output directory with --batch")
+
+    p = sub.add_parser("racepace", help="clean-air long-run pace from practice")
+    p.add_argument("year", type=int)
+    p.add_argument("gp", help="grand prix name or round number")
+    p.add_argument("--sessions", nargs="+", default=["FP1", "FP2", "FP3"])
+
+    p = sub.add_parser("startup-check", help="check import time budgets of the entry point")
+    p.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help="milliseconds")
+    p.add_argument("-v", "--verbose", action="store_true")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
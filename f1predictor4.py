@@ -1,127 +1,95 @@
+import sys
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.metrics import mean_absolute_error
-import fastf1
-from fastf1.ergast import Ergast
-from wet_performance import wet_performance_score # for races after June 15th 2025 change the import to: from wet_performance2 import wet_performance_score
-
-# Enable cache for fastf1
-# fastf1.Cache.enable_cache("f1_cache")  # replace with your cache directory
-
-# Load FastF1 2024 Monaco GP race session
-session_2024 = fastf1.get_session(2024, 8, "R")
-session_2024.load()
-
-# Extract lap times & sector times for all drivers
-laps_2024 = session_2024.laps[["Driver", "LapTime", "Sector1Time", "Sector2Time", "Sector3Time"]].copy()
-laps_2024.dropna(subset=["LapTime"], inplace=True)
-
-# Convert times to seconds
-for col in ["LapTime", "Sector1Time", "Sector2Time", "Sector3Time"]:
-    laps_2024[f"{col} (s)"] = laps_2024[col].dt.total_seconds()
-
-# Group by driver to get average sector times per driver
-sector_times_2024 = laps_2024.groupby("Driver")[["Sector1Time (s)", "Sector2Time (s)", "Sector3Time (s)"]].mean().reset_index()
-
-# TAKE OUT QUALI DATA, more accurate predictions if we use previous year data but it doesn't account for the rookies.
-# Since the 1st F1 race in 1950, only 2 rookies have won a race in their debut season (Nino Farina 1950, Giancarlo Baghetti 1961)
-# 5 drivers made the podium in their rookie year (Lewis Hamilton, Jacques Villeneuve, Michael Schumacher, Lance Stroll, Oscar Piastri)
-
-# 2025 Qualifying session - data from the official F1 App
-# Ordered in starting gride - despite quali times
-# Stroll penalized 4 grid places
-# Hamilton penalized 3 grid places
-# Bearman penalized 10 grid places
-# Russell DNF in Q2, so Q1 lap time used for predictions
-qualifying_2025 = pd.DataFrame({
-    "Driver": ["Lando Norris", "Charles Leclerc", "Oscar Piastri", "Max Verstappen",
-                "Isack Hadjar", "Fernando Alonso", "Lewis Hamilton", "Esteban Ocon",
-                "Liam Lawson", "Alexander Albon", "Carlos Sainz", "Yuki Tsunoda", 
-                "Nico Hulkenberg", "George Russell", "Kimi Antonelli", "Gabriel Bortoleto",
-                "Pierre Gasly", "Franco Colapinto", "Lance Stroll", "Oliver Bearman"],
-    "QualifyingTime (s)": [69.954, 70.063, 70.129, 70.669,
-                           70.924, 70.924, 70.382, 70.942,
-                           71.129, 71.213, 71.362, 71.415 , 
-                           71.596, 71.507, 71.880, 71.902,
-                           71.994, 72.597, 72.563, 71.979]
-})
-
-# FastF1 uses 3-letter driver codes, we need to map them to full driver names
-driver_mapping = {
-    "Lando Norris": "NOR", "Charles Leclerc": "LEC", "Oscar Piastri": "PIA", "Max Verstappen": "VER",
-    "Isack Hadjar": "HAD", "Fernando Alonso": "ALO", "Lewis Hamilton": "HAM", "Esteban Ocon": "OCO",
-    "Liam Lawson": "LAW", "Alexander Albon": "ALB", "Carlos Sainz": "SAI", "Yuki Tsunoda": "TSU", 
-    "Nico Hulkenberg": "HUL", "George Russell": "RUS", "Kimi Antonelli": "ANT", "Gabriel Bortoleto": "BOR",
-    "Pierre Gasly": "GAS", "Franco Colapinto": "COL", "Lance Stroll": "STR", "Oliver Bearman": "BEA"
-}
-
-qualifying_2025["DriverCode"] = qualifying_2025["Driver"].map(driver_mapping)
-
-# Merge 2025 Qualifying Data with 2024 Race Data including sector data
-merged_data = qualifying_2025.merge(sector_times_2024, left_on="DriverCode", right_on="Driver", how="left")
-print("Merged Data:\n", merged_data)
-
-print("\nCalculating Wet Performance Scores...", wet_performance_score)
-
-driver_wet_scores = {
-    wet_performance_score.iloc[i]["Driver"]: wet_performance_score.iloc[i]["WetPerformanceScore"]
-    for i in range(len(wet_performance_score))
-    if wet_performance_score.iloc[i]["Driver"] in merged_data["Driver"].values
-}
-
-# Map wet performance scores to merged_data
-merged_data["WetPerformanceScore"] = merged_data["DriverCode"].map(driver_wet_scores)
-
-# Use only "QualifyingTime (s)" AND Sector Times as features
-X = merged_data[["QualifyingTime (s)", "Sector1Time (s)", "Sector2Time (s)", "Sector3Time (s)"]].fillna(0)
-y = laps_2024.groupby("Driver")["LapTime (s)"].mean().reset_index()["LapTime (s)"].fillna(0)
-
-# Check unique drivers in laps_2024
-print("Drivers in laps_2024:", laps_2024["Driver"].unique())
-
-# Check unique driver codes in merged_data
-print("Driver Codes in merged_data:", merged_data["DriverCode"].unique())
-
-# Ensure y is defined correctly
-y = laps_2024.groupby("Driver")["LapTime (s)"].mean().reset_index().fillna(0)
-# Print before filtering
-print("Before filtering y:", y)
-
-# Filter y to match drivers in merged_data
-y = y[y["Driver"].isin(merged_data["DriverCode"])]  # This line filters out drivers not in merged_data
-# Print after filtering
-print("After filtering y:", y)
-
-# Set Driver as index
-y = y.set_index("Driver")["LapTime (s)"]  # Set Driver as index
-
-# Ensure y is defined
-# y = laps_2024.groupby("Driver")["LapTime (s)"].mean().reset_index()
-# y = y[y["Driver"].isin(merged_data["DriverCode"])]  # Filter y to match drivers in X
-# y = y.set_index("Driver")["LapTime (s)"]  # Set Driver as index
-# print(f"X : {X}, y : {y}")
-# Check if X and y have the same number of samples
-if X.shape[0] != y.shape[0]:
-    raise ValueError(f"Mismatch in number of samples: X has {X.shape[0]} samples, y has {y.shape[0]} samples.")
-
-# Train Gradient Boosting Model
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=38)
-model = GradientBoostingRegressor(n_estimators=200, learning_rate=0.1, random_state=38)
-model.fit(X_train, y_train)
-
-# Predict using 2025 qualifying and sector data
-predicted_lap_times = model.predict(X)
-qualifying_2025["PredictedRaceTime (s)"] = predicted_lap_times
-
-# Rank drivers by predicted race time
-qualifying_2025 = qualifying_2025.sort_values(by="PredictedRaceTime (s)")
-
-# Print final predictions
-print("\n🏁 Predicted 2025 Monaco GP Winner 🏁\n")
-print(qualifying_2025[["Driver", "PredictedRaceTime (s)"]])
-
-# Evaluate Model
-y_pred = model.predict(X_test)
-print(f"\n🔍 Model Error (MAE): {mean_absolute_error(y_test, y_pred):.2f} seconds")
\ No newline at end of file
+from features import SECTOR_COLUMNS, monaco_2025_qualifying, predictor_features
+from lap_table import take_by_driver
+from model_registry import fit_model, load_model
+from race_sim import print_race_probabilities
+from registry import DRIVERS
+
+# Guarded so worker processes (spawn start method) can import the script without rerunning it
+if __name__ == "__main__":
+    # TAKE OUT QUALI DATA, more accurate predictions if we use previous year data but it doesn't account for the rookies.
+    # Since the 1st F1 race in 1950, only 2 rookies have won a race in their debut season (Nino Farina 1950, Giancarlo Baghetti 1961)
+    # 5 drivers made the podium in their rookie year (Lewis Hamilton, Jacques Villeneuve, Michael Schumacher, Lance Stroll, Oscar Piastri)
+
+    # 2025 Qualifying session - data from the official F1 App (see features.py)
+    qualifying_2025 = monaco_2025_qualifying()
+
+    # Feature stages are cached in f1_cache/pipeline and only recomputed when they change:
+    # qualifying with FastF1 driver codes, 2024 Monaco GP race laps (lap & sector times in seconds),
+    # average sector times per driver and average lap time per driver and wet performance scores
+    # (--predict-only: only what the stored model needs, see below)
+    predict_only = "--predict-only" in sys.argv
+    training = [] if predict_only else ["race_laps", "lap_means"]
+    features = predictor_features(qualifying_2025, ["qualifying", "sector_means", "wet_scores"] + training)
+    qualifying_2025 = features["qualifying"]
+    laps_2024 = features.get("race_laps")
+    sector_times_2024 = features["sector_means"]
+    lap_times_2024 = features.get("lap_means")
+    wet_scores = features["wet_scores"]
+
+    # Join 2024 average sector times onto the 2025 qualifying rows by driver id
+    merged_data = qualifying_2025.copy()
+    merged_data[SECTOR_COLUMNS] = take_by_driver(sector_times_2024, merged_data["DriverId"])
+    print("Merged Data:\n", merged_data)
+
+    # Attach wet performance scores by driver id
+    merged_data["WetPerformanceScore"] = take_by_driver(wet_scores, merged_data["DriverId"])
+    print("\nCalculating Wet Performance Scores...", merged_data[["DriverCode", "WetPerformanceScore"]])
+
+    # Use only "QualifyingTime (s)" AND Sector Times as features
+    X = merged_data[["QualifyingTime (s)"] + SECTOR_COLUMNS].fillna(0)
+
+    # Prediction only (python f1predictor4.py --predict-only): the model stored by the last training run,
+    # the 2024 lap means are not loaded and nothing is trained or evaluated
+    if predict_only:
+        model, _ = load_model("f1predictor4", X.columns)
+        if model is None:
+            sys.exit("No stored f1predictor4 model, run python f1predictor4.py to train it first")
+    else:
+        # Average 2024 race lap of each driver, in the same row order as X (NaN if they didn't race)
+        y = pd.Series(take_by_driver(lap_times_2024, merged_data["DriverId"]), index=merged_data["DriverCode"], name="LapTime (s)")
+
+        # Check unique drivers in laps_2024
+        print("Drivers in laps_2024:", DRIVERS.decode(np.unique(laps_2024["DriverId"])))
+
+        # Check unique driver codes in merged_data
+        print("Driver Codes in merged_data:", merged_data["DriverCode"].unique())
+
+        # Only drivers with 2024 race laps can be used for training (rookies have none)
+        known = y.notna().to_numpy()
+        print("Training target y:", y[known])
+        if not known.any():
+            raise ValueError("Dataset is empty after preprocessing. Check data sources!")
+
+        # Train Gradient Boosting Model
+        X_train, X_test, y_train, y_test = train_test_split(X[known], y[known], test_size=0.2, random_state=38)
+        # (stored in f1_cache/models, reused as long as the training data doesn't change)
+        model, action = fit_model("f1predictor4", X_train, y_train,
+                                  GradientBoostingRegressor(n_estimators=200, learning_rate=0.1, random_state=38))
+        print(f"\nModel {action}")
+
+    # Predict using 2025 qualifying and sector data
+    predicted_lap_times = model.predict(X)
+    qualifying_2025["PredictedRaceTime (s)"] = predicted_lap_times
+
+    # Rank drivers by predicted race time
+    qualifying_2025 = qualifying_2025.sort_values(by="PredictedRaceTime (s)")
+
+    # Print final predictions
+    print("\n🏁 Predicted 2025 Monaco GP Winner 🏁\n")
+    print(qualifying_2025[["Driver", "PredictedRaceTime (s)"]])
+
+    if not predict_only:
+        # Evaluate Model
+        y_pred = model.predict(X_test)
+        mae = mean_absolute_error(y_test, y_pred)
+        print(f"\n🔍 Model Error (MAE): {mae:.2f} seconds")
+
+        # Win/podium/points probabilities from 100k simulated races (python f1predictor4.py --simulate)
+        if "--simulate" in sys.argv:
+            print_race_probabilities(qualifying_2025, mae)
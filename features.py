@@ -0,0 +1,132 @@
+import pandas as pd
+
+import lap_stats
+import minisectors
+import racepace
+from lap_masks import REPRESENTATIVE, session_masks
+from lap_table import compact_laps, driver_feature, driver_means
+from pipeline import Node, Pipeline
+from registry import DRIVERS, driver_codes
+from sessions import load_session
+from wet_performance import wet_performance_score
+
+# Feature stages shared by f1predictor1-4, declared as pipeline nodes:
+#
+#   race_laps ---> sector_means
+#             \--> lap_means
+#   qualifying
+#   wet_scores
+#   clean_air_pace    (practice long runs, racepace.py)
+#   minisector_losses (fastest laps on the circuit's minisector index, minisectors.py)
+#   sector_form       (recency-weighted sector times over every folded season, lap_stats.py)
+#
+# Each node is cached on disk by a hash of its code, parameters and inputs
+# (see pipeline.py), so re-running a predictor only recomputes what changed.
+# Laps are compact tables (lap_table.py) and the driver-keyed features are
+# dense arrays indexed by DriverId, joined with lap_table.take_by_driver().
+
+# 2025 Qualifying session - data from the official F1 App
+# Ordered in starting gride - despite quali times
+# Stroll penalized 4 grid places
+# Hamilton penalized 3 grid places
+# Bearman penalized 10 grid places
+# Russell DNF in Q2, so Q1 lap time used for predictions
+MONACO_2025_QUALIFYING = {
+    "Driver": ["Lando Norris", "Charles Leclerc", "Oscar Piastri", "Max Verstappen",
+                "Isack Hadjar", "Fernando Alonso", "Lewis Hamilton", "Esteban Ocon",
+                "Liam Lawson", "Alexander Albon", "Carlos Sainz", "Yuki Tsunoda",
+                "Nico Hulkenberg", "George Russell", "Kimi Antonelli", "Gabriel Bortoleto",
+                "Pierre Gasly", "Franco Colapinto", "Lance Stroll", "Oliver Bearman"],
+    "QualifyingTime (s)": [69.954, 70.063, 70.129, 70.669,
+                           70.924, 70.924, 70.382, 70.942,
+                           71.129, 71.213, 71.362, 71.415 ,
+                           71.596, 71.507, 71.880, 71.902,
+                           71.994, 72.597, 72.563, 71.979]
+}
+
+LAP_COLUMNS = ["Driver", "Team", "Compound", "LapNumber", "Stint", "TyreLife",
+               "LapTime", "Sector1Time", "Sector2Time", "Sector3Time"]
+SECTOR_COLUMNS = ["Sector1Time (s)", "Sector2Time (s)", "Sector3Time (s)"]
+MINISECTOR_COLUMNS = minisectors.SPEED_CLASSES
+
+
+def monaco_2025_qualifying():
+    return pd.DataFrame(MONACO_2025_QUALIFYING)
+
+
+# --- nodes ---
+
+def race_laps(year, gp, session):
+    # Extract lap times & sector times for all drivers, times as float32 seconds
+    # Representative laps only (lap_masks.py): no pit, SC/VSC, deleted or lap-1 laps
+    snapshot = load_session(year, gp, session, profile="laps")
+    laps = snapshot.laps(LAP_COLUMNS)[session_masks(snapshot).select(*REPRESENTATIVE)]
+    return compact_laps(laps)
+
+
+def qualifying(qualifying):
+    # FastF1 uses 3-letter driver codes, we need to map them to full driver names
+    qualifying = qualifying.copy()
+    qualifying["DriverCode"] = driver_codes(qualifying["Driver"])
+    qualifying["DriverId"] = DRIVERS.ids(qualifying["DriverCode"])
+    return qualifying
+
+
+def sector_means(laps):
+    # Average sector times per driver, (drivers, 3) array
+    return driver_means(laps["DriverId"], laps[SECTOR_COLUMNS])
+
+
+def lap_means(laps):
+    # Average race lap per driver, the predictors' target
+    return driver_means(laps["DriverId"], laps["LapTime (s)"])
+
+
+def wet_scores(wet, dry):
+    scores = wet_performance_score(wet, dry)
+    return driver_feature(scores["Driver"], scores["WetPerformanceScore"])
+
+
+def clean_air_pace(year, gp, session):
+    # Corrected long-run pace in clean air from practice (racepace.py), on the
+    # compound most drivers ran long, NaN for drivers without a run on it
+    pace = racepace.session_pace(year, gp, session)
+    if pace.empty:
+        return driver_feature([], [])
+    pace = pace[pace["Compound"] == racepace.reference_compound(pace)]
+    return driver_feature(pace["Driver"], pace["CleanAirPace (s)"])
+
+
+def minisector_losses(year, gp, session):
+    # Time lost to the best in low/medium/high speed minisectors on each
+    # driver's fastest lap, (drivers, 3) array, NaN without telemetry
+    times, _, index = minisectors.minisector_times(year, gp, session)
+    losses = minisectors.minisector_losses(times, index)
+    return driver_means(DRIVERS.ids(losses.index), losses[MINISECTOR_COLUMNS])
+
+
+def sector_form(year, gp, stats_state):
+    # EWMA sector times per driver at this event's circuit from the online
+    # statistics, (drivers, 3) array; stats_state only keys the cache to the
+    # stored accumulators (python lap_stats.py update folds in new races)
+    circuit = load_session(year, gp, "R", profile="laps").event.get("Location")
+    return lap_stats.LapStatsStore().stats.sector_features(circuit)
+
+
+def predictor_pipeline(qualifying_times, year=2024, gp=8, session="R",
+                       wet=(2022, "Canada"), dry=(2023, "Canada"), practice="FP2"):
+    return Pipeline([
+        Node("race_laps", race_laps, year=year, gp=gp, session=session),
+        Node("qualifying", qualifying, qualifying=qualifying_times),
+        Node("sector_means", sector_means, deps=["race_laps"]),
+        Node("lap_means", lap_means, deps=["race_laps"]),
+        Node("wet_scores", wet_scores, wet=tuple(wet), dry=tuple(dry)),
+        Node("clean_air_pace", clean_air_pace, year=year, gp=gp, session=practice),
+        Node("minisector_losses", minisector_losses, year=year, gp=gp, session=session),
+        Node("sector_form", sector_form, year=year, gp=gp, stats_state=lap_stats.state()),
+    ])
+
+
+def predictor_features(qualifying_times, targets, **kwargs):
+    # Run (or load) only the nodes needed for `targets`
+    return predictor_pipeline(qualifying_times, **kwargs).run(targets)
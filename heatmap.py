@@ -0,0 +1,69 @@
+import argparse
+from datetime import date
+
+import plotly.express as px
+from plotly.io import show
+
+from instrument import traced
+from points_matrix import career_points, update_season, update_seasons
+
+# Points heatmaps rendered from the stored points matrices (points_matrix.py).
+#
+#   python heatmap.py 2024          one season, driver x race
+#   python heatmap.py 1950 2025     several seasons, driver x season totals
+
+
+@traced("heatmap.plot")
+def plot_heatmap(results, xlabel='Race'):
+    # Plot the heatmap
+    fig = px.imshow(
+        results,
+        text_auto=True,
+        aspect='auto',  # Automatically adjust the aspect ratio
+        color_continuous_scale=[[0,    'rgb(198, 219, 239)'],  # Blue scale
+                                [0.25, 'rgb(107, 174, 214)'],
+                                [0.5,  'rgb(33,  113, 181)'],
+                                [0.75, 'rgb(8,   81,  156)'],
+                                [1,    'rgb(8,   48,  107)']],
+        labels={'x': xlabel,
+                'y': 'Driver',
+                'color': 'Points'}       # Change hover texts
+    )
+    fig.update_xaxes(title_text='')      # Remove axis titles
+    fig.update_yaxes(title_text='')
+    fig.update_yaxes(tickmode='linear')  # Show all ticks, i.e. driver names
+    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='LightGrey',
+                     showline=False,
+                     tickson='boundaries')              # Show horizontal grid only
+    fig.update_xaxes(showgrid=False, showline=False)    # And remove vertical grid
+    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)')     # White background
+    fig.update_layout(coloraxis_showscale=False)        # Remove legend
+    fig.update_layout(xaxis=dict(side='top'))           # x-axis on top
+    fig.update_layout(margin=dict(l=0, r=0, b=0, t=0))  # Remove border margins
+    return fig
+
+
+def season_heatmap(season, client=None):
+    # Drivers ranked by total points, one column per completed race
+    return plot_heatmap(update_season(season, client).ranked())
+
+
+def career_heatmap(first=1950, last=None, top=40, client=None):
+    # Season totals for the `top` drivers by points scored over the whole range
+    last = last or date.today().year
+    table = career_points(update_seasons(range(first, last + 1), client))
+    table = table.loc[table.sum(axis=1).sort_values(ascending=False).index[:top]]
+    return plot_heatmap(table, xlabel='Season')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Driver points heatmap")
+    parser.add_argument("first", type=int, help="season, or first season of a range")
+    parser.add_argument("last", type=int, nargs="?", help="last season of a range")
+    parser.add_argument("--top", type=int, default=40, help="drivers shown in a multi-season heatmap")
+    args = parser.parse_args()
+
+    if args.last is None:
+        show(season_heatmap(args.first))
+    else:
+        show(career_heatmap(args.first, args.last, args.top))
@@ -0,0 +1,160 @@
+import atexit
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+# Stage-level timing and memory instrumentation.
+#
+# Off unless F1_TRACE is set:
+#
+#   F1_TRACE=trace.json python f1predictor4.py
+#   F1_TRACE=trace.json F1_TRACE_MEMORY=1 python wet_performance.py
+#
+# Every span records wall time, CPU time and the process's peak RSS at exit
+# (plus the peak of Python allocations inside the span with F1_TRACE_MEMORY=1,
+# via tracemalloc, which slows the run down). At exit the spans are written as
+# Chrome trace JSON (open in chrome://tracing or https://ui.perfetto.dev) and
+# a per-stage summary table is printed to stderr.
+#
+#   with span("fastf1.load", session="R"):
+#       ...
+#
+#   @traced("model.fit")
+#   def fit(...): ...
+#
+# Disabled, span() returns a shared no-op context manager and traced()
+# returns the function unchanged. Only spans of the main process are
+# collected; worker processes (speedmap_batch, backtest) are not traced.
+
+TRACE_PATH = os.environ.get("F1_TRACE")
+TRACE_MEMORY = TRACE_PATH is not None and os.environ.get("F1_TRACE_MEMORY") == "1"
+
+_events = []
+_local = threading.local()
+_origin = time.perf_counter()
+
+
+def _rss_mb():
+    # ru_maxrss is in kB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class _NoSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __call__(self, func):
+        return func
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.peak = 0
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        if TRACE_MEMORY:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+        stack.append(self)
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu
+        stack = _local.stack
+        stack.pop()
+        args = {**self.args, "cpu_ms": round(cpu * 1000, 3), "max_rss_mb": round(_rss_mb(), 1)}
+        if TRACE_MEMORY:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            args["py_peak_mb"] = round((peak - self.start_memory) / 2**20, 2)
+        if exc[0] is not None:
+            args["error"] = exc[0].__name__
+        _events.append({"name": self.name, "ph": "X", "pid": os.getpid(), "tid": threading.get_native_id(),
+                        "ts": round((self.start - _origin) * 1e6, 1), "dur": round(wall * 1e6, 1),
+                        "args": args})
+        return False
+
+
+def span(name, **args):
+    # Context manager timing one stage, keyword args end up in the trace
+    if TRACE_PATH is None:
+        return _NO_SPAN
+    return Span(name, {k: str(v) for k, v in args.items()})
+
+
+def traced(name=None):
+    # Decorator form of span(), named after the function by default
+    def wrap(func):
+        if TRACE_PATH is None:
+            return func
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(label, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+def summary():
+    # Rows per span name: calls, total wall & CPU time, highest memory figures
+    rows = {}
+    for event in _events:
+        row = rows.setdefault(event["name"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                              "max_rss_mb": 0.0, "py_peak_mb": None})
+        row["calls"] += 1
+        row["wall_s"] += event["dur"] / 1e6
+        row["cpu_s"] += event["args"]["cpu_ms"] / 1000
+        row["max_rss_mb"] = max(row["max_rss_mb"], event["args"]["max_rss_mb"])
+        if "py_peak_mb" in event["args"]:
+            row["py_peak_mb"] = max(row["py_peak_mb"] or 0.0, event["args"]["py_peak_mb"])
+    return sorted(rows.items(), key=lambda item: -item[1]["wall_s"])
+
+
+def format_summary(rows):
+    lines = [f"{'stage':<40} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'rss MB':>8} {'py peak MB':>11}"]
+    for name, row in rows:
+        peak = "" if row["py_peak_mb"] is None else f"{row['py_peak_mb']:.2f}"
+        lines.append(f"{name:<40} {row['calls']:>6} {row['wall_s']:>9.3f} {row['cpu_s']:>9.3f} "
+                     f"{row['max_rss_mb']:>8.1f} {peak:>11}")
+    return "\n".join(lines)
+
+
+def export(path=None):
+    path = path or TRACE_PATH
+    with open(path, "w") as f:
+        json.dump({"traceEvents": _events, "displayTimeUnit": "ms"}, f)
+    print(f"\n⏱️ Trace: {path} ({len(_events)} spans)\n{format_summary(summary())}", file=sys.stderr)
+
+
+if TRACE_PATH is not None:
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    atexit.register(export)
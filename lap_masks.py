@@ -0,0 +1,127 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Lap validity index, computed once per session snapshot.
+#
+# Each mask is one bit per row of the snapshot's laps.parquet (same order as
+# Snapshot.laps()), packed with np.packbits and stored next to it:
+#
+#   f1_cache/snapshots/2024/08_R/lap_masks.npz
+#
+#   has_time      LapTime present
+#   green         track status "1" for the whole lap (no yellow, SC, VSC, red)
+#   no_pit        neither an in-lap nor an out-lap
+#   not_deleted   not deleted by race control. Needs the Deleted column, which FastF1
+#                 only fills when race control messages are loaded: selecting it on
+#                 a snapshot without any Deleted values warns (every lap counts as kept)
+#   accurate      FastF1's IsAccurate timing check passed
+#   not_lap1      not the standing-start lap
+#
+# Features combine masks bitwise on the packed bytes and unpack once:
+#
+#   masks = session_masks(snapshot)
+#   laps = snapshot.laps(columns)[masks.select(*REPRESENTATIVE)]
+#   wet_laps = masks.select("has_time", "no_pit") & is_wet     # with any other bool array
+#
+# The index is rebuilt when laps.parquet changes (size / mtime recorded).
+
+MASK_COLUMNS = ["LapTime", "TrackStatus", "PitInTime", "PitOutTime", "Deleted", "IsAccurate", "LapNumber"]
+
+# Laps that show a driver's pace: what lap/sector means should be taken over
+REPRESENTATIVE = ("has_time", "green", "no_pit", "not_deleted", "not_lap1")
+
+
+def _flag(laps, name, unknown):
+    # Boolean column with missing values (and a missing column) as `unknown`
+    if name not in laps:
+        return np.full(len(laps), unknown)
+    return pd.array(laps[name], dtype="boolean").fillna(unknown).to_numpy(dtype=bool)
+
+
+def compute_masks(laps):
+    # {name: bool array} from a laps frame with (some of) MASK_COLUMNS
+    def missing(name):
+        return laps[name].isna().to_numpy() if name in laps else np.ones(len(laps), dtype=bool)
+
+    status = laps["TrackStatus"].astype(str) if "TrackStatus" in laps else pd.Series("1", index=laps.index)
+    lap = laps["LapNumber"].to_numpy() if "LapNumber" in laps else np.full(len(laps), 2)
+    return {
+        "has_time": ~missing("LapTime"),
+        "green": (status == "1").to_numpy(),
+        "no_pit": missing("PitInTime") & missing("PitOutTime"),
+        "not_deleted": ~_flag(laps, "Deleted", False),
+        "accurate": _flag(laps, "IsAccurate", True),
+        "not_lap1": lap > 1,
+    }
+
+
+class LapMasks:
+
+    def __init__(self, n, packed, deleted_known=True):
+        self.n = n
+        self.packed = packed   # {name: uint8 array of ceil(n / 8) bytes}
+        self.deleted_known = deleted_known   # any Deleted value present, else not_deleted keeps everything
+
+    def __repr__(self):
+        return f"<LapMasks {self.n} laps: {', '.join(self.packed)}>"
+
+    @classmethod
+    def from_frame(cls, laps):
+        # Masks for an in-memory laps frame (not stored), rows in the frame's order
+        packed = {name: np.packbits(mask) for name, mask in compute_masks(laps).items()}
+        deleted_known = "Deleted" in laps and bool(laps["Deleted"].notna().any())
+        return cls(len(laps), packed, deleted_known or len(laps) == 0)
+
+    def __getitem__(self, name):
+        return self.unpack(self.packed[name])
+
+    def unpack(self, packed):
+        return np.unpackbits(packed, count=self.n).astype(bool)
+
+    def all_of(self, *names):
+        # Packed AND of several masks
+        if "not_deleted" in names and not self.deleted_known:
+            warnings.warn("laps have no Deleted values (snapshot loaded without race control messages), "
+                          "not_deleted keeps every lap", stacklevel=3)
+        out = self.packed[names[0]].copy()
+        for name in names[1:]:
+            out &= self.packed[name]
+        return out
+
+    def select(self, *names):
+        # Bool row selector for laps.parquet rows passing every named mask
+        return self.unpack(self.all_of(*(names or REPRESENTATIVE)))
+
+    def count(self, *names):
+        return int(self.select(*names).sum())
+
+
+def _signature(path):
+    stat = path.stat()
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def session_masks(snapshot):
+    laps_path = snapshot.path / "laps.parquet"
+    path = snapshot.path / "lap_masks.npz"
+    signature = _signature(laps_path)
+    if path.exists():
+        with np.load(path) as stored:
+            if "_deleted_known" in stored and np.array_equal(stored["_signature"], signature):
+                return LapMasks(int(stored["_n"]), {k: stored[k] for k in stored.files if not k.startswith("_")},
+                                bool(stored["_deleted_known"]))
+
+    available = set(pq.read_schema(laps_path).names)
+    laps = pd.read_parquet(laps_path, columns=[c for c in MASK_COLUMNS if c in available])
+    masks = LapMasks.from_frame(laps)
+    try:
+        tmp = path.with_name("lap_masks.tmp.npz")
+        np.savez(tmp, _n=masks.n, _signature=signature, _deleted_known=masks.deleted_known, **masks.packed)
+        tmp.replace(path)
+    except OSError:   # read-only fixtures: use the masks without storing them
+        pass
+    return masks
+
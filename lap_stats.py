@@ -0,0 +1,375 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from instrument import span
+from lap_masks import REPRESENTATIVE, session_masks
+from lap_table import compact_laps
+from registry import CIRCUITS, COMPOUNDS, DRIVERS
+from sessions import CACHE_DIR, default_store
+
+# Online per-(driver, circuit, compound) lap and sector statistics.
+#
+# Every folded session adds its representative laps (lap_masks.py) to
+# mergeable accumulators, one row per (DriverId, CircuitId, CompoundId):
+#
+#   count, mean, M2        Welford / Chan: merging two partials is exact
+#   ewm_sum, ewm_weight    recency means with forward decay: a session's laps
+#                          are weighted 2 ** (days since EPOCH / HALF_LIFE_DAYS),
+#                          so sums from any sessions in any order add up and
+#                          ewm_sum / ewm_weight weights last season 2x the one before
+#   sketch                 log-bucket histogram (relative accuracy SKETCH_ACCURACY)
+#                          for approximate quantiles, merged by adding counts.
+#                          Kept sparse, (row, metric, bucket, count) per non-empty
+#                          bucket: ~15k buckets per metric would not fit densely
+#
+# for each of METRICS. update() scans only sessions not folded yet; workers
+# each fold a share of them and the parent merges their partials. Features
+# come from a dense (driver, circuit, compound) -> row lookup, so serving a
+# circuit's sector form is a gather over the drivers, not a pass over laps.
+# A quantile pNN is the bucket holding the pooled laps' order statistic at
+# rank NN/100 * (count - 1), so it is within SKETCH_ACCURACY (relative) of
+# np.quantile(..., method="lower"); `python lap_stats.py check` compares them.
+#
+#   f1_cache/lap_stats/stats.npz       accumulators and the sessions folded into them
+#
+#   python lap_stats.py update 2018 2025
+#   python lap_stats.py show Monaco --compound MEDIUM
+#   python lap_stats.py check 2024
+
+LAP_STATS_DIR = CACHE_DIR / "lap_stats"
+FIRST_SEASON = 2018
+SESSIONS = ("R",)
+
+METRICS = ["LapTime (s)", "Sector1Time (s)", "Sector2Time (s)", "Sector3Time (s)"]
+SECTOR_METRICS = METRICS[1:]
+LAP_COLUMNS = ["Driver", "Compound", "LapTime", "Sector1Time", "Sector2Time", "Sector3Time"]
+
+EPOCH = date(2018, 1, 1)
+HALF_LIFE_DAYS = 365.0
+
+SKETCH_ACCURACY = 1e-4                 # ~8 ms on a 75 s lap
+SKETCH_MIN, SKETCH_MAX = 10.0, 200.0  # seconds, values outside land in the end buckets
+GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+N_BUCKETS = int(np.ceil(np.log(SKETCH_MAX / SKETCH_MIN) / np.log(GAMMA))) + 1
+
+STATES = ["count", "mean", "m2", "ewm_sum", "ewm_weight"]
+
+
+def recency_weight(day):
+    return 2.0 ** (day / HALF_LIFE_DAYS)
+
+
+def bucket(values):
+    # Sketch bucket of each value: bucket b holds (MIN * GAMMA^(b-1), MIN * GAMMA^b]
+    b = np.ceil(np.log(np.maximum(values, SKETCH_MIN) / SKETCH_MIN) / np.log(GAMMA))
+    return np.clip(b, 0, N_BUCKETS - 1).astype(np.intp)
+
+
+def bucket_value(b):
+    # Estimate within SKETCH_ACCURACY of every value in the bucket
+    return SKETCH_MIN * 2 * GAMMA ** b / (GAMMA + 1)
+
+
+def _sketch(row, metric, b, count):
+    # Sparse sketch entries (row, metric, bucket, count), duplicates summed, sorted
+    cell = (np.asarray(row, np.int64) * len(METRICS) + metric) * N_BUCKETS + b
+    cells, inverse = np.unique(cell, return_inverse=True)
+    counts = np.bincount(inverse, count, len(cells))
+    row, rest = np.divmod(cells, len(METRICS) * N_BUCKETS)
+    return np.column_stack([row, *np.divmod(rest, N_BUCKETS), counts]).astype(np.int64)
+
+
+def _codes(keys):
+    # (rows, 3) DriverId, CircuitId, CompoundId -> one sortable int64 per row (-1s included)
+    keys = keys.astype(np.int64) + 1
+    return (keys[:, 0] << 32) | (keys[:, 1] << 16) | keys[:, 2]
+
+
+class LapStats:
+
+    def __init__(self, keys, count, mean, m2, ewm_sum, ewm_weight, sketch):
+        self.keys = keys                # (rows, 3) int16
+        self.count = count              # (rows, metrics) float64, likewise the other states
+        self.mean = mean
+        self.m2 = m2
+        self.ewm_sum = ewm_sum
+        self.ewm_weight = ewm_weight
+        self.sketch = sketch            # (entries, 4) int64: row, metric, bucket, count
+        self._lookup = None
+
+    def __repr__(self):
+        return f"<LapStats {len(self)} driver/circuit/compound rows, {int(self.count[:, 0].sum())} laps>"
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def empty(cls):
+        states = [np.zeros((0, len(METRICS))) for _ in STATES]
+        return cls(np.zeros((0, 3), np.int16), *states, np.zeros((0, 4), np.int64))
+
+    @classmethod
+    def from_laps(cls, laps, circuit_id, day):
+        # Partial for one session: compact laps (DriverId, CompoundId, METRICS), session day since EPOCH
+        laps = laps[laps["DriverId"] >= 0]
+        keys = np.column_stack([laps["DriverId"], np.full(len(laps), circuit_id), laps["CompoundId"]])
+        codes, first, group = np.unique(_codes(keys), return_index=True, return_inverse=True)
+        rows, values = len(codes), laps[METRICS].to_numpy(np.float64)
+
+        count, mean, m2 = (np.zeros((rows, len(METRICS))) for _ in range(3))
+        sketch = []
+        for k in range(len(METRICS)):
+            ok = ~np.isnan(values[:, k])
+            g, x = group[ok], values[ok, k]
+            count[:, k] = np.bincount(g, minlength=rows)
+            mean[:, k] = np.divide(np.bincount(g, x, rows), count[:, k], out=np.zeros(rows), where=count[:, k] > 0)
+            m2[:, k] = np.bincount(g, (x - mean[g, k]) ** 2, rows)
+            sketch.append(np.column_stack([g, np.full(len(g), k), bucket(x), np.ones(len(g))]))
+        sketch = _sketch(*np.concatenate(sketch).T)
+        weight = recency_weight(day)
+        return cls(keys[first].astype(np.int16), count, mean, m2, weight * count * mean, weight * count, sketch)
+
+    def merge(self, other):
+        # Union of both key sets; per key Chan's combination of count/mean/M2, sums for the rest
+        codes_a, codes_b = _codes(self.keys), _codes(other.keys)
+        codes, inverse = np.unique(np.concatenate([codes_a, codes_b]), return_inverse=True)
+        ia, ib = inverse[:len(codes_a)], inverse[len(codes_a):]
+
+        def spread(a, b):
+            out_a, out_b = np.zeros((2, len(codes)) + a.shape[1:], a.dtype)
+            out_a[ia], out_b[ib] = a, b
+            return out_a, out_b
+
+        keys = np.zeros((len(codes), 3), np.int16)
+        keys[ia], keys[ib] = self.keys, other.keys
+        na, nb = spread(self.count, other.count)
+        ma, mb = spread(self.mean, other.mean)
+        m2a, m2b = spread(self.m2, other.m2)
+        n = na + nb
+        share = np.divide(nb, n, out=np.zeros_like(n), where=n > 0)
+        delta = mb - ma
+        return LapStats(keys, n, ma + delta * share, m2a + m2b + delta ** 2 * na * share,
+                        sum(spread(self.ewm_sum, other.ewm_sum)), sum(spread(self.ewm_weight, other.ewm_weight)),
+                        _sketch(np.concatenate([ia[self.sketch[:, 0]], ib[other.sketch[:, 0]]]),
+                                *np.concatenate([self.sketch[:, 1:], other.sketch[:, 1:]]).T))
+
+    # --- serving ---
+
+    def lookup(self):
+        # Dense (driver, circuit, compound + 1) -> row, -1 where there is no row
+        if self._lookup is None:
+            size = [max(len(registry), int(self.keys[:, k].max(initial=0)) + 1)
+                    for k, registry in enumerate([DRIVERS, CIRCUITS, COMPOUNDS])]
+            shape = (size[0], size[1], size[2] + 1)
+            self._lookup = np.full(shape, -1, np.int32)
+            self._lookup[self.keys[:, 0], self.keys[:, 1], self.keys[:, 2] + 1] = np.arange(len(self))
+        return self._lookup
+
+    def feature(self, metric, stat="ewma", circuit=None, compound=None):
+        # Dense (drivers,) float32 array of one statistic, pooled over every
+        # circuit / compound when not given. stat: count, mean, std, ewma or
+        # a quantile as p10, p50, ...
+        k = METRICS.index(metric)
+        lookup = self.lookup()
+        c = slice(None) if circuit is None else CIRCUITS.ids([circuit], add=False)[0]
+        t = slice(None) if compound is None else COMPOUNDS.ids([compound], add=False)[0] + 1
+        out = np.full(len(lookup), np.nan, np.float32)
+        if (circuit is not None and c < 0) or (compound is not None and t < 1):
+            return out
+
+        rows = lookup[:, c, t].reshape(len(lookup), -1)   # (drivers, cells)
+        have = rows >= 0
+        rows = np.where(have, rows, 0)
+        n = np.where(have, self.count[rows, k], 0.0)
+        total = n.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if stat == "count":
+                value = total
+            elif stat in ("mean", "std"):
+                mean = self.mean[rows, k]
+                pooled = (n * mean).sum(axis=1) / total
+                if stat == "mean":
+                    value = pooled
+                else:
+                    m2 = np.where(have, self.m2[rows, k] + n * (mean - pooled[:, None]) ** 2, 0.0).sum(axis=1)
+                    value = np.sqrt(m2 / (total - 1))
+            elif stat == "ewma":
+                value = (np.where(have, self.ewm_sum[rows, k], 0.0).sum(axis=1)
+                         / np.where(have, self.ewm_weight[rows, k], 0.0).sum(axis=1))
+            elif stat.startswith("p"):
+                value = self._quantile(k, rows, have, float(stat[1:]) / 100 * (total - 1))
+            else:
+                raise ValueError(f"unknown statistic {stat!r}")
+        out[:] = np.where(total > 0, value, np.nan)
+        return out
+
+    def _quantile(self, k, rows, have, rank):
+        # Per driver: value of the bucket holding the rank-th lap of their pooled sketch entries
+        driver = np.full(len(self), -1)
+        driver[rows[have]] = np.nonzero(have)[0]
+        entries = self.sketch[self.sketch[:, 1] == k]
+        entries = entries[driver[entries[:, 0]] >= 0]
+        cells, inverse = np.unique(driver[entries[:, 0]] * N_BUCKETS + entries[:, 2], return_inverse=True)
+        value = np.full(len(rows), np.nan)
+        if not len(cells):
+            return value
+        counts = np.bincount(inverse, entries[:, 3], len(cells))
+        d, b = np.divmod(cells, N_BUCKETS)                   # sorted by driver, then bucket
+        cum = np.cumsum(counts)
+        start = np.r_[True, d[1:] != d[:-1]]
+        cum -= (cum - counts)[start][np.cumsum(start) - 1]   # running count within each driver
+        above = np.flatnonzero(cum > rank[d])
+        drivers, first = np.unique(d[above], return_index=True)
+        value[drivers] = bucket_value(b[above[first]])
+        return value
+
+    def sector_features(self, circuit=None, compound=None, stat="ewma"):
+        # (drivers, 3) sector times, same layout as features.sector_means()
+        return np.column_stack([self.feature(m, stat, circuit, compound) for m in SECTOR_METRICS])
+
+    def table(self, metric="LapTime (s)", circuit=None, compound=None):
+        stats = ["count", "mean", "std", "ewma", "p10", "p50", "p90"]
+        table = pd.DataFrame({s: self.feature(metric, s, circuit, compound) for s in stats},
+                             index=pd.Index(DRIVERS.decode(np.arange(len(self.lookup()))), name="Driver"))
+        return table.dropna(subset=["count"]).sort_values("ewma")
+
+    # --- persistence ---
+
+    def save(self, path, sessions=()):
+        # One file for the accumulators and the sessions in them, replaced at once
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez_compressed(tmp, keys=self.keys, sketch=self.sketch, accuracy=SKETCH_ACCURACY,
+                            sessions=np.asarray(sorted(sessions), dtype=str), **{s: getattr(self, s) for s in STATES})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        # (stats, sessions folded in), (None, set()) when the sketch was built with other
+        # buckets or the file predates the stored sessions (everything is folded in again)
+        with np.load(path) as data:
+            if "sessions" not in data or float(data["accuracy"]) != SKETCH_ACCURACY:
+                return None, set()
+            return cls(data["keys"], *(data[s] for s in STATES), data["sketch"]), set(data["sessions"].tolist())
+
+
+def session_laps(year, rnd, session, store=None):
+    # (compact representative laps, snapshot) of one session
+    snapshot = (store or default_store()).load(year, rnd, session, profile="laps")
+    return compact_laps(snapshot.laps(LAP_COLUMNS)[session_masks(snapshot).select(*REPRESENTATIVE)]), snapshot
+
+
+def scan_session(year, rnd, session, store=None):
+    laps, snapshot = session_laps(year, rnd, session, store)
+    circuit = CIRCUITS.ids([snapshot.event.get("Location") or f"{year} round {rnd}"])[0]
+    day = (date.fromisoformat(str(snapshot.event.get("EventDate", f"{year}-07-01"))[:10]) - EPOCH).days
+    return LapStats.from_laps(laps, circuit, day)
+
+
+def _scan_share(jobs, store):
+    # One worker's share of the sessions, merged locally: (partial, folded, failed)
+    partial, folded, failed = LapStats.empty(), [], []
+    for job in jobs:
+        try:
+            partial = partial.merge(scan_session(*job, store))
+            folded.append(job)
+        except Exception as exc:   # not run yet or no data, retried on the next update
+            failed.append((*job, str(exc)))
+    return partial, folded, failed
+
+
+class LapStatsStore:
+
+    def __init__(self, root=LAP_STATS_DIR, store=None):
+        self.root = root
+        self.store = store or default_store()
+        path = root / "stats.npz"
+        stats, self.folded = LapStats.load(path) if path.exists() else (None, set())
+        self.stats = stats if stats is not None else LapStats.empty()
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.stats.save(self.root / "stats.npz", self.folded)
+
+    def fold(self, partial):
+        self.stats = self.stats.merge(partial)
+
+    def pending(self, seasons, sessions=SESSIONS):
+        return [(season, rnd, session) for season in seasons for rnd in self.store.rounds(season)
+                for session in self.store.sessions(season, rnd)
+                if session in sessions and f"{season}/{rnd}/{session}" not in self.folded]
+
+    def update(self, seasons=None, sessions=SESSIONS, workers=None):
+        seasons = seasons or range(FIRST_SEASON, date.today().year + 1)
+        jobs = self.pending(seasons, sessions)
+        shares = [jobs[i::workers or os.cpu_count() or 1] for i in range(workers or os.cpu_count() or 1)]
+        failed = []
+        with span("lap_stats.update", sessions=len(jobs)), ProcessPoolExecutor(workers) as pool:
+            for partial, folded, share_failed in pool.map(_scan_share, [s for s in shares if s], [self.store] * len(shares)):
+                self.fold(partial)
+                self.folded.update(f"{season}/{rnd}/{session}" for season, rnd, session in folded)
+                failed += share_failed
+        self._save()
+        return len(jobs) - len(failed), failed
+
+
+def check(seasons, sessions=SESSIONS, quantiles=(10, 50, 90)):
+    # Largest relative error of the sketch quantiles against np.quantile(method="lower")
+    # over each driver's laps, one session at a time
+    store, worst = default_store(), 0.0
+    for season in seasons:
+        for rnd in store.rounds(season):
+            for session in [s for s in store.sessions(season, rnd) if s in sessions]:
+                laps, _ = session_laps(season, rnd, session)
+                laps = laps[laps["DriverId"] >= 0]
+                stats = LapStats.from_laps(laps, 0, 0)
+                for metric in METRICS:
+                    for q in quantiles:
+                        exact = laps.groupby("DriverId")[metric].quantile(q / 100, interpolation="lower").dropna()
+                        approx = stats.feature(metric, f"p{q}")[exact.index.to_numpy()]
+                        worst = max(worst, float(np.max(np.abs(approx / exact.to_numpy() - 1), initial=0)))
+    return worst
+
+
+def state(root=LAP_STATS_DIR):
+    # Size / mtime of the stored accumulators, for caches of features served from them
+    path = root / "stats.npz"
+    return (path.stat().st_size, path.stat().st_mtime_ns) if path.exists() else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online per-driver lap and sector statistics")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("update", help="fold in sessions not seen yet")
+    p.add_argument("first", type=int, nargs="?", default=FIRST_SEASON)
+    p.add_argument("last", type=int, nargs="?", default=date.today().year)
+    p.add_argument("--sessions", nargs="+", default=list(SESSIONS))
+    p.add_argument("--workers", type=int, default=None)
+    p = sub.add_parser("show", help="per-driver statistics at a circuit (all circuits by default)")
+    p.add_argument("circuit", nargs="?")
+    p.add_argument("--compound")
+    p.add_argument("--metric", choices=METRICS, default="LapTime (s)")
+    p = sub.add_parser("check", help="sketch quantiles against exact quantiles of the stored laps")
+    p.add_argument("first", type=int)
+    p.add_argument("last", type=int, nargs="?")
+    p.add_argument("--sessions", nargs="+", default=list(SESSIONS))
+    args = parser.parse_args()
+
+    if args.command == "check":
+        worst = check(range(args.first, (args.last or args.first) + 1), tuple(args.sessions))
+        print(f"Largest relative quantile error {worst:.2e} (bound {SKETCH_ACCURACY:.0e})")
+        raise SystemExit(worst > SKETCH_ACCURACY + 1e-6)   # float32 features
+
+    lap_stats = LapStatsStore()
+    if args.command == "update":
+        folded, failed = lap_stats.update(range(args.first, args.last + 1), tuple(args.sessions), args.workers)
+        print(f"Folded in {folded} sessions ({len(failed)} not available), {len(lap_stats.folded)} in total")
+        print(lap_stats.stats)
+    else:
+        where = " ".join(filter(None, [args.circuit, args.compound])) or "all circuits"
+        print(f"\n{args.metric} per driver, {where} ({len(lap_stats.folded)} sessions):")
+        print(lap_stats.stats.table(args.metric, args.circuit, args.compound).round(3).to_string())
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from registry import COMPOUNDS, DRIVERS, TEAMS
+
+# Compact lap tables and driver-keyed features.
+#
+# FastF1 laps carry timedelta columns, float64 copies of them and string
+# driver/team/compound columns. compact_laps() keeps the same information as
+# small integer codes (registry.py) and float32 seconds, which is a fraction
+# of the memory for multi-season lap sets.
+#
+# Driver-keyed features are dense float32 arrays indexed by driver code:
+# feature[DRIVERS.ids(["VER"])[0]] is VER's value. Joining a feature onto any
+# table is then take_by_driver(feature, table["DriverId"]) instead of a merge.
+
+SECONDS_COLUMNS = ["LapTime", "Sector1Time", "Sector2Time", "Sector3Time", "PitInTime", "PitOutTime",
+                   "LapStartTime", "Time"]
+SMALL_INT_COLUMNS = {"LapNumber": np.int16, "Stint": np.int8, "Position": np.int8}
+
+
+def compact_laps(laps):
+    out = pd.DataFrame(index=pd.RangeIndex(len(laps)))
+    out["DriverId"] = DRIVERS.ids(laps["Driver"])
+    if "Team" in laps:
+        out["TeamId"] = TEAMS.ids(laps["Team"])
+    if "Compound" in laps:
+        out["CompoundId"] = COMPOUNDS.ids(laps["Compound"])
+    for col, dtype in SMALL_INT_COLUMNS.items():
+        if col in laps:
+            # missing values become -1
+            out[col] = laps[col].fillna(-1).to_numpy().astype(dtype)
+    if "TyreLife" in laps:
+        out["TyreLife"] = laps["TyreLife"].to_numpy(dtype=np.float32)
+    for col in SECONDS_COLUMNS:
+        if col in laps:
+            out[f"{col} (s)"] = laps[col].dt.total_seconds().to_numpy(dtype=np.float32)
+    return out
+
+
+def driver_means(driver_ids, values, size=None):
+    # NaN-aware per-driver mean of one column (n,) or several (n, k), as a dense
+    # (drivers,) / (drivers, k) float32 array with NaN for drivers without data
+    size = size or len(DRIVERS)
+    ids = np.asarray(driver_ids, dtype=np.intp)
+    values = np.asarray(values, dtype=np.float64)
+    flat = values.ndim == 1
+    values = values.reshape(len(ids), -1)
+
+    out = np.full((size, values.shape[1]), np.nan, dtype=np.float32)
+    for k in range(values.shape[1]):
+        ok = ~np.isnan(values[:, k]) & (ids >= 0)
+        sums = np.bincount(ids[ok], weights=values[ok, k], minlength=size)
+        counts = np.bincount(ids[ok], minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[:, k] = np.where(counts > 0, sums / counts, np.nan)
+    return out[:, 0] if flat else out
+
+
+def driver_feature(driver_codes, values, size=None):
+    # Dense driver-keyed array from a (codes, values) pair, e.g. a score table.
+    # Lookup only: codes the registry doesn't know (and missing codes) are dropped
+    size = size or len(DRIVERS)
+    ids = DRIVERS.ids(driver_codes, add=False)
+    known = ids >= 0
+    out = np.full(size, np.nan, dtype=np.float32)
+    out[ids[known]] = np.asarray(values, dtype=np.float32)[known]
+    return out
+
+
+def take_by_driver(feature, driver_ids):
+    # Vectorized join: feature value per row, NaN where the driver has none
+    ids = np.asarray(driver_ids, dtype=np.intp)
+    valid = (ids >= 0) & (ids < len(feature))
+    out = np.full((len(ids),) + feature.shape[1:], np.nan, dtype=feature.dtype)
+    out[valid] = feature.take(ids[valid], axis=0)
+    return out
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from instrument import span
+from lap_table import compact_laps
+from sessions import CACHE_DIR, default_store, session_key
+
+# Multi-season lap warehouse, 2018 (first season with FastF1 lap data) to now.
+#
+# Every session's laps are one Parquet partition:
+#
+#   f1_cache/warehouse/season=2024/round=08/session=R/laps.parquet
+#   f1_cache/warehouse/catalog.json      one entry per partition: event, location,
+#                                        street circuit, drivers, teams, compounds,
+#                                        track statuses, row count
+#
+# Within a partition rows are sorted by driver, compound and lap, with one row
+# group per driver, so the Parquet statistics index driver and compound.
+# query() first prunes partitions with the catalog (season, round, session,
+# street circuit, and whether the driver/team/compound/status occurs at all),
+# then reads only the surviving files with a pyarrow filter, which skips every
+# row group whose statistics can't match:
+#
+#   query(drivers=["VER"], compounds=["MEDIUM"], green=True, street=True)
+#
+# update() only builds partitions that are not in the catalog yet, so running
+# it after each weekend adds that weekend's sessions.
+#
+#   python lap_warehouse.py update 2018 2025
+#   python lap_warehouse.py query --drivers VER --compounds MEDIUM --green --street
+
+WAREHOUSE_DIR = CACHE_DIR / "warehouse"
+FIRST_SEASON = 2018
+
+# FastF1 event locations of street and temporary street circuits
+STREET_CIRCUITS = {"monaco", "monte carlo", "baku", "singapore", "marina bay", "jeddah", "miami",
+                   "las vegas", "melbourne", "montréal", "montreal", "sochi", "valencia"}
+
+LAP_COLUMNS = ["Driver", "Team", "Compound", "LapNumber", "Stint", "TyreLife", "Position", "TrackStatus",
+               "Deleted", "IsAccurate", "LapTime", "Sector1Time", "Sector2Time", "Sector3Time",
+               "PitInTime", "PitOutTime", "LapStartTime", "Time"]
+
+PARTITIONING = ds.partitioning(pa.schema([("season", pa.int16()), ("round", pa.int8()),
+                                          ("session", pa.string())]), flavor="hive")
+
+
+def _partition_key(season, rnd, session):
+    return f"{season}/{rnd:02d}/{session_key(session)}"
+
+
+def warehouse_laps(laps):
+    # Compact lap table plus the readable keys queries filter on
+    laps = laps.reset_index(drop=True)
+    out = compact_laps(laps)
+    for col in ("Driver", "Team", "Compound"):
+        out[col] = laps[col].astype("string") if col in laps else pd.Series(pd.NA, index=out.index, dtype="string")
+    status = laps["TrackStatus"].astype("string") if "TrackStatus" in laps else pd.Series("", index=out.index)
+    out["TrackStatus"] = status.fillna("")
+    # green flag: no status other than 1 at any point of the lap
+    out["Green"] = (out["TrackStatus"] == "1").to_numpy()
+    for col in ("Deleted", "IsAccurate"):
+        if col in laps:
+            out[col] = laps[col].astype("boolean")
+    return out.sort_values(["DriverId", "CompoundId", "LapNumber"], ignore_index=True)
+
+
+class LapWarehouse:
+
+    def __init__(self, root=WAREHOUSE_DIR, store=None):
+        self.root = Path(root)
+        self.store = store or default_store()
+        self._catalog = None
+
+    # --- catalog ---
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            path = self.root / "catalog.json"
+            self._catalog = json.loads(path.read_text()) if path.exists() else {}
+        return self._catalog
+
+    def _save_catalog(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f"catalog.json.{os.getpid()}"
+        tmp.write_text(json.dumps(self.catalog, indent=1, sort_keys=True))
+        os.replace(tmp, self.root / "catalog.json")
+
+    def path(self, season, rnd, session):
+        return self.root / f"season={season}" / f"round={rnd:02d}" / f"session={session_key(session)}" / "laps.parquet"
+
+    # --- building ---
+
+    def add_session(self, season, rnd, session):
+        snapshot = self.store.load(season, rnd, session, profile="laps")
+        laps = snapshot.laps()
+        laps = warehouse_laps(laps[[c for c in LAP_COLUMNS if c in laps.columns]])
+
+        path = self.path(season, rnd, snapshot.session)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(laps, preserve_index=False)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        # one row group per driver
+        bounds = np.flatnonzero(np.diff(laps["DriverId"].to_numpy())) + 1
+        with pq.ParquetWriter(tmp, table.schema) as writer:
+            for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(laps)]):
+                writer.write_table(table.slice(start, stop - start))
+        os.replace(tmp, path)
+
+        location = snapshot.event.get("Location", "")
+        self.catalog[_partition_key(season, rnd, snapshot.session)] = {
+            "season": season, "round": rnd, "session": snapshot.session,
+            "event": snapshot.event.get("EventName"), "location": location,
+            "street": location.strip().lower() in STREET_CIRCUITS,
+            "rows": len(laps),
+            "drivers": sorted(laps["Driver"].dropna().unique().tolist()),
+            "teams": sorted(laps["Team"].dropna().unique().tolist()),
+            "compounds": sorted(laps["Compound"].dropna().unique().tolist()),
+            "track_status": sorted(laps["TrackStatus"].unique().tolist()),
+            "green_laps": int(laps["Green"].sum()),
+        }
+
+    def update(self, seasons=None, sessions=None):
+        # Add every finished session that is not in the warehouse yet
+        seasons = seasons or range(FIRST_SEASON, date.today().year + 1)
+        added, failed = [], []
+        for season in seasons:
+            for rnd in self.store.rounds(season):
+                for session in self.store.sessions(season, rnd):
+                    if sessions and session not in sessions:
+                        continue
+                    if _partition_key(season, rnd, session) in self.catalog:
+                        continue
+                    try:
+                        with span("warehouse.add_session", season=season, round=rnd, session=session):
+                            self.add_session(season, rnd, session)
+                    except Exception as exc:   # not run yet or no data, retried on the next update
+                        failed.append((season, rnd, session, str(exc)))
+                        continue
+                    added.append((season, rnd, session))
+                # keep progress if a long backfill is interrupted
+                self._save_catalog()
+        return added, failed
+
+    # --- queries ---
+
+    def partitions(self, seasons=None, rounds=None, sessions=None, drivers=None, teams=None,
+                   compounds=None, green=None, street=None):
+        # Catalog entries that can hold matching laps
+        keep = []
+        for entry in self.catalog.values():
+            if seasons is not None and entry["season"] not in seasons:
+                continue
+            if rounds is not None and entry["round"] not in rounds:
+                continue
+            if sessions is not None and entry["session"] not in sessions:
+                continue
+            if street is not None and entry["street"] != street:
+                continue
+            if green and not entry["green_laps"]:
+                continue
+            if drivers is not None and not set(drivers).intersection(entry["drivers"]):
+                continue
+            if teams is not None and not set(teams).intersection(entry["teams"]):
+                continue
+            if compounds is not None and not set(compounds).intersection(entry["compounds"]):
+                continue
+            keep.append(entry)
+        return sorted(keep, key=lambda e: (e["season"], e["round"], e["session"]))
+
+    def query(self, columns=None, seasons=None, rounds=None, sessions=None, drivers=None, teams=None,
+              compounds=None, green=None, street=None, track_status=None):
+        entries = self.partitions(seasons, rounds, sessions, drivers, teams, compounds, green, street)
+        if not entries:
+            return pd.DataFrame(columns=columns)
+        files = [str(self.path(e["season"], e["round"], e["session"])) for e in entries]
+        dataset = ds.dataset(files, format="parquet", partitioning=PARTITIONING,
+                             partition_base_dir=str(self.root))
+
+        conditions = []
+        if drivers is not None:
+            conditions.append(ds.field("Driver").isin(list(drivers)))
+        if teams is not None:
+            conditions.append(ds.field("Team").isin(list(teams)))
+        if compounds is not None:
+            conditions.append(ds.field("Compound").isin(list(compounds)))
+        if green is not None:
+            conditions.append(ds.field("Green") == green)
+        if track_status is not None:
+            conditions.append(ds.field("TrackStatus").isin(list(track_status)))
+        condition = None
+        for c in conditions:
+            condition = c if condition is None else condition & c
+
+        with span("warehouse.query", partitions=len(files)):
+            table = dataset.to_table(columns=columns, filter=condition)
+        return table.to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-season lap warehouse")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("update", help="add sessions that are not in the warehouse yet")
+    p.add_argument("first", type=int, nargs="?", default=FIRST_SEASON)
+    p.add_argument("last", type=int, nargs="?", default=date.today().year)
+    p.add_argument("--sessions", nargs="+")
+    p = sub.add_parser("query", help="laps matching the filters")
+    p.add_argument("--seasons", nargs="+", type=int)
+    p.add_argument("--sessions", nargs="+")
+    p.add_argument("--drivers", nargs="+")
+    p.add_argument("--teams", nargs="+")
+    p.add_argument("--compounds", nargs="+")
+    p.add_argument("--green", action="store_true", default=None, help="green-flag laps only")
+    p.add_argument("--street", action="store_true", default=None, help="street circuits only")
+    args = parser.parse_args()
+
+    warehouse = LapWarehouse()
+    if args.command == "update":
+        added, failed = warehouse.update(range(args.first, args.last + 1), args.sessions)
+        print(f"Added {len(added)} sessions, {len(failed)} not available, "
+              f"{len(warehouse.catalog)} in the warehouse")
+    else:
+        laps = warehouse.query(seasons=args.seasons, sessions=args.sessions, drivers=args.drivers,
+                               teams=args.teams, compounds=args.compounds, green=args.green, street=args.street)
+        print(laps)
+        print(f"\n{len(laps)} laps")
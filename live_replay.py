@@ -0,0 +1,243 @@
+import argparse
+import json
+import re
+import time
+from datetime import datetime, timezone
+
+# Live-timing replay with a finishing-order prediction after every lap.
+#
+# Reads a FastF1 live-timing recording (python -m fastf1.livetiming save
+# saved_data.txt), one SignalR message per line:
+#
+#   ['TimingData', {'Lines': {'1': {'NumberOfLaps': 12, 'LastLapTime': {'Value': '1:15.123'}}}}, '2024-05-26T13:20:01.123Z']
+#
+# and plays it back at real (--speed 1) or accelerated speed. RaceState keeps
+# one small record per driver; a message only touches the drivers it
+# mentions (O(1) per driver update). Whenever the leader starts a new lap the
+# projected finishing order is emitted:
+#
+#   projected finish = time the driver completed their last lap
+#                      + remaining laps x recent pace (EWMA of green laps)
+#                      + PIT_LOSS if they have not stopped yet
+#
+# Sorting 20 projections is the only per-lap work, so latency does not grow
+# over the race.
+#
+#   python live_replay.py saved_data.txt --speed 100 --laps 78
+#   python live_replay.py --record 2024 Monaco replay.txt     recording from a stored race
+
+PIT_LOSS = 20.0         # seconds
+PACE_ALPHA = 0.3        # EWMA weight of the newest lap
+SLOW_LAP_FACTOR = 1.10  # laps slower than this x the driver's pace (SC, pit) don't update it
+
+
+def _fix_json(line):
+    # same clean-up as fastf1.livetiming: the recording holds Python reprs
+    return line.replace("'", '"').replace("True", "true").replace("False", "false")
+
+
+def parse_line(line):
+    # (topic, data, timestamp in seconds) or None for lines that aren't messages
+    line = line.strip()
+    if not line.startswith("["):
+        return None
+    try:
+        topic, data, stamp = json.loads(_fix_json(line))
+    except (ValueError, TypeError):
+        return None
+    return topic, data, parse_timestamp(stamp)
+
+
+def parse_timestamp(stamp):
+    # '2024-05-26T13:20:01.1234567Z' -> POSIX seconds (fraction trimmed to microseconds)
+    stamp = re.sub(r"(\.\d{6})\d+", r"\1", stamp.rstrip("Z"))
+    return datetime.fromisoformat(stamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+def parse_lap_time(value):
+    # '1:15.123' or '75.123' -> seconds, None when empty
+    if not value:
+        return None
+    minutes, _, seconds = value.rpartition(":")
+    try:
+        return int(minutes or 0) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+class Driver:
+    __slots__ = ("number", "code", "laps", "completed_at", "pace", "stints", "pit_stops", "in_pit", "retired")
+
+    def __init__(self, number):
+        self.number = number
+        self.code = number
+        self.laps = 0
+        self.completed_at = None
+        self.pace = None
+        self.stints = 0
+        self.pit_stops = 0
+        self.in_pit = False
+        self.retired = False
+
+
+class RaceState:
+
+    def __init__(self, total_laps=None, prior_pace=None):
+        # prior_pace: {driver code: predicted race lap (s)}, e.g. from a predictor
+        self.total_laps = total_laps
+        self.prior_pace = prior_pace or {}
+        self.drivers = {}
+        self.lead_lap = 0
+        self.messages = 0
+
+    def _driver(self, number):
+        driver = self.drivers.get(number)
+        if driver is None:
+            driver = self.drivers[number] = Driver(number)
+        return driver
+
+    def handle(self, topic, data, stamp):
+        # Apply one message, returns a prediction when the lead lap advanced
+        self.messages += 1
+        if topic == "DriverList":
+            for number, info in data.items():
+                if isinstance(info, dict) and "Tla" in info:
+                    driver = self._driver(number)
+                    driver.code = info["Tla"]
+                    if driver.pace is None:
+                        driver.pace = self.prior_pace.get(driver.code)
+        elif topic == "LapCount":
+            self.total_laps = data.get("TotalLaps", self.total_laps)
+        elif topic == "TimingAppData":
+            for number, line in data.get("Lines", {}).items():
+                stints = line.get("Stints")
+                if stints:
+                    keys = range(len(stints)) if isinstance(stints, list) else map(int, stints)
+                    self._driver(number).stints = max(self._driver(number).stints, max(keys) + 1)
+        elif topic == "TimingData":
+            advanced = False
+            for number, line in data.get("Lines", {}).items():
+                advanced |= self._timing(self._driver(number), line, stamp)
+            if advanced:
+                return self.prediction()
+        return None
+
+    def _timing(self, driver, line, stamp):
+        if "InPit" in line:
+            driver.in_pit = bool(line["InPit"])
+        if "NumberOfPitStops" in line:
+            driver.pit_stops = int(line["NumberOfPitStops"])
+        if line.get("Retired") or line.get("Stopped"):
+            driver.retired = True
+        laps = line.get("NumberOfLaps")
+        if laps is None or laps <= driver.laps:
+            return False
+
+        driver.laps = laps
+        driver.completed_at = stamp
+        lap_time = parse_lap_time((line.get("LastLapTime") or {}).get("Value"))
+        if lap_time is not None and not driver.in_pit:
+            if driver.pace is None:
+                driver.pace = lap_time
+            elif lap_time <= SLOW_LAP_FACTOR * driver.pace:
+                driver.pace += PACE_ALPHA * (lap_time - driver.pace)
+        if laps > self.lead_lap:
+            self.lead_lap = laps
+            return True
+        return False
+
+    def prediction(self):
+        # [(position, code, laps, projected finish (s from now))] ordered by projected finish
+        total = self.total_laps or self.lead_lap
+        now = max((d.completed_at for d in self.drivers.values() if d.completed_at is not None), default=0.0)
+        projected = []
+        for d in self.drivers.values():
+            if d.retired or d.completed_at is None or d.pace is None:
+                continue
+            remaining = max(total - d.laps, 0)
+            stopped = d.pit_stops > 0 or d.stints > 1
+            finish = d.completed_at - now + remaining * d.pace + (0 if stopped or remaining == 0 else PIT_LOSS)
+            projected.append((finish, d.code, d.laps))
+        ranked = sorted(projected)
+        return [(pos, code, laps, round(finish, 3)) for pos, (finish, code, laps) in enumerate(ranked, start=1)]
+
+
+def replay(lines, speed=100.0, state=None):
+    # Yields (lead lap, prediction, handling latency in s) while pacing the
+    # messages at `speed` x real time (speed=None: as fast as possible)
+    state = state or RaceState()
+    first_stamp = started = None
+    for line in lines:
+        message = parse_line(line)
+        if message is None:
+            continue
+        topic, data, stamp = message
+        if speed:
+            if first_stamp is None:
+                first_stamp, started = stamp, time.perf_counter()
+            wait = (stamp - first_stamp) / speed - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+        t0 = time.perf_counter()
+        prediction = state.handle(topic, data, stamp)
+        if prediction is not None:
+            yield state.lead_lap, prediction, time.perf_counter() - t0
+
+
+def write_recording(year, gp, path):
+    # Recording in the live-timing format from a stored race's laps, for offline replays
+    from sessions import load_session
+
+    session = load_session(year, gp, "R", profile="laps")
+    laps = session.laps(["Driver", "DriverNumber", "LapNumber", "LapTime", "Time", "Stint", "PitInTime"])
+    laps = laps.dropna(subset=["Time", "LapNumber"]).sort_values("Time")
+    start = datetime.fromisoformat(session.event["EventDate"][:10]).replace(hour=13, tzinfo=timezone.utc)
+
+    def stamp(offset):
+        return start.timestamp() + offset.total_seconds()
+
+    def fmt(seconds):
+        return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+    numbers = laps.drop_duplicates("Driver").set_index("Driver")["DriverNumber"].astype(str)
+    with open(path, "w") as f:
+        f.write(str(["DriverList", {n: {"Tla": d} for d, n in numbers.items()}, fmt(start.timestamp())]) + "\n")
+        f.write(str(["LapCount", {"CurrentLap": 1, "TotalLaps": int(laps["LapNumber"].max())},
+                     fmt(start.timestamp())]) + "\n")
+        for row in laps.itertuples():
+            line = {"NumberOfLaps": int(row.LapNumber), "InPit": bool(row.PitInTime == row.PitInTime)}
+            if row.LapTime == row.LapTime:
+                seconds = row.LapTime.total_seconds()
+                line["LastLapTime"] = {"Value": f"{int(seconds // 60)}:{seconds % 60:06.3f}"}
+            ts = fmt(stamp(row.Time))
+            if row.Stint == row.Stint and row.Stint > 1:
+                f.write(str(["TimingAppData", {"Lines": {numbers[row.Driver]: {"Stints": {str(int(row.Stint) - 1): {}}}}},
+                             ts]) + "\n")
+            f.write(str(["TimingData", {"Lines": {numbers[row.Driver]: line}}, ts]) + "\n")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a live-timing recording with per-lap predictions")
+    parser.add_argument("recording", nargs="?", help="FastF1 live-timing recording")
+    parser.add_argument("--speed", type=float, default=100.0, help="x real time, 0 = as fast as possible")
+    parser.add_argument("--laps", type=int, help="race distance when the recording has no LapCount")
+    parser.add_argument("--top", type=int, default=5, help="positions printed per lap")
+    parser.add_argument("--record", nargs=3, metavar=("YEAR", "GP", "OUT"), help="write a recording from a stored race")
+    args = parser.parse_args()
+
+    if args.record:
+        year, gp, out = args.record
+        print(f"Recording written to {write_recording(int(year), int(gp) if gp.isdigit() else gp, out)}")
+        raise SystemExit
+
+    state = RaceState(total_laps=args.laps)
+    latencies = []
+    with open(args.recording) as f:
+        for lap, prediction, latency in replay(f, args.speed, state):
+            latencies.append(latency)
+            order = "  ".join(f"{pos}. {code}" for pos, code, _, _ in prediction[:args.top])
+            print(f"Lap {lap:>3}: {order}")
+    if latencies:
+        print(f"\n{state.messages} messages, {len(latencies)} predictions, "
+              f"latency mean {sum(latencies) / len(latencies) * 1e3:.3f} ms, max {max(latencies) * 1e3:.3f} ms")
@@ -0,0 +1,203 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from alignment import fastest_laps
+from sessions import CACHE_DIR
+from telemetry_store import TelemetryStore
+
+# Per-circuit minisector index.
+#
+# A circuit's reference lap (the fastest stored lap of a session, qualifying
+# by default) is split into N_MINISECTORS equal-distance minisectors. The
+# boundaries are computed once per circuit, season and number of minisectors
+# (layouts change between seasons) and kept with the reference line for plotting:
+#
+#   f1_cache/minisectors/monaco_2024_25.npz    edges (m), reference X/Y/distance,
+#                                              mean reference speed per minisector
+#
+# A lap is mapped onto the index by scaling its distance to the reference
+# length; np.searchsorted then gives every sample's minisector and the sample
+# pair around every boundary, so minisector times are interpolated boundary
+# crossing times and minisector speeds are bincounts, with no per-sample loop.
+#
+#   python minisectors.py 2024 Monaco Q
+#   python minisectors.py 2024 Monaco Q --minisectors 50 --plot monaco.png
+
+MINISECTOR_DIR = CACHE_DIR / "minisectors"
+N_MINISECTORS = 25
+SPEED_CLASSES = ["LowSpeedLoss (s)", "MediumSpeedLoss (s)", "HighSpeedLoss (s)"]
+
+
+def _lap(telemetry, driver, lap):
+    # Distance from the start of the lap (kept increasing), time from the start, speed
+    data = telemetry.driver(driver, lap, ["Distance", "Time", "Speed"])
+    distance = np.asarray(data["Distance"], dtype=np.float64)
+    time = np.asarray(data["Time"], dtype=np.float64)
+    return np.maximum.accumulate(distance - distance[0]), time - time[0], np.asarray(data["Speed"], np.float64)
+
+
+class MinisectorIndex:
+
+    def __init__(self, circuit, edges, reference, speeds):
+        self.circuit = circuit
+        self.edges = edges            # (n + 1,) boundary distances on the reference lap, m
+        self.reference = reference    # (samples, 3) reference lap X, Y, distance
+        self.speeds = speeds          # (n,) mean reference speed per minisector
+
+    def __repr__(self):
+        return f"<MinisectorIndex {self.circuit} {len(self)} minisectors over {self.length:.0f} m>"
+
+    def __len__(self):
+        return len(self.edges) - 1
+
+    @property
+    def length(self):
+        return float(self.edges[-1])
+
+    def scale(self, distance):
+        # Lap distance stretched onto the reference length (drivers' lines differ by a few metres)
+        return distance * (self.length / distance[-1]) if distance[-1] > 0 else distance
+
+    def assign(self, distance):
+        # Minisector (0 .. n-1) of every sample of a scaled lap distance
+        return np.clip(np.searchsorted(self.edges, distance, side="right") - 1, 0, len(self) - 1)
+
+    def lap(self, distance, time, speed=None):
+        # (minisector times, mean minisector speeds) of one lap
+        distance = self.scale(distance)
+        after = np.clip(np.searchsorted(distance, self.edges), 1, len(distance) - 1)
+        d0, d1 = distance[after - 1], distance[after]
+        frac = np.clip(np.divide(self.edges - d0, d1 - d0, out=np.zeros(len(self.edges)), where=d1 > d0), 0, 1)
+        crossing = time[after - 1] + frac * (time[after] - time[after - 1])
+        crossing[0], crossing[-1] = 0.0, time[-1]
+        if speed is None:
+            return np.diff(crossing), None
+        ids = self.assign(distance)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            speeds = np.bincount(ids, speed, len(self)) / np.bincount(ids, minlength=len(self))
+        return np.diff(crossing), speeds
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, circuit=self.circuit, edges=self.edges, reference=self.reference, speeds=self.speeds)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(str(data["circuit"]), data["edges"], data["reference"], data["speeds"])
+
+
+def circuit_key(snapshot):
+    return snapshot.event.get("Location", "").strip().lower().replace(" ", "_") or f"round{snapshot.round:02d}"
+
+
+def build_index(circuit, telemetry, driver, lap, n=N_MINISECTORS):
+    distance, _, speed = _lap(telemetry, driver, lap)
+    edges = np.linspace(0.0, distance[-1], n + 1)
+    xy = telemetry.driver(driver, lap, ["X", "Y"])
+    reference = np.column_stack([xy["X"], xy["Y"], distance]).astype(np.float64)
+    index = MinisectorIndex(circuit, edges, reference, np.zeros(n))
+    index.speeds = index.lap(distance, np.zeros_like(distance), speed)[1]
+    return index
+
+
+def minisector_index(year, gp, session="Q", n=N_MINISECTORS, store=None, root=MINISECTOR_DIR):
+    # The circuit's index for the season, built from this session's fastest lap the first time
+    store = store or TelemetryStore()
+    snapshot = store.snapshots.load(year, gp, session, profile="telemetry")
+    path = root / f"{circuit_key(snapshot)}_{year}_{n}.npz"
+    if path.exists():
+        return MinisectorIndex.load(path)
+    telemetry = store.open(year, gp, session)
+    laps = fastest_laps(store, year, gp, session, telemetry)
+    times = snapshot.laps(["Driver", "LapNumber", "LapTime"]).dropna(subset=["LapTime", "LapNumber"])
+    times = times[[laps.get(d) == int(k) for d, k in zip(times["Driver"], times["LapNumber"])]]
+    best = times.loc[times["LapTime"].idxmin()]
+    index = build_index(circuit_key(snapshot), telemetry, best["Driver"], int(best["LapNumber"]), n)
+    index.save(path)
+    return index
+
+
+def minisector_times(year, gp, session, laps=None, n=N_MINISECTORS, store=None):
+    # (times, speeds) frames, drivers x minisectors, for each driver's fastest stored lap (or `laps`)
+    store = store or TelemetryStore()
+    index = minisector_index(year, gp, session, n, store)
+    telemetry = store.open(year, gp, session)
+    laps = laps or fastest_laps(store, year, gp, session, telemetry)
+    drivers = [d for d in telemetry.drivers if d in laps]
+    rows = [index.lap(*_lap(telemetry, d, laps[d])) for d in drivers]
+    columns = pd.RangeIndex(1, len(index) + 1, name="Minisector")
+    times = pd.DataFrame(np.array([t for t, _ in rows]), index=pd.Index(drivers, name="Driver"), columns=columns)
+    speeds = pd.DataFrame(np.array([s for _, s in rows]), index=times.index, columns=columns)
+    return times, speeds, index
+
+
+def fastest_per_minisector(times):
+    # Minisector, fastest driver, their time and the margin to the next driver
+    ordered = np.sort(times.to_numpy(), axis=0)
+    margin = ordered[1] - ordered[0] if len(times) > 1 else np.full(times.shape[1], np.nan)
+    return pd.DataFrame({"Minisector": times.columns, "Driver": times.idxmin().to_numpy(),
+                         "Time (s)": ordered[0], "Margin (s)": margin})
+
+
+def minisector_losses(times, index):
+    # Time each driver loses to the best in low, medium and high speed minisectors
+    # (reference speed terciles): a corner-type profile the three timing sectors don't give
+    loss = times - times.min()
+    classes = np.digitize(index.speeds, np.nanquantile(index.speeds, [1 / 3, 2 / 3]))
+    return pd.DataFrame({name: loss.loc[:, classes == k].sum(axis=1) for k, name in enumerate(SPEED_CLASSES)})
+
+
+def plot_fastest(index, fastest, title):
+    from matplotlib import pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    from speedmap import track_segments
+
+    drivers = sorted(fastest["Driver"].unique())
+    owner = fastest["Driver"].map({d: k for k, d in enumerate(drivers)}).to_numpy()
+    colours = owner[index.assign(index.reference[:, 2])][:-1]
+    cmap = plt.get_cmap("tab10" if len(drivers) <= 10 else "tab20", len(drivers))
+
+    fig, ax = plt.subplots(figsize=(12, 6.75))
+    lc = LineCollection(track_segments(index.reference), cmap=cmap, norm=plt.Normalize(-0.5, len(drivers) - 0.5))
+    lc.set_array(colours)
+    lc.set_linewidth(4)
+    ax.add_collection(lc)
+    ax.axis("equal")
+    ax.axis("off")
+    cbar = fig.colorbar(lc, ax=ax, ticks=range(len(drivers)))
+    cbar.ax.set_yticklabels(drivers)
+    plt.suptitle(title)
+    return fig
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Minisector times and fastest driver per minisector")
+    parser.add_argument("year", type=int)
+    parser.add_argument("gp", help="grand prix name or round number")
+    parser.add_argument("session", nargs="?", default="Q")
+    parser.add_argument("--minisectors", type=int, default=N_MINISECTORS)
+    parser.add_argument("--plot", help="image file: track coloured by the fastest driver per minisector")
+    args = parser.parse_args()
+
+    gp = int(args.gp) if args.gp.isdigit() else args.gp
+    times, speeds, index = minisector_times(args.year, gp, args.session, n=args.minisectors)
+    fastest = fastest_per_minisector(times)
+    print(f"\n{index}\n")
+    print(fastest.round(3).to_string(index=False))
+    print("\nMinisectors won:")
+    print(fastest["Driver"].value_counts().to_string())
+    print("\nTime lost to the best per minisector type:")
+    print(minisector_losses(times, index).round(3).sort_values("LowSpeedLoss (s)"))
+
+    if args.plot:
+        import matplotlib
+        matplotlib.use("Agg")
+        plot_fastest(index, fastest, f"{args.year} {gp} {args.session} - fastest driver per minisector").savefig(args.plot)
+        print(f"\nMinisector map written to {args.plot}")
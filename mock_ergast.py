@@ -0,0 +1,189 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Ergast API so ergast_client.py (and the heatmap)
+# can run without a network connection.
+#
+# Serves deterministic synthetic seasons in the Ergast JSON layout:
+#   /ergast/f1/<season>.json                    schedule
+#   /ergast/f1/<season>/results.json            race results
+#   /ergast/f1/<season>/sprint.json             sprint results
+#   /ergast/f1/<season>/<round>/results.json    (and /sprint.json)
+# with limit/offset paging, keep-alive connections and an optional
+# requests-per-second limit that answers HTTP 429 like the real API.
+#
+# Run standalone:
+#   python mock_ergast.py --port 8000
+# or from code:
+#   with serve() as mock:
+#       ErgastClient(base_url=mock.url)
+
+RACE_NAMES = ["Bahrain", "Saudi Arabian", "Australian", "Japanese", "Chinese", "Miami",
+              "Emilia Romagna", "Monaco", "Canadian", "Spanish", "Austrian", "British",
+              "Hungarian", "Belgian", "Dutch", "Italian", "Azerbaijan", "Singapore",
+              "United States", "Mexico City", "São Paulo", "Las Vegas", "Qatar", "Abu Dhabi"]
+
+DRIVERS = [("max_verstappen", "VER"), ("norris", "NOR"), ("leclerc", "LEC"), ("piastri", "PIA"),
+           ("sainz", "SAI"), ("hamilton", "HAM"), ("russell", "RUS"), ("perez", "PER"),
+           ("alonso", "ALO"), ("hulkenberg", "HUL"), ("tsunoda", "TSU"), ("stroll", "STR"),
+           ("ocon", "OCO"), ("gasly", "GAS"), ("albon", "ALB"), ("ricciardo", "RIC"),
+           ("bearman", "BEA"), ("magnussen", "MAG"), ("bottas", "BOT"), ("zhou", "ZHO")]
+
+GP_POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+SPRINT_POINTS = [8, 7, 6, 5, 4, 3, 2, 1]
+SPRINT_ROUNDS = {5, 6, 11, 19, 21, 23}
+
+
+def season_races(season):
+    rng = random.Random(season)
+    n_rounds = 24 if season >= 2024 else 22 if season >= 2010 else 16
+    races = []
+    for rnd in range(1, n_rounds + 1):
+        race = {"season": str(season), "round": str(rnd),
+                "raceName": f"{RACE_NAMES[rnd - 1]} Grand Prix",
+                "date": f"{season}-{3 + rnd * 8 // 24:02d}-{1 + rnd % 28:02d}"}
+        order = DRIVERS[:]
+        rng.shuffle(order)
+        race["Results"] = _results(season, order, GP_POINTS)
+        if season >= 2021 and rnd in SPRINT_ROUNDS:
+            sprint_order = order[:]
+            rng.shuffle(sprint_order)
+            race["SprintResults"] = _results(season, sprint_order, SPRINT_POINTS)
+        races.append(race)
+    return races
+
+
+def _results(season, order, points):
+    results = []
+    for pos, (driver_id, code) in enumerate(order, start=1):
+        driver = {"driverId": driver_id}
+        if season >= 2014:
+            driver["code"] = code
+        results.append({
+            "position": str(pos), "grid": str(pos),
+            "points": str(points[pos - 1] if pos <= len(points) else 0),
+            "Driver": driver,
+            "Constructor": {"constructorId": f"team_{DRIVERS.index((driver_id, code)) // 2}"},
+            "status": "Finished",
+        })
+    return results
+
+
+def _page(races, results_key, limit, offset):
+    # Ergast pages over result rows, so one race can be split across pages
+    if results_key is None:
+        rows = [(race, None) for race in races]
+    else:
+        rows = [(race, res) for race in races for res in race.get(results_key, [])]
+    pages = {}
+    for race, res in rows[offset:offset + limit]:
+        page_race = pages.setdefault(race["round"], {k: v for k, v in race.items()
+                                                      if k not in ("Results", "SprintResults")})
+        if res is not None:
+            page_race.setdefault(results_key, []).append(res)
+    return len(rows), list(pages.values())
+
+
+class MockErgast:
+
+    PATH = re.compile(r"^/ergast/f1/(\d{4})(?:/(\d+))?(?:/(results|sprint))?\.json$")
+
+    def __init__(self, host="127.0.0.1", port=0, rate_limit=None):
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self._recent = []
+        self._lock = threading.Lock()
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive
+
+            def do_GET(self):
+                mock._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_port}/ergast/f1"
+
+    def _throttled(self):
+        if self.rate_limit is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._recent = [t for t in self._recent if now - t < 1]
+            if len(self._recent) >= self.rate_limit:
+                return True
+            self._recent.append(now)
+            return False
+
+    def _handle(self, request):
+        with self._lock:
+            self.requests += 1
+        url = urlparse(request.path)
+        match = self.PATH.match(url.path)
+        if match is None:
+            return self._send(request, 404, {"error": "not found"})
+        if self._throttled():
+            return self._send(request, 429, {"error": "rate limited"}, {"Retry-After": "1"})
+
+        season, rnd, endpoint = int(match[1]), match[2], match[3]
+        query = parse_qs(url.query)
+        limit = int(query.get("limit", ["30"])[0])
+        offset = int(query.get("offset", ["0"])[0])
+
+        races = season_races(season)
+        if rnd is not None:
+            races = [race for race in races if race["round"] == rnd]
+        results_key = {"results": "Results", "sprint": "SprintResults", None: None}[endpoint]
+        total, page = _page(races, results_key, limit, offset)
+        self._send(request, 200, {"MRData": {
+            "series": "f1", "url": url.path, "limit": str(limit), "offset": str(offset),
+            "total": str(total), "RaceTable": {"season": str(season), "Races": page}}})
+
+    def _send(self, request, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@contextmanager
+def serve(**kwargs):
+    mock = MockErgast(**kwargs).start()
+    try:
+        yield mock
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic Ergast data locally")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rate-limit", type=int, default=None, help="requests per second before HTTP 429")
+    args = parser.parse_args()
+
+    mock = MockErgast(port=args.port, rate_limit=args.rate_limit)
+    print(f"Mock Ergast API at {mock.url}")
+    mock.server.serve_forever()
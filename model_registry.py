@@ -0,0 +1,91 @@
+import hashlib
+import json
+import pickle
+import time
+
+import pandas as pd
+from sklearn.base import clone
+
+from instrument import traced
+from sessions import CACHE_DIR
+
+# Fitted models kept between runs.
+#
+# Each model is stored under f1_cache/models/<name>/ with its feature schema,
+# estimator parameters and a fingerprint of the data it was trained on.
+# fit_model() then:
+#   * loads the stored model when the training data is unchanged (no training)
+#   * warm-starts extra trees when the new data is the old data plus appended
+#     rows (e.g. one more race), for GradientBoostingRegressor (n_estimators)
+#     and HistGradientBoostingRegressor (max_iter)
+#   * refits from scratch when features, parameters or old rows changed
+# load_model() is for prediction-only runs that never touch training data
+# (python f1predictor2.py --predict-only, python service.py --predict-only).
+
+MODEL_DIR = CACHE_DIR / "models"
+
+# parameter holding the number of trees, per supported estimator
+TREE_PARAMS = {"GradientBoostingRegressor": "n_estimators", "HistGradientBoostingRegressor": "max_iter"}
+
+
+def _data_fingerprint(X, y):
+    # Row order matters, index labels do not (train_test_split reshuffles them)
+    data = pd.util.hash_pandas_object(pd.DataFrame(X).reset_index(drop=True), index=False).to_numpy().tobytes()
+    data += pd.util.hash_pandas_object(pd.Series(y).reset_index(drop=True), index=False).to_numpy().tobytes()
+    return hashlib.sha256(data).hexdigest()
+
+
+def _schema(estimator, X):
+    tree_param = TREE_PARAMS.get(type(estimator).__name__)
+    params = {k: repr(v) for k, v in estimator.get_params().items() if k not in (tree_param, "warm_start")}
+    return {"estimator": type(estimator).__name__, "params": params, "features": [str(c) for c in X.columns]}
+
+
+def _save(name, model, meta):
+    path = MODEL_DIR / name
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / "model.pkl", "wb") as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    (path / "meta.json").write_text(json.dumps(meta, indent=1))
+
+
+def load_model(name, features=None):
+    # Stored model and its metadata, or (None, None). With `features` the
+    # stored schema has to match them.
+    path = MODEL_DIR / name
+    if not (path / "meta.json").exists():
+        return None, None
+    meta = json.loads((path / "meta.json").read_text())
+    if features is not None and meta["features"] != [str(c) for c in features]:
+        return None, None
+    with open(path / "model.pkl", "rb") as f:
+        return pickle.load(f), meta
+
+
+@traced("model.fit")
+def fit_model(name, X, y, estimator, extra_estimators=50):
+    # Returns (model, action) where action is "loaded", "warm-started" or "fitted"
+    X = pd.DataFrame(X)
+    schema = _schema(estimator, X)
+    fingerprint = _data_fingerprint(X, y)
+    model, meta = load_model(name)
+
+    if model is not None and meta["schema"] == schema:
+        if meta["fingerprint"] == fingerprint:
+            return model, "loaded"
+
+        n_old = meta["n_rows"]
+        tree_param = TREE_PARAMS.get(schema["estimator"])
+        appended = len(X) > n_old and _data_fingerprint(X.iloc[:n_old], pd.Series(y).iloc[:n_old]) == meta["fingerprint"]
+        if appended and tree_param is not None:
+            n_trees = getattr(model, tree_param) + extra_estimators
+            model.set_params(warm_start=True, **{tree_param: n_trees})
+            model.fit(X, y)
+            _save(name, model, {**meta, "fingerprint": fingerprint, "n_rows": len(X),
+                                "updates": meta["updates"] + 1, "trained_at": time.time()})
+            return model, "warm-started"
+
+    model = clone(estimator).fit(X, y)
+    _save(name, model, {"schema": schema, "features": schema["features"], "fingerprint": fingerprint,
+                        "n_rows": len(X), "updates": 0, "trained_at": time.time()})
+    return model, "fitted"
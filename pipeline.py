@@ -0,0 +1,214 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import types
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+from instrument import span
+from sessions import CACHE_DIR
+
+# Small declarative pipeline with on-disk caching.
+#
+# A Node is a function plus the names of the nodes it depends on and its own
+# parameters. Its cache key hashes the function's source, its parameters and
+# the keys of its dependencies, so changing one feature (code or parameters)
+# only changes the keys of that node and of the nodes downstream of it.
+# Outputs are pickled to f1_cache/pipeline/<node>/<key>.pkl. A node whose
+# output is cached is loaded without running, or even loading, its
+# dependencies; nodes that do need to run are executed on a thread pool as
+# soon as their inputs are ready, so independent branches run in parallel.
+#
+# The code part of the key covers what the function calls, not only its own
+# source: globals it uses from its own module are hashed by source (functions)
+# or value (constants), and every other module of this repo it reaches
+# (directly or through those functions, e.g. lap_masks.py via racepace.py)
+# by the source of the whole file. Editing a helper therefore invalidates the
+# nodes that use it. Standard library and site-packages code is not hashed.
+# `version` (part of the key, not passed to the function) is left for changes
+# outside the code, e.g. data that was fetched differently.
+
+PIPELINE_DIR = CACHE_DIR / "pipeline"
+REPO_DIR = Path(__file__).resolve().parent
+PLAIN_TYPES = (str, int, float, bool, type(None), tuple, list, dict, set, frozenset)
+
+
+class Node:
+
+    def __init__(self, name, func, deps=(), version=1, **params):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.version = version
+        self.params = params
+
+    def __repr__(self):
+        return f"Node({self.name!r}, deps={self.deps})"
+
+
+def fingerprint(value):
+    # Stable content hash for node parameters
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        labels = list(value.columns) if isinstance(value, pd.DataFrame) else [value.name]
+        data = pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes()
+        return hashlib.sha256(data + repr(labels).encode()).hexdigest()
+    if isinstance(value, dict):
+        return fingerprint(sorted((str(k), fingerprint(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):   # repr order changes between processes
+        return fingerprint(sorted(repr(v) for v in value))
+    if isinstance(value, (list, tuple)):
+        return hashlib.sha256(json.dumps([fingerprint(v) for v in value]).encode()).hexdigest()
+    return hashlib.sha256(repr(value).encode()).hexdigest()
+
+
+def _repo_module(obj):
+    # The module of this repo that obj is (or was defined in, or is an instance of a class from)
+    if isinstance(obj, types.ModuleType):
+        module = obj
+    elif isinstance(obj, (type, types.FunctionType)):
+        module = sys.modules.get(getattr(obj, "__module__", None) or "")
+    else:
+        module = sys.modules.get(type(obj).__module__)
+    path = getattr(module, "__file__", None)
+    return module if path and Path(path).resolve().parent == REPO_DIR else None
+
+
+def _names(code):
+    # Global names used by a code object and the functions / comprehensions nested in it
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _names(const)
+    return names
+
+
+def _module_deps(module, seen):
+    # Repo modules reachable from `module` through its globals, added to `seen`
+    if module.__name__ in seen:
+        return
+    seen[module.__name__] = module
+    for value in list(vars(module).values()):
+        dep = _repo_module(value)
+        if dep is not None:
+            _module_deps(dep, seen)
+
+
+def code_fingerprint(func):
+    # Hash of func's source, the globals it uses from its own module and the
+    # source files of the other repo modules it depends on
+    parts, modules, visited = [], {}, set()
+    home = _repo_module(func)
+
+    def visit(f):
+        f = inspect.unwrap(f)   # decorated (instrument.traced): the function underneath
+        if f in visited:
+            return
+        visited.add(f)
+        try:
+            parts.append(inspect.getsource(f))
+        except (OSError, TypeError):
+            parts.append(f.__qualname__)
+        code = getattr(f, "__code__", None)
+        for name in sorted(_names(code)) if code is not None else ():
+            if name not in f.__globals__:
+                continue
+            value = f.__globals__[name]
+            module = _repo_module(value)
+            if module is None:
+                if isinstance(value, PLAIN_TYPES):   # constants, wherever they were imported from
+                    parts.append(f"{name}={fingerprint(value)}")
+            elif module is not home:
+                _module_deps(module, modules)
+            elif isinstance(value, types.FunctionType):
+                visit(value)
+            elif isinstance(value, type):
+                parts.append(inspect.getsource(value))
+
+    visit(func)
+    for name in sorted(modules):
+        if modules[name] is not home:
+            parts.append(Path(modules[name].__file__).read_text())
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+class Pipeline:
+
+    def __init__(self, nodes, cache_dir=PIPELINE_DIR, max_workers=4):
+        self.nodes = {node.name: node for node in nodes}
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self._keys = {}
+        self.ran = []   # nodes actually computed by the last run()
+
+    def key(self, name):
+        if name not in self._keys:
+            node = self.nodes[name]
+            parts = [name, code_fingerprint(node.func), fingerprint(node.params), str(node.version)]
+            parts += [self.key(dep) for dep in node.deps]
+            self._keys[name] = hashlib.sha256("\0".join(parts).encode()).hexdigest()[:20]
+        return self._keys[name]
+
+    def _path(self, name):
+        return self.cache_dir / name / f"{self.key(name)}.pkl"
+
+    def _plan(self, targets):
+        # Nodes that must run: not cached, and needed by a target that is not cached either
+        to_run, to_load = set(), set()
+
+        def visit(name):
+            if name in to_run or name in to_load:
+                return
+            if self._path(name).exists():
+                to_load.add(name)
+                return
+            to_run.add(name)
+            for dep in self.nodes[name].deps:
+                visit(dep)
+
+        for target in targets:
+            visit(target)
+        return to_run, to_load
+
+    def _compute(self, name, inputs):
+        node = self.nodes[name]
+        with span(f"node.{name}"):
+            output = node.func(*inputs, **node.params)
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+        return output
+
+    def run(self, targets=None):
+        targets = list(targets or self.nodes)
+        to_run, to_load = self._plan(targets)
+
+        outputs = {}
+        for name in to_load:
+            with open(self._path(name), "rb") as f:
+                outputs[name] = pickle.load(f)
+
+        self.ran = []
+        pending = set(to_run)
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            running = {}
+            while pending or running:
+                ready = [name for name in pending if all(dep in outputs for dep in self.nodes[name].deps)]
+                for name in ready:
+                    pending.discard(name)
+                    inputs = [outputs[dep] for dep in self.nodes[name].deps]
+                    running[pool.submit(self._compute, name, inputs)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    outputs[name] = future.result()
+                    self.ran.append(name)
+
+        return {name: outputs[name] for name in targets}
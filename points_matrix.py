@@ -0,0 +1,169 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from ergast_client import ErgastClient
+from instrument import traced
+from sessions import CACHE_DIR
+
+# Persistent driver x round points table for the heatmaps.
+#
+# Points live in a preallocated float32 array (rows = drivers, columns =
+# rounds), NaN where a driver did not take part. Rows are keyed on Ergast's
+# driverId (codes are not unique across eras and pre-2014 drivers have none)
+# and labelled with the driver code. GP and sprint results are accumulated
+# into it with np.add.at, so a driver with two entries in one round (shared
+# drives in the 1950s) gets both, and each run only fetches the rounds that
+# finished since the matrix was last saved to f1_cache/points/<season>.npz.
+
+POINTS_DIR = CACHE_DIR / "points"
+
+
+class PointsMatrix:
+
+    def __init__(self, season, race_names, capacity=32):
+        self.season = season
+        self.race_names = np.asarray(race_names, dtype=str)
+        self.points = np.full((capacity, len(race_names)), np.nan, dtype=np.float32)
+        self.done = np.zeros(len(race_names), dtype=bool)   # rounds already merged
+        self.drivers = []    # driverId per row
+        self.codes = []      # driverCode per row, for labels
+        self._rows = {}
+
+    @property
+    def n_rounds(self):
+        return len(self.race_names)
+
+    def rows_for(self, driver_ids, codes=None):
+        # Row index per driverId, adding new drivers (and growing the array) as needed
+        driver_ids = np.asarray(driver_ids, dtype=object)
+        codes = driver_ids if codes is None else np.asarray(codes, dtype=object)
+        first = ~pd.Index(driver_ids).duplicated()
+        for driver, code in zip(driver_ids[first], codes[first]):
+            if driver not in self._rows:
+                self._rows[driver] = len(self.drivers)
+                self.drivers.append(driver)
+                self.codes.append(code)
+        if len(self.drivers) > self.points.shape[0]:
+            grown = np.full((2 * len(self.drivers), self.n_rounds), np.nan, dtype=np.float32)
+            grown[:self.points.shape[0]] = self.points
+            self.points = grown
+        return np.fromiter((self._rows[d] for d in driver_ids), dtype=np.intp, count=len(driver_ids))
+
+    def _add(self, results):
+        # Accumulate one results frame: cells it touches start from 0, repeated (row, round) pairs add up
+        rows = self.rows_for(results["driverId"].to_numpy(), results["driverCode"].to_numpy())
+        cols = results["round"].to_numpy() - 1
+        self.points[rows, cols] = np.nan_to_num(self.points[rows, cols])
+        np.add.at(self.points, (rows, cols), results["points"].to_numpy(dtype=np.float32))
+
+    def update(self, gp, sprint=None):
+        # gp / sprint: frames with round, driverId, driverCode and points columns (ergast_client format).
+        # Rounds present in `gp` are overwritten, sprint points are added on top.
+        if len(gp) == 0:
+            return
+        rounds = gp["round"].to_numpy() - 1
+        self.points[:, np.unique(rounds)] = np.nan
+        self._add(gp)
+        if sprint is not None and len(sprint):
+            self._add(sprint[sprint["round"].isin(gp["round"])])
+
+        self.done[rounds] = True
+
+    def totals(self):
+        return np.nansum(self.points[:len(self.drivers)], axis=1)
+
+    def ranked(self):
+        # Completed rounds only, drivers sorted by total points (most first)
+        n = len(self.drivers)
+        order = np.argsort(-self.totals(), kind="stable")
+        return pd.DataFrame(self.points[:n][order][:, self.done],
+                            index=pd.Index(labels(self.drivers, self.codes)[order], name="driverCode"),
+                            columns=[name.removesuffix(" Grand Prix") for name in self.race_names[self.done]])
+
+    # --- persistence ---
+
+    def save(self, directory=POINTS_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+        np.savez(directory / f"{self.season}.npz", points=self.points[:len(self.drivers)],
+                 drivers=np.asarray(self.drivers, dtype=str), codes=np.asarray(self.codes, dtype=str),
+                 race_names=self.race_names, done=self.done)
+
+    @classmethod
+    def load(cls, season, directory=POINTS_DIR):
+        path = directory / f"{season}.npz"
+        if not path.exists():
+            return None
+        data = np.load(path)
+        if "codes" not in data:   # saved keyed on driverCode, rebuilt from the API
+            return None
+        matrix = cls(season, data["race_names"], capacity=max(32, len(data["drivers"])))
+        matrix.rows_for(data["drivers"].tolist(), data["codes"].tolist())
+        matrix.points[:len(data["drivers"])] = data["points"]
+        matrix.done = data["done"]
+        return matrix
+
+
+@traced("points.update_seasons")
+def update_seasons(seasons, client=None, today=None):
+    # Bring the stored matrices for `seasons` up to date and return them.
+    # Seasons seen for the first time are fetched in bulk (all seasons at once),
+    # afterwards only rounds that finished since the last run are requested.
+    client = client or ErgastClient()
+    today = pd.Timestamp(today or date.today())
+    seasons = list(seasons)
+
+    matrices = {season: PointsMatrix.load(season) for season in seasons}
+    new = [season for season, matrix in matrices.items() if matrix is None]
+    if new:
+        schedules = client.schedule(new)
+        for season in new:
+            matrices[season] = PointsMatrix(season, schedules.loc[schedules["season"] == season, "raceName"])
+        gp = client.season_results(new)
+        sprint = client.season_results(new, sprint=True)
+        for season in new:
+            matrices[season].update(gp[gp["season"] == season], sprint[sprint["season"] == season])
+            matrices[season].save()
+
+    pending = []
+    known = [season for season in seasons if season not in new and not matrices[season].done.all()]
+    schedules = client.schedule(known) if known else None
+    for season in known:
+        finished = (schedules.loc[schedules["season"] == season, "date"] <= today).to_numpy()
+        pending += [(season, rnd) for rnd in np.flatnonzero(finished & ~matrices[season].done) + 1]
+    if pending:
+        gp = client.round_results(pending)
+        sprint = client.round_results(pending, sprint=True)
+        for season in {season for season, _ in pending}:
+            matrices[season].update(gp[gp["season"] == season], sprint[sprint["season"] == season])
+            matrices[season].save()
+
+    return matrices
+
+
+def update_season(season, client=None, today=None):
+    return update_seasons([season], client, today)[season]
+
+
+def labels(driver_ids, codes):
+    # Driver code per row, the driverId where a code is shared by several drivers (e.g. MSC)
+    ids, codes = np.asarray(driver_ids, dtype=object), np.asarray(codes, dtype=object)
+    shared = pd.Series(ids).groupby(codes).transform("nunique").to_numpy() > 1
+    return np.where(shared, ids, codes)
+
+
+def career_points(matrices):
+    # driver x season total points, built from the per-season matrices
+    ids = np.concatenate([np.asarray(m.drivers, dtype=object) for m in matrices.values()])
+    codes = np.concatenate([np.asarray(m.codes, dtype=object) for m in matrices.values()])
+    # one label per driverId: the latest real code, seasons without one fall back to the driverId
+    codes = pd.Series(np.where(codes == ids, None, codes))
+    latest = codes.groupby(ids, sort=False).last()
+    rows = pd.Index(latest.index)
+    latest = latest.fillna(pd.Series(rows, index=rows))
+    table = np.full((len(rows), len(matrices)), np.nan, dtype=np.float32)
+    for col, matrix in enumerate(matrices.values()):
+        table[rows.get_indexer(matrix.drivers), col] = matrix.totals()
+    index = pd.Index(labels(rows, latest.to_numpy()), name="driverCode")
+    return pd.DataFrame(table, index=index, columns=list(matrices))
@@ -0,0 +1,118 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Monte Carlo race simulator on top of the predicted lap times.
+#
+# Each simulated race is a (drivers, laps) array of lap times:
+#   predicted pace
+#   + a per-race pace offset per driver, N(0, spread)   model uncertainty
+#   + per-lap noise, N(0, LAP_NOISE)                     traffic, mistakes
+# then one pit stop, N(PIT_LOSS, PIT_SPREAD), and a starting-grid offset of
+# GRID_GAP seconds per position from the qualifying order. Races are sampled
+# as simulations x drivers x laps float32 arrays in chunks of CHUNK_SIZE
+# (~CHUNK_SIZE * drivers * laps * 4 bytes each), spread over worker processes,
+# and only the finishing-position counts come back.
+#
+#   python race_sim.py                         2025 Monaco grid, f1predictor1 style pace
+#   python f1predictor4.py --simulate          probabilities from any predictor
+#   python race_sim.py --sims 100000 --workers 8
+
+POINTS = np.array([25, 18, 15, 12, 10, 8, 6, 4, 2, 1], dtype=np.float64)
+
+LAPS = 78              # Monaco
+LAP_NOISE = 0.4        # seconds
+PIT_LOSS = 20.0        # seconds, one stop
+PIT_SPREAD = 1.5
+GRID_GAP = 0.25        # seconds per grid position at the start
+CHUNK_SIZE = 2000      # simulations per chunk
+
+
+def _simulate_chunk(pace, spread, grid_offset, n_sims, laps, seed):
+    # Finishing-position counts (drivers, drivers) for n_sims races
+    rng = np.random.default_rng(seed)
+    n_drivers = len(pace)
+
+    lap_times = rng.standard_normal((n_sims, n_drivers, laps), dtype=np.float32)
+    lap_times *= LAP_NOISE
+    lap_times += (pace + spread * rng.standard_normal((n_sims, n_drivers), dtype=np.float32))[:, :, None]
+
+    race_time = lap_times.sum(axis=2, dtype=np.float64)
+    race_time += grid_offset + rng.normal(PIT_LOSS, PIT_SPREAD, (n_sims, n_drivers))
+
+    finish = race_time.argsort(axis=1).argsort(axis=1)       # 0 = winner
+    driver = np.broadcast_to(np.arange(n_drivers), finish.shape)
+    return np.bincount((driver * n_drivers + finish).ravel(), minlength=n_drivers * n_drivers).reshape(n_drivers, n_drivers)
+
+
+def simulate(pace, spread, grid, n_sims=100_000, laps=LAPS, workers=None, seed=0, chunk_size=CHUNK_SIZE):
+    # Position counts (drivers, drivers): row = driver, column = finishing position
+    pace = np.asarray(pace, dtype=np.float32)
+    spread = np.broadcast_to(np.asarray(spread, dtype=np.float32), pace.shape)
+    grid_offset = (np.asarray(grid, dtype=np.float64) - 1) * GRID_GAP
+
+    sizes = [min(chunk_size, n_sims - start) for start in range(0, n_sims, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(pace, spread, grid_offset, size, laps, s) for size, s in zip(sizes, seeds)]
+
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(sizes) == 1:
+        return sum(_simulate_chunk(*a) for a in args)
+    with ProcessPoolExecutor(workers) as pool:
+        return sum(pool.map(_simulate_chunk, *zip(*args)))
+
+
+def race_probabilities(drivers, pace, spread, grid, n_sims=100_000, laps=LAPS, workers=None, seed=0):
+    counts = simulate(pace, spread, grid, n_sims, laps, workers, seed)
+    p = counts / n_sims
+    n_points = min(len(POINTS), p.shape[1])
+    table = pd.DataFrame({
+        "Driver": list(drivers),
+        "Grid": np.asarray(grid, dtype=int),
+        "Win (%)": p[:, 0] * 100,
+        "Podium (%)": p[:, :3].sum(axis=1) * 100,
+        "Points (%)": p[:, :n_points].sum(axis=1) * 100,
+        "ExpectedPoints": p[:, :n_points] @ POINTS[:n_points],
+        "MeanPosition": p @ np.arange(1, p.shape[1] + 1),
+    })
+    return table.sort_values(["Win (%)", "MeanPosition"], ascending=[False, True], ignore_index=True)
+
+
+def print_race_probabilities(predictions, mae, n_sims=100_000, laps=LAPS, workers=1):
+    # For the predictors: `predictions` has Driver and PredictedRaceTime (s) in
+    # any order, with the index in grid order; the spread of a driver's pace is
+    # taken from the model's MAE (normal errors: sigma = MAE * sqrt(pi / 2)).
+    # One process by default: worker processes re-import the calling script
+    # under the spawn start method (macOS, Windows)
+    started = time.perf_counter()
+    table = race_probabilities(predictions["Driver"], predictions["PredictedRaceTime (s)"],
+                               mae * np.sqrt(np.pi / 2), np.argsort(np.argsort(predictions.index)) + 1,
+                               n_sims, laps, workers)
+    print(f"\n🎲 Race simulation ({n_sims:,} races, {time.perf_counter() - started:.1f} s)\n")
+    print(table.round(2).to_string(index=False))
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo race simulation from predicted lap times")
+    parser.add_argument("--sims", type=int, default=100_000)
+    parser.add_argument("--laps", type=int, default=LAPS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--spread", type=float, default=0.15, help="pace uncertainty per driver (s/lap)")
+    args = parser.parse_args()
+
+    from features import monaco_2025_qualifying
+
+    # Pace from the 2025 grid: qualifying gap carried over into the race, on a 74 s lap
+    grid = monaco_2025_qualifying()
+    pace = 74.0 + (grid["QualifyingTime (s)"] - grid["QualifyingTime (s)"].min())
+
+    started = time.perf_counter()
+    table = race_probabilities(grid["Driver"], pace, args.spread, np.arange(1, len(grid) + 1),
+                               args.sims, args.laps, args.workers)
+    print(f"\n🎲 2025 Monaco GP, {args.sims:,} simulated races in {time.perf_counter() - started:.1f} s\n")
+    print(table.round(2).to_string(index=False))
@@ -1,4 +1,133 @@
-import fastf1
+import argparse
 
+import numpy as np
+import pandas as pd
 
-# FP2 data to predict average race pace in clean air, on the same tyre compounds
\ No newline at end of file
+from lap_masks import REPRESENTATIVE, LapMasks, session_masks
+from sessions import default_store
+
+# FP2 data to predict average race pace in clean air, on the same tyre compounds
+#
+# For one practice session at a time:
+#   1. long runs: stints with at least LONG_RUN_LAPS representative laps
+#      (lap_masks.py: no in/out, non-green or deleted laps; within
+#      SLOW_LAP_FACTOR of the stint median)
+#   2. gap to the car ahead when a lap starts and ends, from the line crossing
+#      times of every car, with two sorted merge_asof joins instead of per-lap loops
+#   3. clean air: both gaps at least CLEAN_AIR_GAP seconds, and at least
+#      MIN_CLEAN_LAPS such laps per driver and compound (else no pace row)
+#   4. pace corrected for fuel burn (FUEL_EFFECT per lap into the stint) and
+#      tyre age (degradation slope per compound, fitted on the clean laps)
+#
+#   python racepace.py 2025 Monaco            FP1-FP3 of the weekend
+#   python racepace.py 2025 Monaco --sessions FP2
+
+LONG_RUN_LAPS = 5
+SLOW_LAP_FACTOR = 1.05
+CLEAN_AIR_GAP = 2.0     # seconds to the car ahead
+MIN_CLEAN_LAPS = LONG_RUN_LAPS   # per driver and compound, over all their long runs
+FUEL_EFFECT = 0.055     # seconds gained per lap of fuel burned (~1.7 kg/lap at ~0.03 s/kg)
+PRACTICE_SESSIONS = ("FP1", "FP2", "FP3")
+
+LAP_COLUMNS = ["Driver", "LapNumber", "Stint", "Compound", "TyreLife", "LapTime",
+               "LapStartTime", "Time", "PitInTime", "PitOutTime", "TrackStatus"]
+
+
+def long_run_laps(laps, representative=None):
+    # Representative laps of long-run stints, with LapInStint counted from 0.
+    # representative: bool per row of `laps` (lap_masks.py), from the frame when not given
+    if representative is None:
+        representative = LapMasks.from_frame(laps).select(*REPRESENTATIVE)
+    laps = laps[representative].dropna(subset=["Stint", "Compound"]).copy()
+    laps["LapTime (s)"] = laps["LapTime"].dt.total_seconds()
+    stint = laps.groupby(["Driver", "Stint"], sort=False)
+    laps = laps[laps["LapTime (s)"] <= SLOW_LAP_FACTOR * stint["LapTime (s)"].transform("median")]
+    stint = laps.groupby(["Driver", "Stint"], sort=False)
+    laps = laps[stint["LapTime (s)"].transform("size") >= LONG_RUN_LAPS].copy()
+    laps["LapInStint"] = laps.groupby(["Driver", "Stint"], sort=False)["LapNumber"].transform(lambda n: n - n.min())
+    return laps
+
+
+def gaps_to_car_ahead(laps, all_laps):
+    # Time since the previous car crossed the line, at lap start and at lap end
+    crossings = (all_laps[["Time", "Driver"]].dropna(subset=["Time"])
+                 .rename(columns={"Time": "Crossing", "Driver": "CarAhead"})
+                 .sort_values("Crossing"))
+    out = laps
+    for when in ("LapStartTime", "Time"):
+        left = out.dropna(subset=[when]).sort_values(when)
+        joined = pd.merge_asof(left, crossings, left_on=when, right_on="Crossing",
+                               direction="backward", allow_exact_matches=False)
+        gap = (joined[when] - joined["Crossing"]).dt.total_seconds().fillna(np.inf).to_numpy()
+        # the previous crossing being our own means nobody within a lap ahead
+        gap = np.where(joined["CarAhead"] == joined["Driver"], np.inf, gap)
+        out = left.assign(**{f"GapAhead_{when}": gap})
+    out["GapAhead (s)"] = out[["GapAhead_LapStartTime", "GapAhead_Time"]].min(axis=1)
+    return out.drop(columns=["GapAhead_LapStartTime", "GapAhead_Time"])
+
+
+def degradation_slopes(laps):
+    # Seconds per lap of tyre age per compound, fitted within stints (stint means removed)
+    fuel_corrected = laps["LapTime (s)"] + FUEL_EFFECT * laps["LapInStint"]
+    keys = [laps["Driver"], laps["Stint"]]
+    x = laps["TyreLife"] - laps["TyreLife"].groupby(keys).transform("mean")
+    y = fuel_corrected - fuel_corrected.groupby(keys).transform("mean")
+    sums = pd.DataFrame({"xy": x * y, "xx": x * x, "Compound": laps["Compound"]}).groupby("Compound").sum()
+    return (sums["xy"] / sums["xx"].replace(0, np.nan)).fillna(0).clip(lower=0)
+
+
+def clean_air_pace(laps, representative=None):
+    # Per driver and compound: corrected clean-air pace from one session's laps
+    runs = long_run_laps(laps, representative)
+    runs = gaps_to_car_ahead(runs, laps)
+    clean = runs[runs["GapAhead (s)"] >= CLEAN_AIR_GAP]
+    clean = clean[clean.groupby(["Driver", "Compound"])["LapTime (s)"].transform("size") >= MIN_CLEAN_LAPS].copy()
+    if clean.empty:
+        return pd.DataFrame(columns=["Driver", "Compound", "CleanAirPace (s)", "RawPace (s)", "Laps", "Stints",
+                                     "Degradation (s/lap)"])
+
+    slopes = degradation_slopes(clean)
+    clean["Degradation (s/lap)"] = clean["Compound"].map(slopes)
+    # back to stint start fuel load and a new tyre
+    clean["Corrected (s)"] = (clean["LapTime (s)"] + FUEL_EFFECT * clean["LapInStint"]
+                              - clean["Degradation (s/lap)"] * (clean["TyreLife"] - 1))
+
+    pace = clean.groupby(["Driver", "Compound"]).agg(**{
+        "CleanAirPace (s)": ("Corrected (s)", "mean"),
+        "RawPace (s)": ("LapTime (s)", "mean"),
+        "Laps": ("LapTime (s)", "size"),
+        "Stints": ("Stint", "nunique"),
+        "Degradation (s/lap)": ("Degradation (s/lap)", "first"),
+    }).reset_index()
+    return pace.sort_values(["Compound", "CleanAirPace (s)"], ignore_index=True)
+
+
+def session_pace(year, gp, session="FP2"):
+    snapshot = default_store().load(year, gp, session, profile="laps")
+    laps = snapshot.laps(LAP_COLUMNS)
+    return clean_air_pace(laps, session_masks(snapshot).select(*REPRESENTATIVE)).assign(Session=session)
+
+
+def weekend_pace(year, gp, sessions=PRACTICE_SESSIONS):
+    store = default_store()
+    available = [s for s in sessions if s in store.sessions(year, gp)] or list(sessions)
+    return pd.concat([session_pace(year, gp, s) for s in available], ignore_index=True)
+
+
+def reference_compound(pace):
+    # Compound with long runs from the most drivers, so everyone is compared on the same tyre
+    return pace.groupby("Compound")["Driver"].nunique().idxmax()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean-air long-run pace from practice sessions")
+    parser.add_argument("year", type=int)
+    parser.add_argument("gp", help="grand prix name or round number")
+    parser.add_argument("--sessions", nargs="+", default=list(PRACTICE_SESSIONS))
+    args = parser.parse_args()
+
+    gp = int(args.gp) if args.gp.isdigit() else args.gp
+    pace = weekend_pace(args.year, gp, args.sessions)
+
+    print(f"\n🏎️ Clean-air race pace ({args.year} {args.gp}, {', '.join(pace['Session'].unique())})\n")
+    print(pace.to_string(index=False))
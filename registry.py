@@ -0,0 +1,118 @@
+import fcntl
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from sessions import CACHE_DIR
+
+# Shared integer codes for drivers, teams, tyre compounds and circuits.
+#
+# Lap tables and driver-keyed features store these small integers instead of
+# strings, so joins become array lookups (see lap_table.py). The built-in
+# lists fix the codes of everything known today; anything new is appended
+# and persisted to f1_cache/registry/<name>.json so the codes stay stable
+# between runs and between worker processes. -1 means missing.
+
+REGISTRY_DIR = CACHE_DIR / "registry"
+
+DRIVER_NAMES = {
+    "NOR": "Lando Norris", "LEC": "Charles Leclerc", "PIA": "Oscar Piastri", "VER": "Max Verstappen",
+    "HAD": "Isack Hadjar", "ALO": "Fernando Alonso", "HAM": "Lewis Hamilton", "OCO": "Esteban Ocon",
+    "LAW": "Liam Lawson", "ALB": "Alexander Albon", "SAI": "Carlos Sainz", "TSU": "Yuki Tsunoda",
+    "HUL": "Nico Hulkenberg", "RUS": "George Russell", "ANT": "Kimi Antonelli", "BOR": "Gabriel Bortoleto",
+    "GAS": "Pierre Gasly", "COL": "Franco Colapinto", "STR": "Lance Stroll", "BEA": "Oliver Bearman",
+    "DOO": "Jack Doohan", "PER": "Sergio Perez", "RIC": "Daniel Ricciardo", "MAG": "Kevin Magnussen",
+    "BOT": "Valtteri Bottas", "ZHO": "Zhou Guanyu", "SAR": "Logan Sargeant", "DEV": "Nyck de Vries",
+    "VET": "Sebastian Vettel", "RAI": "Kimi Raikkonen", "GIO": "Antonio Giovinazzi", "MSC": "Mick Schumacher",
+    "MAZ": "Nikita Mazepin", "LAT": "Nicholas Latifi", "KVY": "Daniil Kvyat", "GRO": "Romain Grosjean",
+    "KUB": "Robert Kubica", "AIT": "Jack Aitken", "FIT": "Pietro Fittipaldi", "VAN": "Stoffel Vandoorne",
+    "ERI": "Marcus Ericsson", "HAR": "Brendon Hartley", "SIR": "Sergey Sirotkin",
+}
+
+TEAM_NAMES = [
+    "Red Bull Racing", "Ferrari", "Mercedes", "McLaren", "Aston Martin", "Alpine", "Williams",
+    "Racing Bulls", "RB", "AlphaTauri", "Kick Sauber", "Alfa Romeo", "Haas F1 Team",
+    "Renault", "Racing Point", "Toro Rosso", "Force India", "Sauber", "Alfa Romeo Racing",
+]
+
+COMPOUND_NAMES = [
+    "SOFT", "MEDIUM", "HARD", "INTERMEDIATE", "WET",
+    "HYPERSOFT", "ULTRASOFT", "SUPERSOFT", "SUPERHARD", "UNKNOWN", "TEST_UNKNOWN",
+]
+
+# FastF1 event Location names
+CIRCUIT_NAMES = [
+    "Sakhir", "Jeddah", "Melbourne", "Suzuka", "Shanghai", "Miami", "Imola", "Monaco", "Montréal",
+    "Barcelona", "Spielberg", "Silverstone", "Budapest", "Spa-Francorchamps", "Zandvoort", "Monza",
+    "Baku", "Marina Bay", "Austin", "Mexico City", "São Paulo", "Las Vegas", "Lusail", "Yas Island",
+    "Yas Marina", "Le Castellet", "Sochi", "Hockenheim", "Mugello", "Portimão", "Istanbul", "Nürburgring",
+]
+
+
+class Registry:
+
+    def __init__(self, name, values, dtype):
+        self.name = name
+        self.dtype = dtype
+        self.builtin = list(values)
+        self.values = list(values)
+        self._index = pd.Index(self.values)
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def path(self):
+        return REGISTRY_DIR / f"{self.name}.json"
+
+    def _load(self):
+        if self.path.exists():
+            extra = json.loads(self.path.read_text())
+            self.values = self.builtin + [v for v in extra if v not in self.builtin]
+            self._index = pd.Index(self.values)
+
+    def _extend(self, new):
+        # re-read under a file lock so concurrent processes agree on the codes
+        with self._lock:
+            REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+            with open(REGISTRY_DIR / f"{self.name}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._load()
+                added = [v for v in new if v not in self._index]
+                if added:
+                    self.values += added
+                    self._index = pd.Index(self.values)
+                    self.path.write_text(json.dumps(self.values[len(self.builtin):]))
+
+    def ids(self, values, add=True):
+        # Vectorized value -> code lookup, unknown values are registered when add=True
+        values = np.asarray(values, dtype=object)
+        ids = self._index.get_indexer(values)
+        missing = (ids == -1) & pd.notna(values)
+        if add and missing.any():
+            self._extend(pd.unique(values[missing]).tolist())
+            ids = self._index.get_indexer(values)
+        return ids.astype(self.dtype)
+
+    def decode(self, ids):
+        ids = np.asarray(ids)
+        out = np.asarray(self.values, dtype=object).take(np.where(ids >= 0, ids, 0))
+        out[ids < 0] = None
+        return out
+
+
+DRIVERS = Registry("drivers", DRIVER_NAMES, np.int16)
+TEAMS = Registry("teams", TEAM_NAMES, np.int16)
+COMPOUNDS = Registry("compounds", COMPOUND_NAMES, np.int8)
+CIRCUITS = Registry("circuits", CIRCUIT_NAMES, np.int16)
+
+_code_by_name = {name: code for code, name in DRIVER_NAMES.items()}
+
+
+def driver_codes(full_names):
+    # Full driver names (as on the official F1 App) to FastF1 3-letter codes
+    return pd.Series(full_names).map(_code_by_name).to_numpy()
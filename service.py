@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
+
+from features import SECTOR_COLUMNS, monaco_2025_qualifying, predictor_features
+from lap_table import take_by_driver
+from model_registry import fit_model, load_model
+from registry import DRIVERS, driver_codes
+
+# Local prediction service.
+#
+# Loads the historical race, the feature stages and the fitted models once
+# at startup and keeps them in memory, then answers qualifying times posted
+# as JSON with a ranked list of predicted race lap times:
+#
+#   python service.py --port 8080
+#   curl -s localhost:8080/predict -d '{"qualifying": {"NOR": 69.954, "LEC": 70.063, "Max Verstappen": 70.669}}'
+#
+# Drivers can be given as 3-letter codes or full names. "variant" picks the
+# model (f1predictor1: qualifying time only, f1predictor2: qualifying + the
+# driver's average sector times in the historical race). Model inference runs
+# on a thread pool so concurrent requests don't block the event loop.
+# With --predict-only the models stored by an earlier run are loaded as they
+# are and nothing is trained at startup.
+#
+#   GET  /health    status, race and variants
+#   POST /predict   {"qualifying": {...}, "variant": "f1predictor2"}
+
+VARIANTS = {
+    "f1predictor1": ["QualifyingTime (s)"],
+    "f1predictor2": ["QualifyingTime (s)"] + SECTOR_COLUMNS,
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+class PredictionService:
+
+    def __init__(self, year=2024, gp=8, session="R", workers=4, predict_only=False):
+        self.race = {"year": year, "gp": gp, "session": session}
+        self.executor = ThreadPoolExecutor(workers)
+
+        # historical race features, resident for the lifetime of the service
+        reference = monaco_2025_qualifying()
+        stages = ["sector_means"] if predict_only else ["qualifying", "sector_means", "lap_means"]
+        features = predictor_features(reference, stages, year=year, gp=gp, session=session)
+        self.sector_means = features["sector_means"]
+        self.lap_means = features.get("lap_means")
+
+        if predict_only:
+            self.models = {}
+            for variant, columns in VARIANTS.items():
+                name = self._model_name(variant)
+                self.models[variant], _ = load_model(name, columns)
+                if self.models[variant] is None:
+                    raise LookupError(f"no stored model {name}, start once without --predict-only")
+            return
+
+        # models trained on the reference qualifying (or loaded from f1_cache/models)
+        train = self._frame(features["qualifying"]["DriverId"].to_numpy(),
+                            features["qualifying"]["QualifyingTime (s)"].to_numpy())
+        y = take_by_driver(self.lap_means, train["DriverId"])
+        known = ~np.isnan(y)
+        self.models = {}
+        for variant, columns in VARIANTS.items():
+            name = self._model_name(variant)
+            self.models[variant], _ = fit_model(name, train.loc[known, columns].fillna(0), y[known],
+                                                GradientBoostingRegressor(n_estimators=200, learning_rate=0.1,
+                                                                          random_state=38))
+
+    def _model_name(self, variant):
+        return f"service/{self.race['year']}_{self.race['gp']}_{self.race['session']}/{variant}"
+
+    def _frame(self, driver_ids, quali_times):
+        frame = pd.DataFrame({"DriverId": driver_ids, "QualifyingTime (s)": quali_times})
+        frame[SECTOR_COLUMNS] = take_by_driver(self.sector_means, driver_ids)
+        return frame
+
+    def parse(self, body):
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError as exc:
+            raise BadRequest(f"invalid JSON: {exc}")
+        if not isinstance(request, dict):
+            raise BadRequest('expected a JSON object {"qualifying": {"<driver>": <seconds>, ...}}')
+        qualifying = request.get("qualifying")
+        if not isinstance(qualifying, dict) or not qualifying:
+            raise BadRequest('expected {"qualifying": {"<driver>": <seconds>, ...}}')
+        variant = request.get("variant", "f1predictor2")
+        if variant not in self.models:
+            raise BadRequest(f"unknown variant {variant!r}, expected one of {list(self.models)}")
+
+        names = list(qualifying)
+        codes = np.array([n.upper() if len(n) == 3 else c for n, c in zip(names, driver_codes(names))], dtype=object)
+        if pd.isna(codes).any():
+            raise BadRequest(f"unknown drivers: {[n for n, c in zip(names, codes) if pd.isna(c)]}")
+        # lookup only: codes the registry has never seen are rejected, not registered
+        ids = DRIVERS.ids(codes, add=False)
+        if (ids < 0).any():
+            raise BadRequest(f"unknown drivers: {[n for n, i in zip(names, ids) if i < 0]}")
+        try:
+            times = np.array([float(qualifying[n]) for n in names])
+        except (TypeError, ValueError):
+            raise BadRequest("qualifying times must be numbers (seconds)")
+        if not np.isfinite(times).all():
+            raise BadRequest("qualifying times must be finite numbers (seconds)")
+        return variant, codes, ids, times
+
+    def predict(self, variant, codes, ids, times):
+        # CPU-bound part, runs on the executor
+        frame = self._frame(ids, times)
+        predicted = self.models[variant].predict(frame[VARIANTS[variant]].fillna(0))
+        order = np.argsort(predicted, kind="stable")
+        return [{"rank": rank, "driver": codes[i], "qualifying_time": float(times[i]),
+                 "predicted_race_time": round(float(predicted[i]), 3)}
+                for rank, i in enumerate(order, start=1)]
+
+    async def handle(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "race": self.race, "variants": list(self.models)}
+        if method == "POST" and path == "/predict":
+            started = time.perf_counter()
+            variant, codes, ids, times = self.parse(body)
+            loop = asyncio.get_running_loop()
+            predictions = await loop.run_in_executor(self.executor, self.predict, variant, codes, ids, times)
+            return 200, {"variant": variant, "predictions": predictions,
+                         "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}
+        return 404, {"error": f"no route for {method} {path}"}
+
+
+# --- minimal HTTP/1.1 on asyncio streams ---
+
+async def _serve_connection(service, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            try:
+                status, payload = await service.handle(method, path.split("?")[0], body)
+            except BadRequest as exc:
+                status, payload = 400, {"error": str(exc)}
+            except Exception as exc:   # keep serving other requests
+                status, payload = 500, {"error": f"{type(exc).__name__}: {exc}"}
+
+            data = json.dumps(payload).encode()
+            keep_alive = headers.get("connection", "").lower() != "close"
+            writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                         f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host="127.0.0.1", port=8080):
+    server = await asyncio.start_server(lambda r, w: _serve_connection(service, r, w), host, port)
+    print(f"🏁 Prediction service on http://{host}:{port} ({', '.join(service.models)})")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve race predictions over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--year", type=int, default=2024, help="historical race to train on")
+    parser.add_argument("--gp", default="8", help="grand prix name or round number")
+    parser.add_argument("--session", default="R")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--predict-only", action="store_true", help="serve the stored models, no training")
+    args = parser.parse_args()
+
+    gp = int(args.gp) if args.gp.isdigit() else args.gp
+    service = PredictionService(args.year, gp, args.session, args.workers, args.predict_only)
+    asyncio.run(serve(service, args.host, args.port))
@@ -0,0 +1,280 @@
+import fcntl
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from instrument import span
+
+# Shared session access for every script in this repo.
+#
+# FastF1's session.load() parses laps, telemetry, weather and race control
+# messages by default, even when a predictor only needs a couple of lap
+# columns. Here each consumer asks for a load profile instead, and whatever
+# was extracted is written to a columnar Parquet snapshot keyed by
+# (year, round, session). The next run reads the snapshot back and never
+# touches FastF1's parser.
+#
+# Snapshot layout:
+#   f1_cache/snapshots/index.json            grand prix name -> round lookup
+#   f1_cache/snapshots/2024/08_R/meta.json   event info + frames present
+#   f1_cache/snapshots/2024/08_R/laps.parquet
+#   f1_cache/snapshots/2024/08_R/results.parquet
+#   f1_cache/snapshots/2024/08_R/weather.parquet    (laps+weather)
+#   f1_cache/snapshots/2024/08_R/telemetry.parquet  (telemetry, all drivers)
+#
+# Set F1_FIXTURES to a directory with the same layout to run fully offline:
+# snapshots are then only read from there and FastF1 is never imported.
+
+CACHE_DIR = Path(os.environ.get("F1_CACHE", "f1_cache"))
+SNAPSHOT_DIR = CACHE_DIR / "snapshots"
+
+# What each kind of consumer actually needs from session.load().
+# Race control messages are what FastF1 fills the laps' Deleted column from
+# (lap_masks.py not_deleted), and every profile writes laps.parquet
+PROFILES = {
+    "laps": {"laps": True, "telemetry": False, "weather": False, "messages": True},
+    "laps+weather": {"laps": True, "telemetry": False, "weather": True, "messages": True},
+    "telemetry": {"laps": True, "telemetry": True, "weather": False, "messages": True},
+}
+
+# Frames written to the snapshot for each profile
+PROFILE_FRAMES = {
+    "laps": ("laps", "results"),
+    "laps+weather": ("laps", "results", "weather"),
+    "telemetry": ("laps", "results", "telemetry"),
+}
+
+# FastF1 accepts long session names too, the snapshot key always uses the short one
+SESSION_ALIASES = {
+    "RACE": "R", "QUALIFYING": "Q", "SPRINT": "S", "SPRINT QUALIFYING": "SQ",
+    "SPRINT SHOOTOUT": "SQ", "PRACTICE 1": "FP1", "PRACTICE 2": "FP2", "PRACTICE 3": "FP3",
+}
+
+
+def session_key(session):
+    session = str(session).strip().upper()
+    return SESSION_ALIASES.get(session, session)
+
+
+class Snapshot:
+    # Read-only view of one stored session. Frames are read lazily and only
+    # the requested columns are pulled from disk.
+
+    def __init__(self, path, meta):
+        self.path = Path(path)
+        self.meta = meta
+        self.year = meta["year"]
+        self.round = meta["round"]
+        self.session = meta["session"]
+        self.event = meta["event"]
+
+    def __repr__(self):
+        return f"Snapshot({self.year}, {self.round}, {self.session!r}, {self.event.get('EventName')!r})"
+
+    def has(self, frame):
+        return frame in self.meta["frames"]
+
+    def _read(self, frame, columns=None, filters=None):
+        if not self.has(frame):
+            raise LookupError(f"{self!r} has no {frame} data, load it with a profile that includes it")
+        with span("snapshot.read", frame=frame):
+            return pd.read_parquet(self.path / f"{frame}.parquet", columns=columns, filters=filters)
+
+    def laps(self, columns=None):
+        return self._read("laps", columns)
+
+    def results(self, columns=None):
+        return self._read("results", columns)
+
+    def weather(self, columns=None):
+        return self._read("weather", columns)
+
+    def telemetry(self, driver=None, columns=None):
+        # Merged car + position data, same as FastF1's laps.telemetry
+        filters = [("Driver", "==", driver)] if driver is not None else None
+        return self._read("telemetry", columns, filters)
+
+    @property
+    def drivers(self):
+        return self.laps(["Driver"])["Driver"].dropna().unique().tolist()
+
+
+class FastF1Backend:
+    # Pulls sessions through FastF1 with its HTTP cache enabled
+
+    def __init__(self, cache_dir=CACHE_DIR / "fastf1"):
+        self.cache_dir = Path(cache_dir)
+        self._fastf1 = None
+
+    def __getstate__(self):
+        # picklable for worker processes, which import fastf1 again themselves
+        return {**self.__dict__, "_fastf1": None}
+
+    @property
+    def fastf1(self):
+        if self._fastf1 is None:
+            import fastf1
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fastf1.Cache.enable_cache(str(self.cache_dir))
+            self._fastf1 = fastf1
+        return self._fastf1
+
+    def resolve(self, year, gp):
+        event = self.fastf1.get_event(year, gp)
+        return int(event["RoundNumber"]), _event_info(event)
+
+    def event_sessions(self, year, rnd):
+        event = self.fastf1.get_event(year, rnd)
+        names = [event[f"Session{i}"] for i in range(1, 6)]
+        return [session_key(name) for name in names if isinstance(name, str) and name]
+
+    def rounds(self, year):
+        # Rounds of a season that have started
+        schedule = self.fastf1.get_event_schedule(year, include_testing=False)
+        started = schedule["EventDate"] - pd.Timedelta(days=3) <= pd.Timestamp.now()
+        return schedule.loc[started, "RoundNumber"].astype(int).tolist()
+
+    def fetch(self, year, rnd, session, profile):
+        ses = self.fastf1.get_session(year, rnd, session)
+        with span("fastf1.load", year=year, round=rnd, session=session, profile=profile):
+            ses.load(**PROFILES[profile])
+
+        frames = {"laps": pd.DataFrame(ses.laps), "results": pd.DataFrame(ses.results)}
+        if PROFILES[profile]["weather"]:
+            frames["weather"] = pd.DataFrame(ses.weather_data)
+        if PROFILES[profile]["telemetry"]:
+            # merge car and position data once per driver, not on every access
+            with span("fastf1.telemetry_merge"):
+                telemetry = []
+                for drv in ses.laps["Driver"].dropna().unique():
+                    tel = pd.DataFrame(ses.laps.pick_drivers(drv).get_telemetry())
+                    tel["Driver"] = drv
+                    telemetry.append(tel)
+                frames["telemetry"] = pd.concat(telemetry, ignore_index=True)
+        return _event_info(ses.event), frames
+
+
+class FixtureBackend:
+    # Offline backend: everything has to be present in the snapshot directory already
+
+    def resolve(self, year, gp):
+        raise LookupError(f"No fixture for {year} {gp!r}")
+
+    def fetch(self, year, rnd, session, profile):
+        raise LookupError(f"No fixture for {year} round {rnd} {session} ({profile})")
+
+    def event_sessions(self, year, rnd):
+        return []
+
+    def rounds(self, year):
+        return []
+
+
+def _event_info(event):
+    return {
+        "EventName": str(event["EventName"]),
+        "Location": str(event["Location"]),
+        "Country": str(event["Country"]),
+        "EventDate": str(event["EventDate"]),
+    }
+
+
+class SnapshotStore:
+
+    def __init__(self, root=SNAPSHOT_DIR, backend=None):
+        self.root = Path(root)
+        self.backend = backend if backend is not None else FastF1Backend()
+        self._index = None
+
+    # grand prix name -> round, so a cached run never needs the FastF1 schedule
+    @property
+    def index(self):
+        if self._index is None:
+            path = self.root / "index.json"
+            self._index = json.loads(path.read_text()) if path.exists() else {}
+        return self._index
+
+    def _remember(self, year, names, rnd):
+        # Several worker processes may write snapshots at once: re-read and merge
+        # index.json under a file lock (as registry.py does), then replace it atomically
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / "index.json"
+        with open(self.root / "index.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._index = json.loads(path.read_text()) if path.exists() else {}
+            season = self._index.setdefault(str(year), {})
+            for name in names:
+                season[str(name).strip().lower()] = rnd
+            tmp = self.root / f"index.json.{os.getpid()}"
+            tmp.write_text(json.dumps(self._index, indent=1, sort_keys=True))
+            os.replace(tmp, path)
+
+    def resolve(self, year, gp):
+        if isinstance(gp, int):
+            return gp
+        rnd = self.index.get(str(year), {}).get(str(gp).strip().lower())
+        if rnd is None:
+            rnd, event = self.backend.resolve(year, gp)
+            self._remember(year, [gp, event["EventName"], event["Location"], event["Country"]], rnd)
+        return rnd
+
+    def path(self, year, rnd, session):
+        return self.root / str(year) / f"{rnd:02d}_{session_key(session)}"
+
+    def rounds(self, year):
+        # Rounds of a season: from the schedule, or whatever is stored when offline
+        stored = {int(p.name[:2]) for p in (self.root / str(year)).glob("[0-9][0-9]_*")}
+        return sorted(stored.union(self.backend.rounds(year)))
+
+    def sessions(self, year, gp):
+        # Sessions of a weekend: from the event schedule, or whatever is stored when offline
+        rnd = self.resolve(year, gp)
+        stored = [p.name.split("_", 1)[1] for p in sorted((self.root / str(year)).glob(f"{rnd:02d}_*"))]
+        scheduled = self.backend.event_sessions(year, rnd)
+        return scheduled + [ses for ses in stored if ses not in scheduled]
+
+    def load(self, year, gp, session, profile="laps"):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown load profile {profile!r}, expected one of {list(PROFILES)}")
+
+        rnd = self.resolve(year, gp)
+        path = self.path(year, rnd, session)
+        meta_path = path / "meta.json"
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else None
+        wanted = PROFILE_FRAMES[profile]
+        if meta is not None and all(frame in meta["frames"] for frame in wanted):
+            return Snapshot(path, meta)
+
+        event, frames = self.backend.fetch(year, rnd, session_key(session), profile)
+        path.mkdir(parents=True, exist_ok=True)
+        with span("snapshot.write", frames=",".join(frames)):
+            for name, frame in frames.items():
+                frame.to_parquet(path / f"{name}.parquet", index=False)
+
+        # keep frames from an earlier, different profile
+        stored = set(frames) | set(meta["frames"] if meta else ())
+        meta = {"year": year, "round": rnd, "session": session_key(session),
+                "event": event, "frames": sorted(stored)}
+        meta_path.write_text(json.dumps(meta, indent=1))
+        self._remember(year, [event["EventName"], event["Location"], event["Country"]], rnd)
+        return Snapshot(path, meta)
+
+
+_store = None
+
+
+def default_store():
+    global _store
+    if _store is None:
+        fixtures = os.environ.get("F1_FIXTURES")
+        if fixtures:
+            _store = SnapshotStore(fixtures, backend=FixtureBackend())
+        else:
+            _store = SnapshotStore()
+    return _store
+
+
+def load_session(year, gp, session, profile="laps"):
+    return default_store().load(year, gp, session, profile)
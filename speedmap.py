@@ -0,0 +1,93 @@
+import matplotlib as mpl
+import numpy as np
+from matplotlib import pyplot as plt
+from matplotlib.collections import LineCollection
+from numpy.lib.stride_tricks import sliding_window_view
+
+from instrument import span, traced
+
+# Telemetry -> coloured track segments for the speed maps.
+#
+# The X/Y/Speed channels are read once into one contiguous array. Segments
+# are a sliding-window view over that array (no concatenate copy), and for
+# full-race or multi-lap maps the line can be decimated first with
+# Largest-Triangle-Three-Buckets on the X/Y path, which keeps corners and
+# keeps each kept sample's speed.
+
+DEFAULT_MAX_SEGMENTS = 5000
+
+
+@traced("speedmap.track_points")
+def track_points(telemetry, value="Speed"):
+    # One (n, 3) float array holding X, Y and the colour channel
+    return telemetry[["X", "Y", value]].to_numpy(dtype=float)
+
+
+def track_segments(points):
+    # (n - 1, 2, 2) view of consecutive point pairs: segments[i] = [points[i], points[i + 1]]
+    return sliding_window_view(points[:, :2], 2, axis=0).transpose(0, 2, 1)
+
+
+def decimate_lttb(points, n_out):
+    # Largest-Triangle-Three-Buckets over the X/Y path. Keeps the first and
+    # last point and, per bucket, the point spanning the largest triangle with
+    # the previously kept point and the mean of the next bucket.
+    n = len(points)
+    if n_out >= n or n_out < 3:
+        return points
+
+    xy = points[:, :2]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+
+    a = xy[0]
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        c = xy[edges[i + 1]:edges[i + 2]].mean(axis=0) if i + 2 < len(edges) else xy[-1]
+        bucket = xy[start:stop]
+        area = np.abs((a[0] - c[0]) * (bucket[:, 1] - a[1]) - (a[0] - bucket[:, 0]) * (c[1] - a[1]))
+        keep[i + 1] = start + np.argmax(area)
+        a = xy[keep[i + 1]]
+
+    return points[keep]
+
+
+@traced("speedmap.draw")
+def speed_map(points, title, colormap=mpl.cm.plasma, max_segments=DEFAULT_MAX_SEGMENTS):
+    # points: (n, 3) X, Y, Speed array from track_points(); max_segments=None draws every sample
+    if max_segments is not None:
+        with span("speedmap.decimate", n=len(points)):
+            points = decimate_lttb(points, max_segments + 1)
+    x, y, color = points[:, 0], points[:, 1], points[:, 2]
+    segments = track_segments(points)
+
+    # We create a plot with title and adjust some setting to make it look good.
+    fig, ax = plt.subplots(sharex=True, sharey=True, figsize=(12, 6.75))
+    fig.suptitle(title, size=24, y=0.97)
+
+    # Adjust margins and turn of axis
+    fig.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.12)
+    ax.axis('off')
+
+    # After this, we plot the data itself.
+    # Create background track line
+    ax.plot(x, y, color='black', linestyle='-', linewidth=14, zorder=0)
+
+    # Create a continuous norm to map from data points to colors
+    norm = plt.Normalize(color.min(), color.max())
+    lc = LineCollection(segments, cmap=colormap, norm=norm,
+                        linestyle='-', linewidth=5)
+
+    # Set the values used for colormapping, each segment takes the value at its start
+    lc.set_array(color[:-1])
+
+    # Merge all line segments together
+    ax.add_collection(lc)
+
+    # Finally, we create a color bar as a legend.
+    cbaxes = fig.add_axes([0.25, 0.05, 0.5, 0.05])
+    normlegend = mpl.colors.Normalize(vmin=color.min(), vmax=color.max())
+    mpl.colorbar.ColorbarBase(cbaxes, norm=normlegend, cmap=colormap,
+                              orientation="horizontal")
+    return fig
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from sessions import default_store
+
+# Headless speed maps for every driver of every session of a weekend.
+#
+#   python speedmap_batch.py 2024 Monaco
+#   python speedmap_batch.py 2024 Monaco --sessions Q R --drivers LEC VER --formats png svg
+#
+# Sessions are first prepared in parallel (a FastF1 load only happens when
+# there is no telemetry snapshot yet), then one (session, driver) job per map
+# is fanned out over a process pool on the Agg backend. Each worker reads a
+# session's telemetry once and reuses it for every driver it renders. Files go
+# to <out>/<year>_<round>/<session>/<driver>.<format>, with a manifest.json
+# listing every job, its files and timings.
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _prepare(year, rnd, session):
+    snapshot = default_store().load(year, rnd, session, profile="telemetry")
+    return snapshot.event, snapshot.drivers
+
+
+@lru_cache(maxsize=2)
+def _session_telemetry(year, rnd, session):
+    # whole-session telemetry, read once per worker
+    snapshot = default_store().load(year, rnd, session, profile="telemetry")
+    return snapshot.telemetry(columns=["Driver", "X", "Y", "Speed"])
+
+
+def _render(job, out_dir, formats, max_segments):
+    from matplotlib import pyplot as plt
+    from speedmap import speed_map, track_points
+
+    year, rnd, session, driver, event_name = job
+    record = {"year": year, "round": rnd, "session": session, "driver": driver,
+              "files": [], "pid": os.getpid()}
+    t0 = time.perf_counter()
+    try:
+        telemetry = _session_telemetry(year, rnd, session)
+        t1 = time.perf_counter()
+        points = track_points(telemetry[telemetry["Driver"] == driver])
+        if len(points) < 2:
+            raise ValueError("no telemetry")
+        fig = speed_map(points, f"{event_name} {year} {session} - {driver}'s Speed", max_segments=max_segments)
+        t2 = time.perf_counter()
+
+        path = Path(out_dir) / f"{year}_{rnd:02d}" / session
+        path.mkdir(parents=True, exist_ok=True)
+        for fmt in formats:
+            fig.savefig(path / f"{driver}.{fmt}", format=fmt)
+            record["files"].append(str(path / f"{driver}.{fmt}"))
+        plt.close(fig)
+        t3 = time.perf_counter()
+        record.update(status="ok", load_s=t1 - t0, render_s=t2 - t1, save_s=t3 - t2)
+    except Exception as exc:   # one bad driver should not stop the batch
+        record.update(status=f"error: {exc}")
+    record["total_s"] = time.perf_counter() - t0
+    return record
+
+
+def run_batch(year, gp, sessions=None, drivers=None, out_dir="speedmaps", formats=("png",),
+              workers=None, max_segments=5000):
+    store = default_store()
+    rnd = store.resolve(year, gp)
+    sessions = sessions or store.sessions(year, rnd)
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+        prepared = list(pool.map(_prepare, [year] * len(sessions), [rnd] * len(sessions), sessions))
+
+        # jobs are ordered by session so consecutive jobs on a worker share its cached telemetry
+        jobs = [(year, rnd, session, driver, event["EventName"])
+                for session, (event, session_drivers) in zip(sessions, prepared)
+                for driver in session_drivers if drivers is None or driver in drivers]
+        records = list(pool.map(_render, jobs, [out_dir] * len(jobs), [formats] * len(jobs),
+                                [max_segments] * len(jobs)))
+
+    manifest = {"year": year, "round": rnd, "event": prepared[0][0] if prepared else None,
+                "sessions": sessions, "formats": list(formats),
+                "wall_s": time.perf_counter() - started, "jobs": records}
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    (Path(out_dir) / "manifest.json").write_text(json.dumps(manifest, indent=1))
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speed maps for every driver and session of a weekend")
+    parser.add_argument("year", type=int)
+    parser.add_argument("gp", help="grand prix name or round number")
+    parser.add_argument("--sessions", nargs="+", help="default: every session of the weekend")
+    parser.add_argument("--drivers", nargs="+", help="default: every driver in the session")
+    parser.add_argument("--formats", nargs="+", default=["png"], choices=["png", "svg", "pdf"])
+    parser.add_argument("--out", default="speedmaps")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-segments", type=int, default=5000)
+    args = parser.parse_args()
+
+    gp = int(args.gp) if args.gp.isdigit() else args.gp
+    manifest = run_batch(args.year, gp, args.sessions, args.drivers, args.out, args.formats,
+                         args.workers, args.max_segments)
+
+    # Print per-job timings
+    for job in manifest["jobs"]:
+        print(f"{job['session']:>4} {job['driver']:<4} {job['total_s']:6.2f}s  {job['status']}")
+    print(f"\n{len(manifest['jobs'])} maps in {manifest['wall_s']:.1f}s, manifest in {args.out}/manifest.json")
@@ -0,0 +1,173 @@
+import argparse
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from instrument import span
+from sessions import CACHE_DIR, default_store, session_key
+
+# On-disk telemetry store for multi-race analysis.
+#
+# A session's merged car + position telemetry is written once as one raw
+# binary file per channel, drivers back to back, in compact dtypes:
+#
+#   f1_cache/telemetry/2024/08_R/index.json     channels, and per driver: offset,
+#                                               sample count, lap sample ranges
+#   f1_cache/telemetry/2024/08_R/Speed.f4       float32, all drivers
+#   f1_cache/telemetry/2024/08_R/nGear.i2       int16, all drivers
+#   ...
+#
+# Reading maps the channel files with np.memmap and returns views into them,
+# so slicing one driver's lap touches only those pages; a full season of
+# telemetry never has to be in RAM. Time is session time in float32 seconds
+# (~1 ms resolution over a 3 h session). Building reads the Parquet snapshot
+# one driver at a time.
+#
+#   python telemetry_store.py 2024 Monaco R          build one session
+#   python telemetry_store.py 2024 Monaco R --driver LEC --lap 10
+
+STORE_DIR = CACHE_DIR / "telemetry"
+
+CHANNELS = {
+    "X": np.float32, "Y": np.float32, "Z": np.float32, "Speed": np.float32, "RPM": np.float32,
+    "nGear": np.int16, "Throttle": np.float32, "Brake": np.int16, "Distance": np.float32,
+    "Time": np.float32,
+}
+SUFFIX = {np.dtype(np.float32): "f4", np.dtype(np.int16): "i2"}
+
+
+def _channel_file(name):
+    return f"{name}.{SUFFIX[np.dtype(CHANNELS[name])]}"
+
+
+class SessionTelemetry:
+    # Read-only view of one stored session
+
+    def __init__(self, path):
+        self.path = path
+        self.index = json.loads((path / "index.json").read_text())
+        self.channels = self.index["channels"]
+        self._maps = {}
+
+    def __repr__(self):
+        return f"<SessionTelemetry {self.path} {len(self.index['drivers'])} drivers>"
+
+    @property
+    def drivers(self):
+        return list(self.index["drivers"])
+
+    def channel(self, name):
+        # Whole-session memmap of one channel, every driver back to back
+        if name not in self._maps:
+            if name not in self.channels:
+                raise KeyError(f"{name!r} not stored for this session, have {self.channels}")
+            self._maps[name] = np.memmap(self.path / _channel_file(name), dtype=CHANNELS[name], mode="r")
+        return self._maps[name]
+
+    def _range(self, driver, lap=None):
+        entry = self.index["drivers"][driver]
+        if lap is None:
+            return entry["offset"], entry["offset"] + entry["samples"]
+        try:
+            start, stop = entry["laps"][str(lap)]
+        except KeyError:
+            raise KeyError(f"{driver} has no lap {lap} in {self.path}")
+        return entry["offset"] + start, entry["offset"] + stop
+
+    def driver(self, driver, lap=None, channels=None):
+        # {channel: zero-copy view} for a driver's whole session or one lap
+        start, stop = self._range(driver, lap)
+        return {name: self.channel(name)[start:stop] for name in (channels or self.channels)}
+
+    def points(self, driver, lap=None, value="Speed"):
+        # (n, 3) X, Y, value array, same as speedmap.track_points()
+        data = self.driver(driver, lap, ["X", "Y", value])
+        return np.column_stack([data["X"], data["Y"], data[value]]).astype(float)
+
+    def laps(self, driver):
+        return sorted(int(n) for n in self.index["drivers"][driver]["laps"])
+
+
+class TelemetryStore:
+
+    def __init__(self, root=STORE_DIR, snapshots=None):
+        self.root = root
+        self.snapshots = snapshots or default_store()
+
+    def path(self, year, rnd, session):
+        return Path(self.root) / str(year) / f"{rnd:02d}_{session_key(session)}"
+
+    def open(self, year, gp, session):
+        # Stored session, built from the snapshot on first use
+        rnd = self.snapshots.resolve(year, gp)
+        path = self.path(year, rnd, session)
+        if not (path / "index.json").exists():
+            self.build(year, rnd, session)
+        return SessionTelemetry(path)
+
+    def build(self, year, gp, session):
+        snapshot = self.snapshots.load(year, gp, session, profile="telemetry")
+        path = self.path(year, snapshot.round, snapshot.session)
+        tmp = path.with_name(path.name + ".building")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        laps = snapshot.laps(["Driver", "LapNumber", "LapStartTime", "Time"]).dropna()
+        index = {"year": year, "round": snapshot.round, "session": snapshot.session,
+                 "event": snapshot.event.get("EventName"), "channels": None, "drivers": {}}
+        files = {}
+        offset = 0
+        with span("telemetry_store.build", session=snapshot.session):
+            for driver in snapshot.drivers:
+                tel = snapshot.telemetry(driver)
+                if tel.empty:
+                    continue
+                if index["channels"] is None:
+                    # channels the source has, SessionTime becomes Time
+                    index["channels"] = [name for name in CHANNELS
+                                         if name in tel.columns or (name == "Time" and "SessionTime" in tel.columns)]
+                    files = {name: open(tmp / _channel_file(name), "wb") for name in index["channels"]}
+                tel = tel.sort_values("SessionTime") if "SessionTime" in tel.columns else tel
+                time = tel["SessionTime"].dt.total_seconds().to_numpy() if "SessionTime" in tel.columns else None
+
+                for name in index["channels"]:
+                    values = time if name == "Time" else tel[name].to_numpy()
+                    np.nan_to_num(np.asarray(values, dtype=float)).astype(CHANNELS[name]).tofile(files[name])
+
+                # lap sample ranges from lap start / end session times
+                lap_ranges = {}
+                if time is not None:
+                    own = laps[laps["Driver"] == driver]
+                    starts = np.searchsorted(time, own["LapStartTime"].dt.total_seconds().to_numpy())
+                    stops = np.searchsorted(time, own["Time"].dt.total_seconds().to_numpy())
+                    lap_ranges = {str(int(n)): [int(a), int(b)]
+                                  for n, a, b in zip(own["LapNumber"], starts, stops) if b > a}
+                index["drivers"][driver] = {"offset": offset, "samples": len(tel), "laps": lap_ranges}
+                offset += len(tel)
+
+        for f in files.values():
+            f.close()
+        index["channels"] = index["channels"] or []
+        (tmp / "index.json").write_text(json.dumps(index))
+        shutil.rmtree(path, ignore_errors=True)
+        tmp.rename(path)
+        return SessionTelemetry(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or read the memory-mapped telemetry store")
+    parser.add_argument("year", type=int)
+    parser.add_argument("gp", help="grand prix name or round number")
+    parser.add_argument("session", default="R", nargs="?")
+    parser.add_argument("--driver")
+    parser.add_argument("--lap", type=int)
+    args = parser.parse_args()
+
+    gp = int(args.gp) if args.gp.isdigit() else args.gp
+    session = TelemetryStore().open(args.year, gp, args.session)
+    print(session, session.channels)
+    if args.driver:
+        for name, values in session.driver(args.driver, args.lap).items():
+            print(f"{name:>9} {values.dtype}  {len(values)} samples  min {values.min():.2f}  max {values.max():.2f}")
@@ -0,0 +1,161 @@
+import argparse
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
+
+from backtest import BACKTEST_DIR, MIN_TRAIN_ROUNDS, VARIANTS, _spearman, season_inputs, season_rounds
+
+# Hyperparameter search for the predictor variants.
+#
+# Uses the backtest's per-round inputs (features relative to the field, see
+# backtest.py) with time-ordered, race-based folds: fold N trains on every
+# round before N and is scored on round N, like the backtest.
+#
+# Successive halving: every candidate starts on the most recent MIN_FOLDS
+# folds, the best 1/ETA of each variant move on to ETA x as many folds, and
+# so on until the survivors have seen every fold. Candidates run on a process
+# pool; the feature/target matrix is put in shared memory once and workers
+# attach to it at start-up, so a task only carries its parameters and folds.
+#
+#   python tune.py 2024
+#   python tune.py 2024 --variants f1predictor2 --candidates 48 --workers 8
+
+PARAM_GRID = {
+    "n_estimators": [50, 100, 200, 400],
+    "learning_rate": [0.02, 0.05, 0.1, 0.2],
+    "max_depth": [2, 3, 4],
+    "subsample": [0.7, 1.0],
+    "min_samples_leaf": [1, 3, 5],
+}
+FEATURES = list(dict.fromkeys(f for spec in VARIANTS.values() for f in spec["features"]))
+EXTRA = ["RacePace (%)", "MedianLap (s)", "Position", "Round"]
+
+ETA = 3
+MIN_FOLDS = 2
+RANDOM_STATE = 42
+
+_shared = {}
+
+
+# --- shared matrix ---
+
+def _share(matrix):
+    shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    np.ndarray(matrix.shape, matrix.dtype, buffer=shm.buf)[:] = matrix
+    return shm
+
+
+def _attach(name, shape):
+    # worker initializer: one view on the parent's matrix, no copy
+    shm = shared_memory.SharedMemory(name=name)
+    _shared["shm"] = shm
+    _shared["matrix"] = np.ndarray(shape, np.float64, buffer=shm.buf)
+
+
+def evaluate(variant, params, folds):
+    # Mean MAE (s) and Spearman of one candidate over the given folds (rounds)
+    matrix = _shared["matrix"]
+    columns = [FEATURES.index(f) for f in VARIANTS[variant]["features"]]
+    target, median_lap, position, rounds = (matrix[:, len(FEATURES) + k] for k in range(4))
+    known = ~np.isnan(target)
+    errors, spearman = [], []
+    for rnd in folds:
+        train, test = known & (rounds < rnd), known & (rounds == rnd)
+        model = GradientBoostingRegressor(random_state=RANDOM_STATE, **params)
+        model.fit(matrix[np.ix_(train, columns)], target[train])
+        predicted = model.predict(matrix[np.ix_(test, columns)])
+        errors.append(np.mean(np.abs(predicted - target[test]) / 100 * median_lap[test]))
+        spearman.append(_spearman(predicted, position[test]))
+    return float(np.mean(errors)), float(np.nanmean(spearman)) if not np.isnan(spearman).all() else np.nan
+
+
+def candidates(n, seed=0):
+    # n distinct random points of PARAM_GRID (all of it when n is larger)
+    grid = [dict(zip(PARAM_GRID, values)) for values in itertools.product(*PARAM_GRID.values())]
+    if n >= len(grid):
+        return grid
+    return [grid[i] for i in np.random.default_rng(seed).choice(len(grid), n, replace=False)]
+
+
+def successive_halving(pool, variants, configs, folds):
+    # Returns every evaluated (variant, params, rung, folds) with its scores
+    alive = {variant: list(configs) for variant in variants}
+    results = []
+    n_folds, rung = MIN_FOLDS, 0
+    while alive:
+        used = folds[-min(n_folds, len(folds)):]
+        tasks = [(variant, params) for variant, survivors in alive.items() for params in survivors]
+        scores = pool.map(evaluate, [v for v, _ in tasks], [p for _, p in tasks], [used] * len(tasks))
+        rung_results = [{"Variant": v, "Params": p, "Rung": rung, "Folds": len(used), "MAE (s)": mae,
+                         "Spearman": rho} for (v, p), (mae, rho) in zip(tasks, scores)]
+        results += rung_results
+        if len(used) == len(folds):
+            break
+        alive = {}
+        for variant in variants:
+            ranked = sorted((r for r in rung_results if r["Variant"] == variant), key=lambda r: r["MAE (s)"])
+            alive[variant] = [r["Params"] for r in ranked[:max(1, len(ranked) // ETA)]]
+        n_folds, rung = n_folds * ETA, rung + 1
+    return results
+
+
+def tune(year, variants=None, rounds=None, n_candidates=27, workers=None, seed=0):
+    variants = variants or list(VARIANTS)
+    rounds = rounds or season_rounds(year)
+    with ProcessPoolExecutor(workers) as pool:
+        inputs = season_inputs(year, rounds, pool)
+    folds = [rnd for rnd in rounds if rnd > rounds[0] + MIN_TRAIN_ROUNDS - 1]
+
+    # features with missing values as 0, like the predictors and backtest
+    matrix = np.column_stack([inputs[FEATURES].fillna(0).to_numpy(dtype=np.float64),
+                              inputs[EXTRA].to_numpy(dtype=np.float64)])
+    shm = _share(matrix)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_attach, initargs=(shm.name, matrix.shape)) as pool:
+            results = successive_halving(pool, variants, candidates(n_candidates, seed), folds)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    table = pd.DataFrame(results)
+    final = table[table["Folds"] == len(folds)].copy()
+    final["Rank"] = final.groupby("Variant")["MAE (s)"].rank(method="min").astype(int)
+    final = final.drop(columns="Rung").sort_values(["Variant", "Rank"], ignore_index=True)
+
+    path = BACKTEST_DIR / str(year) / "tuning.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ranked_table(final).to_csv(path, index=False)
+    return final, table
+
+
+def ranked_table(final):
+    # One column per hyperparameter instead of the Params dicts
+    return pd.concat([final.drop(columns="Params"), pd.DataFrame(list(final["Params"]))], axis=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search for the predictors")
+    parser.add_argument("year", type=int)
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS))
+    parser.add_argument("--rounds", nargs="+", type=int, help="default: every finished round")
+    parser.add_argument("--candidates", type=int, default=27, help="configurations per variant")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    final, table = tune(args.year, args.variants, args.rounds, args.candidates, args.workers, args.seed)
+    print(f"\n🔧 Tuning {args.year}: {len(table)} evaluations in {time.perf_counter() - started:.0f} s "
+          f"(results in {BACKTEST_DIR / str(args.year) / 'tuning.csv'})\n")
+    print(ranked_table(final).round(3).to_string(index=False))
+
+    # Best configuration per variant next to the one the predictor uses now
+    print()
+    for _, best in final.drop_duplicates("Variant").iterrows():
+        print(f"{best['Variant']}: MAE {best['MAE (s)']:.2f} secs with {best['Params']} "
+              f"(now {VARIANTS[best['Variant']]['params']})")
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from instrument import span
+from lap_masks import REPRESENTATIVE, LapMasks, session_masks
+from sessions import CACHE_DIR, default_store
+
+# Wet performance over every session, not one pair of Canadian GPs.
+#
+# Each session is scanned once (in parallel, one process per session):
+#   * representative laps only (lap_masks.py): no in/out, non-green, deleted or lap-1 laps
+#   * wet laps: INTERMEDIATE/WET tyres, or rainfall reported when the lap ended
+#     (weather samples joined onto lap end times with merge_asof)
+#   * dry laps: slicks and no rainfall
+#   * every lap's pace relative to the session's field median in the same
+#     conditions, so sessions, circuits and seasons can be added up
+#
+# The result is folded into per-(season, circuit, driver, condition) sums that are
+# kept in f1_cache/wet_engine/accumulators.parquet. The sessions already
+# folded in are stored in the same file (parquet metadata), so the sums and
+# the list of sessions behind them are replaced together.
+# A driver's score pairs their relative wet pace at a circuit with their
+# relative dry pace at the same circuit, weighted by wet laps:
+#
+#   WetPerformanceScore = 1 + mean over circuits (dry relative pace - wet relative pace)
+#
+# > 1: the driver gains on the field in the wet. Same scale as
+# wet_performance.py (1 + relative gain). After a weekend, update() only scans
+# the new sessions. scores(before=season) only uses earlier seasons, for
+# features that must not see the future (backtest.py).
+#
+#   python wet_engine.py update 2018 2025
+#   python wet_engine.py scores
+
+WET_ENGINE_DIR = CACHE_DIR / "wet_engine"
+FIRST_SEASON = 2018
+
+WET_COMPOUNDS = {"INTERMEDIATE", "WET"}
+SLOW_LAP_FACTOR = 1.15   # relative to the field median in the same conditions
+MIN_LAPS = 3             # per driver, condition and session
+
+ACCUMULATOR_KEYS = ["Season", "Circuit", "Driver", "Condition"]
+ACCUMULATOR_COLUMNS = ACCUMULATOR_KEYS + ["Sessions", "Laps", "RelPaceSum"]
+
+
+def classify_laps(laps, weather=None, representative=None):
+    # Representative laps with a Condition ("wet"/"dry") column.
+    # representative: bool per row of `laps` (lap_masks.py), from the frame when not given
+    if representative is None:
+        representative = LapMasks.from_frame(laps).select(*REPRESENTATIVE)
+    laps = laps[representative].dropna(subset=["Driver"]).copy()
+    laps["LapTime (s)"] = laps["LapTime"].dt.total_seconds()
+
+    wet = laps["Compound"].isin(WET_COMPOUNDS).to_numpy()
+    if weather is not None and "Rainfall" in weather and "Time" in laps:
+        samples = weather[["Time", "Rainfall"]].dropna().sort_values("Time")
+        ended = laps[["Time"]].reset_index().dropna(subset=["Time"]).sort_values("Time")
+        raining = pd.merge_asof(ended, samples, on="Time", direction="backward").set_index("index")["Rainfall"]
+        wet |= raining.reindex(laps.index).fillna(False).astype(bool).to_numpy()
+    laps["Condition"] = np.where(wet, "wet", "dry")
+    return laps
+
+
+def session_accumulators(laps, circuit, season):
+    # Per (driver, condition): laps and the sum of lap time / field median
+    median = laps.groupby("Condition")["LapTime (s)"].transform("median")
+    laps = laps[laps["LapTime (s)"] <= SLOW_LAP_FACTOR * median].assign(
+        RelPace=lambda d: d["LapTime (s)"] / median[d.index])
+    sums = laps.groupby(["Driver", "Condition"]).agg(Laps=("RelPace", "size"), RelPaceSum=("RelPace", "sum"))
+    sums = sums[sums["Laps"] >= MIN_LAPS].reset_index()
+    return sums.assign(Season=season, Circuit=circuit, Sessions=1)[ACCUMULATOR_COLUMNS]
+
+
+def scan_session(year, rnd, session, store=None):
+    store = store or default_store()
+    try:
+        snapshot = store.load(year, rnd, session, profile="laps+weather")
+        weather = snapshot.weather(["Time", "Rainfall"])
+    except LookupError:   # offline without weather: tyres only
+        snapshot, weather = store.load(year, rnd, session, profile="laps"), None
+    laps = snapshot.laps(["Driver", "LapTime", "Compound", "Time"])
+    circuit = snapshot.event.get("Location", "").strip().lower()
+    representative = session_masks(snapshot).select(*REPRESENTATIVE)
+    return session_accumulators(classify_laps(laps, weather, representative), circuit, year)
+
+
+def _scan(job, store):
+    try:
+        return job, scan_session(*job, store), None
+    except Exception as exc:   # not run yet or no data, retried on the next update
+        return job, None, str(exc)
+
+
+class WetEngine:
+
+    def __init__(self, root=WET_ENGINE_DIR, store=None):
+        self.root = root
+        self.store = store or default_store()
+        self.accumulators, self.folded = pd.DataFrame(columns=ACCUMULATOR_COLUMNS), set()
+        path = root / "accumulators.parquet"
+        metadata = (pq.read_schema(path).metadata or {}) if path.exists() else {}
+        # older files kept the sessions apart or had no seasons: scanned again from scratch
+        if b"sessions" in metadata and "Season" in pq.read_schema(path).names:
+            self.accumulators = pd.read_parquet(path)
+            self.folded = set(json.loads(metadata[b"sessions"]))
+
+    def _save(self):
+        # One file for the sums and the sessions in them: a crash can't leave one without the other
+        self.root.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(self.accumulators, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               b"sessions": json.dumps(sorted(self.folded)).encode()})
+        tmp = self.root / f"accumulators.{os.getpid()}.tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, self.root / "accumulators.parquet")
+
+    def fold(self, partial):
+        # Add one session's (or any partial) sums into the accumulators
+        if self.accumulators.empty:
+            self.accumulators = partial[ACCUMULATOR_COLUMNS].copy()
+            return
+        both = pd.concat([self.accumulators, partial], ignore_index=True)
+        self.accumulators = both.groupby(ACCUMULATOR_KEYS, as_index=False)[["Sessions", "Laps", "RelPaceSum"]].sum()
+
+    def pending(self, seasons):
+        return [(season, rnd, session) for season in seasons for rnd in self.store.rounds(season)
+                for session in self.store.sessions(season, rnd) if f"{season}/{rnd}/{session}" not in self.folded]
+
+    def update(self, seasons=None, workers=None):
+        seasons = seasons or range(FIRST_SEASON, date.today().year + 1)
+        jobs = self.pending(seasons)
+        failed = []
+        with span("wet_engine.update", sessions=len(jobs)), ProcessPoolExecutor(workers) as pool:
+            for (season, rnd, session), partial, error in pool.map(_scan, jobs, [self.store] * len(jobs)):
+                if error is not None:
+                    failed.append((season, rnd, session, error))
+                    continue
+                self.fold(partial)
+                self.folded.add(f"{season}/{rnd}/{session}")
+        self._save()
+        return len(jobs) - len(failed), failed
+
+    def scores(self, before=None):
+        # Driver, WetPerformanceScore, circuits and wet laps behind it (seasons before `before` only)
+        acc = self.accumulators
+        return scores_from(acc if before is None else acc[acc["Season"] < before])
+
+
+def scores_from(accumulators):
+    # Scores from any accumulator rows, e.g. a WetEngine's plus sessions scanned elsewhere
+    acc = accumulators.groupby(["Circuit", "Driver", "Condition"], as_index=False)[["Laps", "RelPaceSum"]].sum()
+    acc = acc.assign(RelPace=lambda d: d["RelPaceSum"] / d["Laps"])
+    table = acc.pivot_table(index=["Circuit", "Driver"], columns="Condition",
+                            values=["RelPace", "Laps"], aggfunc="first")
+    if ("RelPace", "wet") not in table or ("RelPace", "dry") not in table:
+        return pd.DataFrame(columns=["Driver", "WetPerformanceScore", "Circuits", "WetLaps"])
+    paired = pd.DataFrame({"Gain": table[("RelPace", "dry")] - table[("RelPace", "wet")],
+                           "WetLaps": table[("Laps", "wet")]}).dropna().reset_index()
+    paired["Weighted"] = paired["Gain"] * paired["WetLaps"]
+    per_driver = paired.groupby("Driver").agg(Weighted=("Weighted", "sum"), WetLaps=("WetLaps", "sum"),
+                                              Circuits=("Circuit", "nunique"))
+    per_driver["WetPerformanceScore"] = 1 + per_driver["Weighted"] / per_driver["WetLaps"]
+    per_driver["WetLaps"] = per_driver["WetLaps"].astype(int)
+    return (per_driver.reset_index()[["Driver", "WetPerformanceScore", "Circuits", "WetLaps"]]
+            .sort_values("WetPerformanceScore", ascending=False, ignore_index=True))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wet performance scores over every session")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("update", help="scan and fold in sessions not seen yet")
+    p.add_argument("first", type=int, nargs="?", default=FIRST_SEASON)
+    p.add_argument("last", type=int, nargs="?", default=date.today().year)
+    p.add_argument("--workers", type=int, default=None)
+    sub.add_parser("scores", help="print the current scores")
+    args = parser.parse_args()
+
+    engine = WetEngine()
+    if args.command == "update":
+        folded, failed = engine.update(range(args.first, args.last + 1), args.workers)
+        print(f"Folded in {folded} sessions ({len(failed)} not available), {len(engine.folded)} in total")
+    print("\n🌧️ Driver Wet Performance scores (all sessions):")
+    print(engine.scores().to_string(index=False))
@@ -1,49 +1,82 @@
-import fastf1
 import pandas as pd
 
-# Enable cache for fastf1
-# I used my default cache directory
+from instrument import traced
+from lap_masks import REPRESENTATIVE, session_masks
+from sessions import CACHE_DIR, load_session
 
-# Using the Canadian GP for 2022 and 2023 as a proxy for wet and dry conditions
-# Load the 2022 Canadian GP race data (wet race)
-session_2022 = fastf1.get_session(2022, "Canada", "R")
-session_2022.load()
+# Sessions are cached as snapshots in f1_cache (see sessions.py).
+# Nothing is loaded at import time: the scores are computed on the first call,
+# kept in memory for the rest of the process and written to
+# f1_cache/wet_scores so the pair of races is never re-parsed.
+# For scores over every wet session since 2018 see wet_engine.py.
 
-# Load the 2023 Canadian GP race data (dry race)
-session_2023 = fastf1.get_session(2023, "Canada", "R")
-session_2023.load()
+WET_SCORE_DIR = CACHE_DIR / "wet_scores"
 
-# extract lap times and driver codes
-laps_2022 = session_2022.laps[["Driver", "LapTime"]].copy()
-laps_2023 = session_2023.laps[["Driver", "LapTime"]].copy()
+_tables = {}
 
-# In case of missing laps, drop NaN values
-laps_2022.dropna(subset=["LapTime"], inplace=True)
-laps_2023.dropna(subset=["LapTime"], inplace=True)
 
-# Convert lap times to total seconds for easier comparison
-laps_2022["LapTime (s)"] = laps_2022["LapTime"].dt.total_seconds()
-laps_2023["LapTime (s)"] = laps_2023["LapTime"].dt.total_seconds()
+@traced("wet.average_lap_times")
+def _average_lap_times(year, gp):
+    # extract lap times and driver codes
+    session = load_session(year, gp, "R", profile="laps")
+    laps = session.laps(["Driver", "LapTime"])
 
-# Calculate average lap times per driver for both years
-avg_laps_2022 = laps_2022.groupby("Driver")["LapTime (s)"].mean().reset_index()
-avg_laps_2023 = laps_2023.groupby("Driver")["LapTime (s)"].mean().reset_index()
+    # Only laps with a time that show race pace: no pit, SC/VSC, deleted or lap-1 laps (lap_masks.py)
+    return average_lap_times(laps[session_masks(session).select(*REPRESENTATIVE)])
 
-# Merge the two datasets on Driver code to compare lap times
-merged_laps = pd.merge(avg_laps_2022, avg_laps_2023, on="Driver", suffixes=("_2022", "_2023"))
 
-# Calculate the performance difference in lap times between wet and dry conditions (dry-wet)
-merged_laps["LapTimeDifference (s)"] = merged_laps["LapTime (s)_2023"] - merged_laps["LapTime (s)_2022"]
+def average_lap_times(laps):
+    # Convert lap times to total seconds for easier comparison
+    laps = laps.assign(**{"LapTime (s)": laps["LapTime"].dt.total_seconds()})
 
-# Calculate percentage change in in lap times between wet and dry conditions (diff/dry) where dry is race pace
-merged_laps["PerformanceChange (%)"] = (merged_laps["LapTimeDifference (s)"] / merged_laps["LapTime (s)_2023"]) * 100
+    # Calculate average lap times per driver
+    return laps.groupby("Driver")["LapTime (s)"].mean().reset_index()
 
-# Create wet performance score
-merged_laps["WetPerformanceScore"] = 1 + merged_laps["PerformanceChange (%)"] / 100
 
-wet_performance_score = merged_laps[["Driver", "WetPerformanceScore"]]
+@traced("wet.compute_table")
+def _compute_table(wet, dry):
+    return score_table(_average_lap_times(*wet), _average_lap_times(*dry), wet[0], dry[0])
 
-# Print the wet performance results for each driver
-print("\n🌧️ Driver Wet Performance scores (Canada GP 2022 vs 2023):")
-print(merged_laps[["Driver", "LapTime (s)_2022", "LapTime (s)_2023", "LapTimeDifference (s)", "PerformanceChange (%)", "WetPerformanceScore"]])
-# print(merged_laps[["Driver", "WetPerformanceScore"]])
\ No newline at end of file
+
+def score_table(avg_laps_wet, avg_laps_dry, wet_year, dry_year):
+    # Merge the two datasets on Driver code to compare lap times
+    merged_laps = pd.merge(avg_laps_wet, avg_laps_dry, on="Driver", suffixes=(f"_{wet_year}", f"_{dry_year}"))
+
+    # Calculate the performance difference in lap times between wet and dry conditions (dry-wet)
+    merged_laps["LapTimeDifference (s)"] = merged_laps[f"LapTime (s)_{dry_year}"] - merged_laps[f"LapTime (s)_{wet_year}"]
+
+    # Calculate percentage change in in lap times between wet and dry conditions (diff/dry) where dry is race pace
+    merged_laps["PerformanceChange (%)"] = (merged_laps["LapTimeDifference (s)"] / merged_laps[f"LapTime (s)_{dry_year}"]) * 100
+
+    # Create wet performance score
+    merged_laps["WetPerformanceScore"] = 1 + merged_laps["PerformanceChange (%)"] / 100
+    return merged_laps
+
+
+def wet_performance_table(wet=(2022, "Canada"), dry=(2023, "Canada")):
+    # Full comparison table (per-race averages, difference, % change and score)
+    key = (tuple(wet), tuple(dry))
+    if key not in _tables:
+        path = WET_SCORE_DIR / "{}_{}_vs_{}_{}_representative.parquet".format(*key[0], *key[1]).replace(" ", "_")
+        if path.exists():
+            _tables[key] = pd.read_parquet(path)
+        else:
+            _tables[key] = _compute_table(*key)
+            WET_SCORE_DIR.mkdir(parents=True, exist_ok=True)
+            _tables[key].to_parquet(path, index=False)
+    return _tables[key].copy()
+
+
+def wet_performance_score(wet=(2022, "Canada"), dry=(2023, "Canada")):
+    # Using the Canadian GP for 2022 (wet race) and 2023 (dry race) by default
+    return wet_performance_table(wet, dry)[["Driver", "WetPerformanceScore"]]
+
+
+if __name__ == "__main__":
+    wet, dry = (2022, "Canada"), (2023, "Canada")
+    merged_laps = wet_performance_table(wet, dry)
+
+    # Print the wet performance results for each driver
+    print(f"\n🌧️ Driver Wet Performance scores (Canada GP {wet[0]} vs {dry[0]}):")
+    print(merged_laps[["Driver", f"LapTime (s)_{wet[0]}", f"LapTime (s)_{dry[0]}", "LapTimeDifference (s)", "PerformanceChange (%)", "WetPerformanceScore"]])
+    # print(merged_laps[["Driver", "WetPerformanceScore"]])